@@ -0,0 +1,145 @@
+import os
+import cv2
+import numpy as np
+
+from registry import benchmark, make_temporary_dir
+from generators import (generate_depth,
+                        generate_image,
+                        generate_image_dataset,
+                        generate_relative_dataframe,
+                        dof_columns)
+
+
+@benchmark('extended_dataframe_iterator_batch', sizes=('128x384', '256x832'))
+def iterator_setup(target_size):
+    from keras_preprocessing.image import ImageDataGenerator
+    from slam.data_manager.generator import ExtendedDataFrameIterator
+
+    height, width = map(int, target_size.split('x'))
+    root = make_temporary_dir()
+    df, _ = generate_image_dataset(root, trajectory_length=129, height=376, width=1241)
+    iterator = ExtendedDataFrameIterator(df,
+                                         root,
+                                         ImageDataGenerator(),
+                                         x_col=['path_to_rgb', 'path_to_rgb_next'],
+                                         y_col=dof_columns,
+                                         image_col=['path_to_rgb', 'path_to_rgb_next'],
+                                         target_size=(height, width),
+                                         load_mode='rgb',
+                                         preprocess_mode='rgb',
+                                         batch_size=32,
+                                         shuffle=False)
+    return lambda: iterator._get_batches_of_transformed_samples(np.arange(32))
+
+
+@benchmark('create_optical_flow_from_rt', sizes=('96x320', '192x640', '376x1241'))
+def optical_flow_setup(image_size):
+    from slam.linalg import Intrinsics, create_optical_flow_from_rt
+
+    height, width = map(int, image_size.split('x'))
+    depth = generate_depth(height, width)
+    intrinsics = Intrinsics(f_x=0.58, f_y=1.92, c_x=0.5, c_y=0.5, width=width, height=height)
+    return lambda: create_optical_flow_from_rt(depth, intrinsics, (0.01, 0.02, 0.), (0.1, 0., 0.5))
+
+
+# source image format, source size and target size of prepare_<dataset>.py
+DATASET_IMAGES = {'kitti': ('png', 'RGB', (376, 1241), (96, 320)),
+                  'tum': ('png', 'RGB', (480, 640), (120, 160)),
+                  'euroc': ('png', 'L', (480, 752), (120, 188)),
+                  'discoman': ('jpg', 'RGB', (480, 640), (120, 160))}
+
+
+def write_dataset_image(dataset):
+    ext, mode, (height, width), target_size = DATASET_IMAGES[dataset]
+    image = generate_image(height, width)
+    if mode == 'L':
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    image_path = os.path.join(make_temporary_dir(), f'0.{ext}')
+    cv2.imwrite(image_path, image)
+    return image_path, mode, target_size
+
+
+@benchmark('load_image_full_decode', sizes=tuple(DATASET_IMAGES))
+def full_decode_setup(dataset):
+    from slam.utils.image_utils import load_image_arr, resize_image_arr
+
+    image_path, mode, target_size = write_dataset_image(dataset)
+
+    def load():
+        image_arr = load_image_arr(image_path, mode=mode)
+        if image_arr.ndim == 2:
+            image_arr = image_arr[..., None]
+        return resize_image_arr(image_arr, target_size, data_format='channels_last', mode='nearest')
+    return load
+
+
+@benchmark('load_image_reduced_decode', sizes=tuple(DATASET_IMAGES))
+def reduced_decode_setup(dataset):
+    from slam.utils.image_utils import load_image_arr
+
+    image_path, mode, target_size = write_dataset_image(dataset)
+    return lambda: load_image_arr(image_path, mode=mode, target_size=target_size, interpolation='nearest')
+
+
+# optical flow file formats of prepare_general.py (--flow_format with --flow_float16 or --flow_int16)
+FLOW_FORMATS = {'npy': ('npy', None),
+                'npz_float16': ('npz', 'float16'),
+                'npz_int16': ('npz', 'int16'),
+                'zstd_int16': ('npz.zst', 'int16'),
+                'lz4_float16': ('npz.lz4', 'float16')}
+
+
+def evict_from_page_cache(paths):
+    """Drops (already written) files from OS page cache, so that reading them is timed too (Linux only)"""
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+@benchmark('load_optical_flow_batch', sizes=tuple(FLOW_FORMATS))
+def optical_flow_batch_setup(flow_format):
+    """Batch of flow of distinct pairs loaded by ExtendedDataFrameIterator from disk, as in training"""
+    from keras_preprocessing.image import ImageDataGenerator
+    from slam.data_manager.generator import ExtendedDataFrameIterator
+    from slam.linalg import Intrinsics, create_optical_flow_from_rt
+    from slam.utils import save_compressed_arr
+
+    ext, dtype = FLOW_FORMATS[flow_format]
+    height, width = 96, 320
+    batch_size = 32
+    intrinsics = Intrinsics(f_x=0.58, f_y=1.92, c_x=0.5, c_y=0.5, width=width, height=height)
+    depth = generate_depth(height, width)
+
+    root = make_temporary_dir()
+    df = generate_relative_dataframe(batch_size + 1)
+    df['path_to_optical_flow'] = df.from_index.apply(lambda index: f'{index}_{index + 1}.{ext}')
+    for index, flow_path in enumerate(df.path_to_optical_flow):
+        translation = (0.1 * np.sin(index), 0., 0.5 + 0.01 * index)
+        flow = create_optical_flow_from_rt(depth, intrinsics, (0.01, 0.02 * np.cos(index), 0.), translation)
+        flow = np.asarray(flow, dtype=np.float32).reshape(height, width, -1)
+        if ext == 'npy':
+            np.save(os.path.join(root, flow_path), flow)
+        else:
+            save_compressed_arr(os.path.join(root, flow_path), flow, dtype=dtype)
+    os.sync()
+
+    iterator = ExtendedDataFrameIterator(df,
+                                         root,
+                                         ImageDataGenerator(),
+                                         x_col=['path_to_optical_flow'],
+                                         y_col=dof_columns,
+                                         image_col=['path_to_optical_flow'],
+                                         target_size=(height, width),
+                                         load_mode='flow_xy',
+                                         preprocess_mode='flow_xy',
+                                         batch_size=batch_size,
+                                         shuffle=False)
+    flow_paths = [os.path.join(root, flow_path) for flow_path in df.path_to_optical_flow]
+
+    def load():
+        evict_from_page_cache(flow_paths)
+        return iterator._get_batches_of_transformed_samples(np.arange(batch_size))
+    return load
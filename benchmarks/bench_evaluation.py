@@ -0,0 +1,37 @@
+import numpy as np
+
+from registry import benchmark
+from generators import generate_trajectories, generate_relative_dataframe, dof_columns
+
+
+def calculate_metrics_setup(rpe_indices):
+    def setup(trajectory_length):
+        from slam.evaluation import calculate_metrics
+
+        gt_trajectory, predicted_trajectory = generate_trajectories(trajectory_length)
+        return lambda: calculate_metrics(gt_trajectory, predicted_trajectory, rpe_indices=rpe_indices)
+    return setup
+
+
+benchmark('calculate_metrics_full', sizes=(100, 300, 1000))(calculate_metrics_setup('full'))
+benchmark('calculate_metrics_sqrt', sizes=(300, 1000, 3000))(calculate_metrics_setup('sqrt'))
+benchmark('calculate_metrics_kitti', sizes=(1000, 1500))(calculate_metrics_setup('kitti'))
+
+
+@benchmark('relative_trajectory_to_global', sizes=(1000, 10000))
+def to_global_setup(trajectory_length):
+    from slam.linalg import RelativeTrajectory
+
+    relative_trajectory = RelativeTrajectory.from_dataframe(
+        generate_relative_dataframe(trajectory_length)[dof_columns])
+    return relative_trajectory.to_global
+
+
+@benchmark('align', sizes=(1000, 10000, 100000))
+def align_setup(points_num):
+    from slam.linalg.align import align
+
+    random_state = np.random.RandomState(42)
+    reference_points = random_state.normal(size=(points_num, 3))
+    points = reference_points @ np.array([[0, -1, 0], [1, 0, 0], [0, 0, 1.]]) * 2 + 1
+    return lambda: align(points, reference_points)
@@ -0,0 +1,29 @@
+from registry import benchmark
+from generators import generate_relative_dataframe, dof_columns, std_columns
+
+
+# numeric columns passed to GraphOptimizer by TrajectoryEstimator
+EDGE_COLUMNS = ['from_index', 'to_index'] + dof_columns + std_columns
+
+
+@benchmark('graph_optimizer_append', sizes=(100, 1000))
+def append_setup(trajectory_length):
+    from slam.graph_optimization import GraphOptimizer
+
+    df = generate_relative_dataframe(trajectory_length, strides=(1, 2), loop_period=10, noise=0.1)[EDGE_COLUMNS]
+    optimizer = GraphOptimizer()
+
+    def append():
+        optimizer.clear()
+        optimizer.append(df)
+    return append
+
+
+@benchmark('graph_optimizer_optimize', sizes=(100, 1000))
+def optimize_setup(trajectory_length):
+    from slam.graph_optimization import GraphOptimizer
+
+    df = generate_relative_dataframe(trajectory_length, strides=(1, 2), loop_period=10, noise=0.1)[EDGE_COLUMNS]
+    optimizer = GraphOptimizer(max_iterations=10)
+    optimizer.append(df)
+    return optimizer.optimize
@@ -0,0 +1,10 @@
+from registry import benchmark
+from generators import generate_timestamps
+
+
+@benchmark('tum_associate_timestamps', sizes=(100, 500, 2000))
+def associate_timestamps_setup(timestamps_num):
+    from slam.preprocessing.parsers.tum_parser import TUMParser
+
+    timestamps, other_timestamps = generate_timestamps(timestamps_num)
+    return lambda: TUMParser.associate_timestamps(timestamps, other_timestamps)
@@ -0,0 +1,33 @@
+import numpy as np
+
+from registry import benchmark
+from generators import generate_image
+
+
+class ImagesGenerator:
+    """Single batch generator, which is enough for BoVW.fit"""
+    def __init__(self, images):
+        self.images = images
+
+    def __len__(self):
+        return 1
+
+    def __next__(self):
+        return [np.stack(self.images)], None
+
+
+@benchmark('bovw_predict', sizes=(20, 50))
+def bovw_predict_setup(frames_num):
+    from slam.models.relocalization import BoVW
+
+    scenes = [generate_image(480, 640, seed=seed) for seed in range(8)]
+    model = BoVW(clusters_num=32, knn=5)
+    model.fit(ImagesGenerator(scenes))
+
+    frames = [np.roll(scenes[index % len(scenes)], index, axis=1) for index in range(frames_num)]
+
+    def predict():
+        model.clear()
+        for index, frame in enumerate(frames):
+            model.predict(frame, index)
+    return predict
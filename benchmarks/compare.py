@@ -0,0 +1,56 @@
+import sys
+import json
+import argparse
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(baseline, current, threshold=0.1, statistic='min'):
+    """
+    Returns list of (name, size, baseline time, current time, ratio, status) for benchmarks present in both results.
+    Status is 'regression' if current time exceeds baseline by more than threshold, 'improvement' if it is below
+    baseline by more than threshold and 'ok' otherwise.
+    """
+    rows = list()
+    for name, sizes in current.items():
+        for size, result in sizes.items():
+            baseline_result = baseline.get(name, dict()).get(size)
+            if baseline_result is None or statistic not in baseline_result or statistic not in result:
+                continue
+
+            ratio = result[statistic] / baseline_result[statistic]
+            if ratio > 1 + threshold:
+                status = 'regression'
+            elif ratio < 1 - threshold:
+                status = 'improvement'
+            else:
+                status = 'ok'
+            rows.append((name, size, baseline_result[statistic], result[statistic], ratio, status))
+    return rows
+
+
+def main(baseline, current, threshold=0.1, statistic='min'):
+    rows = compare(load_results(baseline), load_results(current), threshold=threshold, statistic=statistic)
+
+    print(f'{"benchmark":<40} {"size":>10} {"baseline, ms":>14} {"current, ms":>14} {"ratio":>8}')
+    for name, size, baseline_time, current_time, ratio, status in rows:
+        mark = '' if status == 'ok' else status.upper()
+        print(f'{name:<40} {size:>10} {baseline_time * 1000:>14.3f} {current_time * 1000:>14.3f} {ratio:>8.2f} {mark}')
+
+    regressions_num = sum(status == 'regression' for *_, status in rows)
+    print(f'{regressions_num} regressions of {len(rows)} compared benchmarks (threshold {threshold:.0%})')
+    return regressions_num
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares two benchmark results and flags regressions')
+    parser.add_argument('baseline', type=str, help='JSON produced by run.py on reference commit')
+    parser.add_argument('current', type=str, help='JSON produced by run.py on tested commit')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Allowed relative slowdown')
+    parser.add_argument('--statistic', type=str, default='min', choices=['min', 'median', 'mean'])
+    args = parser.parse_args()
+
+    sys.exit(int(main(**vars(args)) > 0))
@@ -0,0 +1,126 @@
+import os
+import cv2
+import numpy as np
+import pandas as pd
+
+angles_columns = ['euler_x', 'euler_y', 'euler_z']
+translations_columns = ['t_x', 't_y', 't_z']
+dof_columns = angles_columns + translations_columns
+std_columns = [column + '_confidence' for column in dof_columns]
+
+
+def generate_vertices(from_indices,
+                      to_indices,
+                      translations,
+                      rotations,
+                      translation_std=1,
+                      rotation_std=1):
+    """Vectorized version of generate_vertex from tests/generate_toy.py"""
+    data = dict()
+    for column_index, column in enumerate(angles_columns):
+        data[column] = rotations[:, column_index]
+        data[column + '_confidence'] = rotation_std
+    for column_index, column in enumerate(translations_columns):
+        data[column] = translations[:, column_index]
+        data[column + '_confidence'] = translation_std
+
+    data['path_to_rgb'] = [f'{from_index}.png' for from_index in from_indices]
+    data['path_to_rgb_next'] = [f'{to_index}.png' for to_index in to_indices]
+    data['from_index'] = from_indices
+    data['to_index'] = to_indices
+    return pd.DataFrame(data)
+
+
+def generate_relative_dataframe(trajectory_length,
+                                strides=(1,),
+                                loop_period=None,
+                                loop_length=100,
+                                noise=0.,
+                                seed=42):
+    """
+    Generates pairs of frames of a smooth trajectory moving ~1m per frame.
+
+    Args:
+        trajectory_length: number of frames
+        strides:           pairs (i, i + stride) are generated for every stride
+        loop_period:       if set, every loop_period-th frame gets a pair with the frame loop_length frames ahead
+        noise:             std of noise added to relative poses
+    """
+    random_state = np.random.RandomState(seed)
+    rotations = np.cumsum(random_state.normal(scale=0.01, size=(trajectory_length, 3)), axis=0) * 0.1
+    translations = np.tile([0, 0, 1.], (trajectory_length, 1)) + random_state.normal(scale=0.1,
+                                                                                    size=(trajectory_length, 3))
+
+    from_indices, to_indices = list(), list()
+    for stride in strides:
+        from_indices.append(np.arange(trajectory_length - stride))
+        to_indices.append(np.arange(stride, trajectory_length))
+    if loop_period:
+        from_indices.append(np.arange(0, trajectory_length - loop_length, loop_period))
+        to_indices.append(from_indices[-1] + loop_length)
+
+    from_indices = np.concatenate(from_indices)
+    to_indices = np.concatenate(to_indices)
+
+    # relative pose of pair is a sum of consecutive motions, which is accurate enough for benchmarking
+    cumulative_rotations = np.concatenate([np.zeros((1, 3)), np.cumsum(rotations, axis=0)])
+    cumulative_translations = np.concatenate([np.zeros((1, 3)), np.cumsum(translations, axis=0)])
+    pair_rotations = cumulative_rotations[to_indices] - cumulative_rotations[from_indices]
+    pair_translations = cumulative_translations[to_indices] - cumulative_translations[from_indices]
+
+    pair_rotations += random_state.normal(scale=noise * 0.01, size=pair_rotations.shape)
+    pair_translations += random_state.normal(scale=noise, size=pair_translations.shape)
+    return generate_vertices(from_indices, to_indices, pair_translations, pair_rotations)
+
+
+def generate_trajectories(trajectory_length, noise=0.1, seed=42):
+    """Returns gt and noised global trajectories"""
+    from slam.linalg import RelativeTrajectory
+
+    gt_df = generate_relative_dataframe(trajectory_length, seed=seed)
+    predicted_df = generate_relative_dataframe(trajectory_length, noise=noise, seed=seed)
+    gt_trajectory = RelativeTrajectory.from_dataframe(gt_df[dof_columns]).to_global()
+    predicted_trajectory = RelativeTrajectory.from_dataframe(predicted_df[dof_columns]).to_global()
+    return gt_trajectory, predicted_trajectory
+
+
+def generate_image(height, width, shapes_num=150, seed=42):
+    """Random circles and rectangles on gray background, textured enough for SIFT"""
+    random_state = np.random.RandomState(seed)
+    image = np.full((height, width, 3), 128, dtype=np.uint8)
+    for _ in range(shapes_num):
+        color = tuple(int(c) for c in random_state.randint(0, 255, 3))
+        x, y = int(random_state.randint(0, width)), int(random_state.randint(0, height))
+        size = int(random_state.randint(5, max(6, min(height, width) // 10)))
+        if random_state.rand() < 0.5:
+            cv2.circle(image, (x, y), size, color, -1)
+        else:
+            cv2.rectangle(image, (x, y), (x + size, y + size), color, -1)
+    return image
+
+
+def generate_depth(height, width, min_depth=1., max_depth=50., seed=42):
+    random_state = np.random.RandomState(seed)
+    rows = np.linspace(max_depth, min_depth, height)[:, None]
+    return (np.tile(rows, (1, width)) * random_state.uniform(0.9, 1.1, (height, width))).astype(np.float32)
+
+
+def generate_image_dataset(root, trajectory_length, height, width, scenes_num=8, seed=42):
+    """Writes trajectory_length png frames cycling over scenes_num scenes and returns dataframe of consecutive pairs"""
+    os.makedirs(os.path.join(root, 'rgb'), exist_ok=True)
+    scenes = [generate_image(height, width, seed=seed + i) for i in range(scenes_num)]
+    for index in range(trajectory_length):
+        cv2.imwrite(os.path.join(root, 'rgb', f'{index}.png'), np.roll(scenes[index % scenes_num], index, axis=1))
+
+    df = generate_relative_dataframe(trajectory_length, seed=seed)
+    df['path_to_rgb'] = 'rgb/' + df['path_to_rgb']
+    df['path_to_rgb_next'] = 'rgb/' + df['path_to_rgb_next']
+    return df, scenes
+
+
+def generate_timestamps(timestamps_num, rate=30., jitter=0.005, seed=42):
+    """Returns timestamps of two streams with the same rate and random offsets"""
+    random_state = np.random.RandomState(seed)
+    timestamps = np.arange(timestamps_num) / rate
+    other_timestamps = timestamps + random_state.uniform(-jitter, jitter, timestamps_num)
+    return timestamps, other_timestamps
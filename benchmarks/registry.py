@@ -0,0 +1,68 @@
+import time
+import shutil
+import tempfile
+import traceback
+import numpy as np
+from collections import OrderedDict
+
+BENCHMARKS = OrderedDict()
+TEMPORARY_DIRS = list()
+
+
+def benchmark(name, sizes):
+    """
+    Registers benchmark. Decorated function takes size and returns callable without arguments, which is timed.
+    Everything done before returning the callable (data generation, imports, fitting) is not timed.
+    """
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, sizes)
+        return setup
+    return decorator
+
+
+def make_temporary_dir():
+    """Directory for files written by benchmark setup, removed once benchmark of the size is measured"""
+    path = tempfile.mkdtemp()
+    TEMPORARY_DIRS.append(path)
+    return path
+
+
+def remove_temporary_dirs():
+    while TEMPORARY_DIRS:
+        shutil.rmtree(TEMPORARY_DIRS.pop(), ignore_errors=True)
+
+
+def measure(fn, repeat=5, min_time=0.2):
+    """Calls fn once to warm up and then at least repeat times (and at least min_time seconds)"""
+    fn()
+
+    timings = list()
+    start_time = time.perf_counter()
+    while len(timings) < repeat or time.perf_counter() - start_time < min_time:
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    return {'min': float(np.min(timings)),
+            'median': float(np.median(timings)),
+            'mean': float(np.mean(timings)),
+            'std': float(np.std(timings)),
+            'repeat': len(timings)}
+
+
+def run(name, repeat=5, min_time=0.2):
+    """Benchmark sizes with missing optional dependencies are skipped, failed ones are reported and skipped too"""
+    setup, sizes = BENCHMARKS[name]
+    results = OrderedDict()
+    for size in sizes:
+        try:
+            fn = setup(size)
+            results[str(size)] = measure(fn, repeat=repeat, min_time=min_time)
+        except ImportError as e:
+            results[str(size)] = {'skipped': str(e)}
+        except Exception as e:
+            traceback.print_exc()
+            results[str(size)] = {'failed': f'{type(e).__name__}: {e}'}
+        finally:
+            remove_temporary_dirs()
+    return results
@@ -0,0 +1,77 @@
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from pathlib import Path
+from collections import OrderedDict
+
+import __init_path__
+
+import registry
+import bench_evaluation
+import bench_graph_optimization
+import bench_data_manager
+import bench_preprocessing
+import bench_relocalization
+
+
+def get_versions():
+    versions = OrderedDict(python=platform.python_version())
+    for module_name in ('numpy', 'pandas', 'cv2', 'torch'):
+        try:
+            versions[module_name] = __import__(module_name).__version__
+        except ImportError:
+            versions[module_name] = None
+    return versions
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=Path(__file__).parent.as_posix(),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(output, filter=None, repeat=5, min_time=0.2):
+    names = [name for name in registry.BENCHMARKS if filter is None or re.search(filter, name)]
+
+    results = OrderedDict()
+    for name in names:
+        print(f'Running {name}')
+        results[name] = registry.run(name, repeat=repeat, min_time=min_time)
+        for size, result in results[name].items():
+            if 'skipped' in result:
+                print(f'    {size:>10}: skipped ({result["skipped"]})')
+            elif 'failed' in result:
+                print(f'    {size:>10}: failed ({result["failed"]})')
+            else:
+                print(f'    {size:>10}: {result["min"] * 1000:.3f} ms (median {result["median"] * 1000:.3f} ms)')
+
+    report = OrderedDict(commit=get_commit(),
+                         date=time.strftime('%Y-%m-%d %H:%M:%S'),
+                         machine=platform.node(),
+                         versions=get_versions(),
+                         results=results)
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output.as_posix(), 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results saved to {output.as_posix()}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs micro-benchmarks of hot paths and saves timings to JSON')
+    parser.add_argument('--output', type=str,
+                        default=(Path(__file__).parent / 'results' / 'latest.json').as_posix())
+    parser.add_argument('--filter', type=str, default=None, help='Regular expression for benchmark names')
+    parser.add_argument('--repeat', type=int, default=5, help='Minimal number of timed calls')
+    parser.add_argument('--min_time', type=float, default=0.2, help='Minimal total time of timed calls, s')
+    args = parser.parse_args()
+
+    main(**vars(args))
@@ -1,7 +1,6 @@
 import os
 import sys
 import warnings
-import mlflow
 
 DATASET_PATH = '/dbstore/datasets/'
 PROJECT_PATH = os.path.dirname(os.path.realpath(__file__))
@@ -18,7 +17,8 @@ warnings.simplefilter('ignore')
 
 TRACKING_URI = 'mlruns'
 ARTIFACT_PATH = 'mlruns'
-mlflow.set_tracking_uri(TRACKING_URI)
+# mlflow reads tracking uri on the first use, so it is not imported here
+os.environ['MLFLOW_TRACKING_URI'] = TRACKING_URI
 TUM_PATH = '/dbstore/datasets/Odometry_team/tum_rgbd/'
 TUM_BOVW_PATH = '/dbstore/datasets/Odometry_team/tum_bovw/'
 KITTI_MIXED_PATH = '/dbstore/datasets/Odometry_team/KITTI_odometry_2012_mixed/'
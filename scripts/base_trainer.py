@@ -9,9 +9,9 @@ import env
 
 from slam.data_manager import GeneratorFactory
 from slam.models import ModelFactory
-from slam.evaluation import MlflowLogger, Predict, TerminateOnLR, ModelCheckpoint, CyclicLR
+from slam.evaluation import MlflowLogger, Predict, TerminateOnLR, ModelCheckpoint, CyclicLR, ProfilerCallback
 from slam.preprocessing import get_dataset_root, get_config, DATASET_TYPES
-from slam.utils import set_computation, chmod
+from slam.utils import set_computation, chmod, buffered_logger
 
 
 class BaseTrainer:
@@ -43,7 +43,9 @@ class BaseTrainer:
                  train_generator_args=None,
                  val_generator_args=None,
                  test_generator_args=None,
-                 predict_only=False):
+                 predict_only=False,
+                 async_evaluation=False,
+                 visuals_format='npz'):
 
         self.tracking_uri = env.TRACKING_URI
         self.artifact_path = env.ARTIFACT_PATH
@@ -85,6 +87,8 @@ class BaseTrainer:
         self.x_col = None
 
         self.predict_only = predict_only
+        self.async_evaluation = async_evaluation
+        self.visuals_format = visuals_format
         if self.predict_only:
             self.evaluate = False
         else:
@@ -170,6 +174,10 @@ class BaseTrainer:
         mlflow.log_param('avg', False)
 
     def end_run(self):
+        try:
+            buffered_logger.flush()
+        except Exception as e:
+            print(f'Failed to log buffered params and metrics to mlflow: {e}')
         mlflow.log_metric('successfully_finished', 1)
         mlflow.end_run()
 
@@ -236,7 +244,10 @@ class BaseTrainer:
                                    max_to_visualize=self.max_to_visualize,
                                    backend=self.backend,
                                    cuda=self.cuda,
-                                   workers=8)
+                                   workers=8,
+                                   asynchronous=self.async_evaluation,
+                                   prefix=prefix,
+                                   visuals_format=self.visuals_format)
         callbacks.append(predict_callback)
 
         if self.period:
@@ -244,12 +255,16 @@ class BaseTrainer:
             os.makedirs(weights_dir, exist_ok=True)
             weights_filename = predict_callback.template + '.hdf5'
             weights_path = os.path.join(weights_dir, weights_filename)
-            checkpoint_callback = ModelCheckpoint(monitor=save_metric,
-                                                  filepath=weights_path,
-                                                  save_best_only=self.save_best_only,
-                                                  mode='min',
-                                                  period=self.period)
-            callbacks.append(checkpoint_callback)
+            if self.async_evaluation:
+                # Metrics to monitor are not ready at the end of epoch, so Predict saves weights itself
+                predict_callback.checkpoint_path = weights_path
+            else:
+                checkpoint_callback = ModelCheckpoint(monitor=save_metric,
+                                                      filepath=weights_path,
+                                                      save_best_only=self.save_best_only,
+                                                      mode='min',
+                                                      period=self.period)
+                callbacks.append(checkpoint_callback)
 
         reduce_lr_callback = ReduceLROnPlateau(monitor='val_loss', factor=self.reduce_factor)
         callbacks.append(reduce_lr_callback)
@@ -296,6 +311,8 @@ class BaseTrainer:
                                        save_dir=save_dir,
                                        prefix=prefix,
                                        save_metric=save_metric)
+        if train_generator.profiler.enabled:
+            callbacks.append(ProfilerCallback([train_generator.profiler]))
 
         model.fit_generator(train_generator,
                             steps_per_epoch=len(train_generator),
@@ -366,7 +383,7 @@ class BaseTrainer:
                                      'freeze_epoch': None})
 
         parser.add_argument('--backend', type=str, default='numpy', choices=['numpy', 'torch'],
-                            help='Backend used for evaluation')
+                            help='Backend used for evaluation. torch evaluates all trajectories of a subset in one batch')
         parser.add_argument('--cuda', action='store_true',
                             help='Use GPU for evaluation (only for backend=="torch")')
 
@@ -378,6 +395,11 @@ class BaseTrainer:
         parser.add_argument('--max_frame_ind_diff', type=float, default=float('inf'),
                             help='Maximum allowed stride between frames.')
 
+        parser.add_argument('--async_evaluation', action='store_true',
+                            help='Compute metrics and save predictions in background while next epoch is trained')
+        parser.add_argument('--visuals_format', type=str, default='npz', choices=['npz', 'html'],
+                            help='Save trajectories as npz (render with scripts/visualization/render_trajectories.py) '
+                                 'or as plotly HTML')
         parser.add_argument('--predict_only', action='store_true',
                             help='If true predicts output without metric evaluation')
 
@@ -0,0 +1,69 @@
+import os
+import argparse
+import pandas as pd
+
+import __init_path__
+import env
+
+from slam.evaluation import find_prediction_files, evaluate_predictions, aggregate_predictions, normalize_predictions
+
+
+def main(prediction_root,
+         dataset_root,
+         cache_dir,
+         workers,
+         loop_threshold,
+         rpe_indices,
+         backend,
+         cuda,
+         output):
+
+    prediction_files = list()
+    for root in prediction_root:
+        root_prediction_files = find_prediction_files(root, dataset_root)
+        for prediction_file in root_prediction_files:
+            prediction_file['prediction_root'] = root
+        prediction_files.extend(root_prediction_files)
+
+    if not prediction_files:
+        print(f'No predictions in {", ".join(prediction_root)} match trajectories of {dataset_root}')
+        return
+
+    metrics = evaluate_predictions(prediction_files,
+                                   cache_dir=cache_dir,
+                                   workers=workers,
+                                   loop_threshold=loop_threshold,
+                                   rpe_indices=rpe_indices,
+                                   backend=backend,
+                                   cuda=cuda)
+
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 200):
+        print(aggregate_predictions(metrics, by=['prediction_root', 'subset']))
+
+    if output:
+        normalize_predictions(metrics).to_csv(output, index=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--prediction_root', type=str, nargs='+', required=True,
+                        help='Directories with predictions saved by Predict callback '
+                             '(e.g. <run_dir>/predictions/<prediction_id>), subsets are evaluated separately')
+    parser.add_argument('--dataset_root', type=str, required=True,
+                        help='Root of prepared dataset with df.csv of every trajectory')
+    parser.add_argument('--cache_dir', type=str, default=os.path.join(env.PROJECT_PATH, 'metrics_cache'),
+                        help='Metrics of every file are cached by hash of prediction file, gt file and evaluation '
+                             'parameters, so only new or changed predictions are evaluated')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Number of processes (0 to evaluate in main process)')
+    parser.add_argument('--loop_threshold', type=int, default=50,
+                        help='Minimal index difference for pair of frames to be a loop')
+    parser.add_argument('--rpe_indices', type=str, default='full', choices=['full', 'sqrt', 'kitti'])
+    parser.add_argument('--backend', type=str, default='numpy', choices=['numpy', 'torch'])
+    parser.add_argument('--cuda', action='store_true',
+                        help='Use GPU for evaluation (only for backend=="torch")')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Path to csv with metrics of every trajectory')
+
+    args = parser.parse_args()
+    main(**vars(args))
@@ -15,6 +15,9 @@ def main(dataset_root,
          loop_threshold,
          rotation_weight,
          max_iterations,
+         robust_kernel,
+         robust_kernel_delta,
+         chi2_threshold,
          vis_dir,
          pred_dir):
 
@@ -32,6 +35,9 @@ def main(dataset_root,
                                     loop_threshold=loop_threshold,
                                     rotation_weight=rotation_weight,
                                     max_iterations=max_iterations,
+                                    robust_kernel=robust_kernel,
+                                    robust_kernel_delta=robust_kernel_delta,
+                                    chi2_threshold=chi2_threshold,
                                     rpe_indices=rpe_indices,
                                     verbose=True,
                                     vis_dir=vis_dir,
@@ -59,6 +65,13 @@ if __name__ == '__main__':
                         help='weight of rotation constrains.')
     parser.add_argument('--max_iterations', type=int, default=5000,
                         help='Limit of iterations in g2o backend')
+    parser.add_argument('--robust_kernel', type=str, default=None, choices=['huber', 'cauchy', 'dcs'],
+                        help='Robust kernel applied to loop edges')
+    parser.add_argument('--robust_kernel_delta', type=float, default=1.,
+                        help='Width of robust kernel')
+    parser.add_argument('--chi2_threshold', type=float, default=None,
+                        help='If set, loop edges with chi2 error above threshold are deactivated between solves. '
+                             '12.59 is the 95%% quantile of chi2 distribution with 6 DoF')
     parser.add_argument('--vis_dir', type=str, help='Path to visualization dir')
     parser.add_argument('--pred_dir', type=str, help='Path to prediction dir')
 
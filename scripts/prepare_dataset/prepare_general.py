@@ -7,6 +7,7 @@ from pathlib import Path
 
 import env
 
+from slam.utils import Profiler
 from slam.utils.computation_utils import limit_resources
 from slam.preprocessing import parsers, estimators, prepare_trajectory
 
@@ -19,6 +20,20 @@ def get_default_dataset_parser():
     parser.add_argument('--target_size', type=int, nargs='+', help='Size of images')
     parser.add_argument('--optical_flow_checkpoint', '--of_checkpoint', type=str,
                         default=os.path.join(env.DATASET_PATH, 'Odometry_team/weights/pwcnet.ckpt-84000'))
+    parser.add_argument('--undistort', action='store_true')
+    parser.add_argument('--resize_undistorted', action='store_true',
+                        help='Resize images to target_size in the same pass as undistortion')
+    parser.add_argument('--shared_pwc_features', action='store_true',
+                        help='Compute PWC-Net features of every frame once and reuse them for all pairs')
+    parser.add_argument('--planar_flow', action='store_true',
+                        help='Save optical flow as channel-planar (CHW) arrays, which loader reads memory-mapped')
+    parser.add_argument('--flow_float16', action='store_true', help='Save optical flow as float16')
+    parser.add_argument('--flow_int16', action='store_true',
+                        help='Save optical flow as fixed-point int16 (only for compressed flow_format)')
+    parser.add_argument('--flow_format', type=str, default='npy', choices=['npy', 'npz', 'npz.zst', 'npz.lz4'],
+                        help='Save optical flow as raw array or compressed with zlib, zstd (recommended, '
+                             'decoded faster than zlib) or lz4')
+    parser.add_argument('--depth_png', action='store_true', help='Save depth as uint16 PNG')
     parser.add_argument('--depth', action='store_true')
     parser.add_argument('--depth_checkpoint', type=str,
                         default=os.path.join(env.DATASET_PATH, 'Odometry_team/weights/model-199160'))
@@ -26,6 +41,9 @@ def get_default_dataset_parser():
     parser.add_argument('--binocular_depth_checkpoint', type=str,
                         default=os.path.join(env.DATASET_PATH, 'Odometry_team/weights/pwcnet.ckpt-84000'))
     parser.add_argument('--stride', type=int, default=1)
+    parser.add_argument('--save_frames', action='store_true',
+                        help='Save single frames to frames.csv to create pairs of other strides on the fly '
+                             'instead of preparing dataset for each stride')
     parser.add_argument('--trajectories', default=None, type=str, nargs='+', help='Name of trajectories')
     parser.add_argument('--relocalization', action='store_true')
     parser.add_argument('--max_matches', default=20, type=str,
@@ -44,6 +62,13 @@ def get_default_dataset_parser():
                              '    for EuRoC 40')
     parser.add_argument('--relocalization_vocab_path', type=str,
                         help='Vocabulary for relocalization model')
+    parser.add_argument('--relocalization_batch', action='store_true',
+                        help='Compute features of all keyframes of trajectory first and then match them,'
+                             'instead of processing frames one by one')
+    parser.add_argument('--relocalization_workers', default=0, type=int,
+                        help='Number of processes for feature extraction in batch relocalization mode')
+    parser.add_argument('--profile', action='store_true',
+                        help='Measure time spent by parser and each estimator and print report per trajectory')
     return parser
 
 
@@ -54,12 +79,19 @@ class DatasetPreparator:
                  output_root,
                  target_size,
                  undistort=False,
+                 resize_undistorted=False,
                  relocalization=False,
                  optical_flow_checkpoint=None,
+                 shared_pwc_features=False,
+                 planar_flow=False,
+                 flow_float16=False,
+                 flow_int16=False,
+                 flow_format='npy',
                  depth=False,
                  depth_checkpoint=None,
                  binocular_depth=None,
                  binocular_depth_checkpoint=None,
+                 depth_png=False,
                  pwc_features=False,
                  stride=1,
                  swap_angles=False,
@@ -67,17 +99,29 @@ class DatasetPreparator:
                  max_matches=None,
                  keyframe_period=None,
                  matches_threshold=None,
-                 relocalization_vocab_path=None):
+                 relocalization_vocab_path=None,
+                 relocalization_batch=False,
+                 relocalization_workers=0,
+                 profile=False,
+                 save_frames=False):
 
         self.dataset_type = dataset_type
         self.dataset_root = dataset_root
         self.output_root = output_root
         self.target_size = target_size
         self.undistort = undistort
+        self.resize_undistorted = resize_undistorted
         self.relocalization = relocalization
         self.optical_flow_checkpoint = optical_flow_checkpoint
+        self.shared_pwc_features = shared_pwc_features
+        self.planar_flow = planar_flow
+        self.flow_float16 = flow_float16
+        self.flow_int16 = flow_int16
+        self.flow_format = flow_format
+        assert not (flow_int16 and flow_format == 'npy'), 'Fixed-point flow requires compressed flow_format'
         self.depth_checkpoint = depth_checkpoint if depth else None
         self.binocular_depth_checkpoint = binocular_depth_checkpoint if binocular_depth else None
+        self.depth_png = depth_png
         self.pwc_features = pwc_features
         self.stride = stride
         self.swap_angles = swap_angles
@@ -86,6 +130,10 @@ class DatasetPreparator:
         self.max_matches = max_matches
         self.keyframe_period = keyframe_period
         self.relocalization_vocab_path = relocalization_vocab_path
+        self.relocalization_batch = relocalization_batch
+        self.relocalization_workers = relocalization_workers
+        self.profile = profile
+        self.save_frames = save_frames
 
     def _initialize_estimators(self):
 
@@ -96,16 +144,19 @@ class DatasetPreparator:
         single_frame_estimators.append(quaternion2euler_estimator)
 
         if self.undistort:
+            undistorted_size = self.target_size if self.resize_undistorted else None
             undistortion_estimator = estimators.UndistortionEstimator(
                 input_col=['path_to_rgb', 'K', 'D', 'R', 'P'],
                 output_col='path_to_rgb',
-                sub_dir='rgb_undistorted')
+                sub_dir='rgb_undistorted',
+                target_size=undistorted_size)
             single_frame_estimators.append(undistortion_estimator)
 
             undistortion_estimator_right = estimators.UndistortionEstimator(
                 input_col=['path_to_rgb_right', 'K_right', 'D_right', 'R_right', 'P'],
                 output_col='path_to_rgb_right',
-                sub_dir='rgb_undistorted_right')
+                sub_dir='rgb_undistorted_right',
+                target_size=undistorted_size)
             single_frame_estimators.append(undistortion_estimator_right)
 
         if self.depth_checkpoint is not None:
@@ -113,7 +164,8 @@ class DatasetPreparator:
                                                                       output_col='path_to_depth',
                                                                       sub_dir='depth',
                                                                       checkpoint=self.depth_checkpoint,
-                                                                      input_size=self.target_size)
+                                                                      input_size=self.target_size,
+                                                                      ext='png' if self.depth_png else 'npy')
             single_frame_estimators.append(struct2depth_estimator)
 
         if self.binocular_depth_checkpoint is not None:
@@ -122,7 +174,8 @@ class DatasetPreparator:
                            'f_x', 'f_y', 'c_x', 'c_y', 'baseline_distance'],
                 output_col='path_to_binocular_depth',
                 sub_dir='binocular_depth',
-                checkpoint=self.binocular_depth_checkpoint)
+                checkpoint=self.binocular_depth_checkpoint,
+                ext='png' if self.depth_png else 'npy')
             single_frame_estimators.append(binocular_depth_estimator)
 
         if self.relocalization:
@@ -133,7 +186,9 @@ class DatasetPreparator:
                                                                           matches_threshold=self.matches_threshold,
                                                                           keyframe_period=self.keyframe_period,
                                                                           checkpoint=self.relocalization_vocab_path,
-                                                                          target_size=self.target_size)
+                                                                          target_size=self.target_size,
+                                                                          batch=self.relocalization_batch,
+                                                                          workers=self.relocalization_workers)
             single_frame_estimators.append(relocalization_estimator)
 
         cols = ['euler_x', 'euler_y', 'euler_z', 't_x', 't_y', 't_z']
@@ -145,11 +200,22 @@ class DatasetPreparator:
         global2relative_estimator = estimators.Global2RelativeEstimator(input_col=input_col,
                                                                         output_col=output_col)
 
-        pwcnet_estimator = estimators.PWCNetEstimator(input_col=['path_to_rgb', 'path_to_rgb_next'],
+        flow_dtype = None
+        if self.flow_int16:
+            flow_dtype = 'int16'
+        elif self.flow_float16:
+            flow_dtype = 'float16'
+
+        pwcnet_estimator_class = (estimators.PWCNetMultiStrideEstimator if self.shared_pwc_features
+                                  else estimators.PWCNetEstimator)
+        pwcnet_estimator = pwcnet_estimator_class(input_col=['path_to_rgb', 'path_to_rgb_next'],
                                                       output_col='path_to_optical_flow',
                                                       sub_dir='optical_flow',
                                                       checkpoint=self.optical_flow_checkpoint,
-                                                      target_size=self.target_size)
+                                                      target_size=self.target_size,
+                                                      channels_first=self.planar_flow,
+                                                      dtype=flow_dtype,
+                                                      ext=self.flow_format)
 
         pair_frames_estimators = [global2relative_estimator, pwcnet_estimator]
 
@@ -190,6 +256,7 @@ class DatasetPreparator:
         with open(self.output_root.joinpath('prepare_dataset.json').as_posix(), mode='w+') as f:
             dataset_config = {'dataset_root': self.dataset_root,
                               'undistort': self.undistort,
+                              'resize_undistorted': self.resize_undistorted,
                               'relocalization': self.relocalization,
                               'pwc_features': self.pwc_features,
                               'swap_angles': self.swap_angles,
@@ -197,6 +264,12 @@ class DatasetPreparator:
                               'optical_flow_checkpoint': self.optical_flow_checkpoint,
                               'target_size': self.target_size,
                               'stride': self.stride,
+                              'save_frames': self.save_frames,
+                              'planar_flow': self.planar_flow,
+                              'flow_float16': self.flow_float16,
+                              'flow_int16': self.flow_int16,
+                              'flow_format': self.flow_format,
+                              'depth_png': self.depth_png,
                               'binocular_depth_checkpoint': self.binocular_depth_checkpoint,
                               'relocalization_vocabulary': self.relocalization_vocab_path,
                               'matches_num': self.matches_threshold,
@@ -209,6 +282,8 @@ class DatasetPreparator:
         else:
             trajectories = [os.path.join(self.dataset_root, trajectory) for trajectory in self.trajectories]
 
+        profiler = Profiler(enabled=self.profile, name='prepare', report_period=1, log_to_mlflow=False)
+
         counter = 0
 
         for trajectory in tqdm(trajectories):
@@ -223,7 +298,9 @@ class DatasetPreparator:
                                         parser=trajectory_parser,
                                         single_frame_estimators=sf_estimators,
                                         pair_frames_estimators=pf_estimators,
-                                        stride=self.stride)
+                                        stride=self.stride,
+                                        profiler=profiler,
+                                        frames_csv_name='frames.csv' if self.save_frames else None)
                 df.to_csv(output_dir.joinpath('df.csv').as_posix(), index=False)
 
                 counter += 1
@@ -232,4 +309,9 @@ class DatasetPreparator:
             except Exception as e:
                 logger.info(e)
 
+        for estimator in sf_estimators + pf_estimators:
+            estimator.close()
+
         logger.info(f'{counter} trajectories has been processed')
+        if self.profile:
+            logger.info(profiler.report())
@@ -6,15 +6,37 @@ import mlflow
 from scripts.base_trainer import BaseTrainer
 from slam.models.relocalization import BoVW
 from slam.data_manager.generator_factory import GeneratorFactory
+from slam.utils import buffered_logger
 
 
 class BoVWTrainer(BaseTrainer):
 
-    def __init__(self, voc_size, train_sampling_step, matcher_type, *args, **kwargs):
+    def __init__(self,
+                 voc_size,
+                 train_sampling_step,
+                 matcher_type,
+                 retrieval='flat',
+                 branching=10,
+                 depth=4,
+                 kmeans='full',
+                 kmeans_batch_size=10000,
+                 kmeans_epochs=3,
+                 chunk_size=100000,
+                 workers=0,
+                 *args,
+                 **kwargs):
         super().__init__(*args, **kwargs)
         self.voc_size = voc_size
         self.train_sampling_step = train_sampling_step
         self.matcher_type = matcher_type
+        self.retrieval = retrieval
+        self.branching = branching
+        self.depth = depth
+        self.kmeans = kmeans
+        self.kmeans_batch_size = kmeans_batch_size
+        self.kmeans_epochs = kmeans_epochs
+        self.chunk_size = chunk_size
+        self.workers = workers
 
     def get_dataset(self,
                     train_trajectories=None,
@@ -43,7 +65,17 @@ class BoVWTrainer(BaseTrainer):
                                 cached_images={})
 
     def get_model(self):
-        model = BoVW(self.voc_size, run_dir=self.run_dir, matcher_type=self.matcher_type)
+        model = BoVW(self.voc_size,
+                     run_dir=self.run_dir,
+                     matcher_type=self.matcher_type,
+                     retrieval=self.retrieval,
+                     branching=self.branching,
+                     depth=self.depth,
+                     kmeans=self.kmeans,
+                     kmeans_batch_size=self.kmeans_batch_size,
+                     kmeans_epochs=self.kmeans_epochs,
+                     chunk_size=self.chunk_size,
+                     workers=self.workers)
         return model
 
     def fit_generator(self, model, dataset, epochs, evaluate=True, save_dir=None, prefix=None):
@@ -60,6 +92,10 @@ class BoVWTrainer(BaseTrainer):
                            dataset=dataset,
                            epochs=self.epochs)
 
+        try:
+            buffered_logger.flush()
+        except Exception as e:
+            print(f'Failed to log buffered params and metrics to mlflow: {e}')
         mlflow.log_param('successfully_finished', 1)
         mlflow.end_run()
 
@@ -69,6 +105,19 @@ class BoVWTrainer(BaseTrainer):
         parser.add_argument('--voc_size', type=int, help='number of clusters to form vocabulary')
         parser.add_argument('--train_sampling_step', type=int)
         parser.add_argument('--matcher_type', type=str, choices=['BruteForce', 'Flann'])
+        parser.add_argument('--retrieval', type=str, default='flat', choices=['flat', 'tree'],
+                            help='Flat vocabulary with brute-force histogram matching or vocabulary tree '
+                                 'with inverted index')
+        parser.add_argument('--branching', type=int, default=10, help='Branching factor of vocabulary tree')
+        parser.add_argument('--depth', type=int, default=4, help='Depth of vocabulary tree')
+        parser.add_argument('--kmeans', type=str, default='full', choices=['full', 'minibatch'],
+                            help='Cluster all descriptors at once or stream them through mini-batch k-means '
+                                 '(flat retrieval only)')
+        parser.add_argument('--kmeans_batch_size', type=int, default=10000)
+        parser.add_argument('--kmeans_epochs', type=int, default=3, help='Passes of mini-batch k-means over data')
+        parser.add_argument('--chunk_size', type=int, default=100000,
+                            help='Number of descriptors per checkpointed chunk')
+        parser.add_argument('--workers', type=int, default=0, help='Processes for SIFT extraction')
         return parser
 
 
@@ -0,0 +1,46 @@
+import argparse
+import numpy as np
+from pathlib import Path
+
+import __init_path__
+
+from slam.linalg import GlobalTrajectory
+from slam.utils import visualize_trajectory, visualize_trajectory_with_gt, chmod
+
+
+def render(file_path, overwrite=False):
+    output_path = file_path.with_suffix('.html')
+    if output_path.exists() and not overwrite:
+        return False
+
+    arrays = np.load(file_path.as_posix())
+    predicted_trajectory = GlobalTrajectory.from_array(arrays['predicted'])
+    title = str(arrays['title'])
+
+    if 'gt' in arrays:
+        gt_trajectory = GlobalTrajectory.from_array(arrays['gt'])
+        visualize_trajectory_with_gt(gt_trajectory, predicted_trajectory, title=title, file_path=output_path.as_posix())
+    else:
+        visualize_trajectory(predicted_trajectory, title=title, file_path=output_path.as_posix())
+
+    chmod(output_path.as_posix())
+    return True
+
+
+def main(paths, overwrite=False):
+    file_paths = list()
+    for path in map(Path, paths):
+        file_paths.extend(sorted(path.rglob('*.npz')) if path.is_dir() else [path])
+
+    rendered_num = sum(render(file_path, overwrite) for file_path in file_paths)
+    print(f'Rendered {rendered_num} of {len(file_paths)} trajectories')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Renders trajectories saved by Predict callback to plotly HTML')
+    parser.add_argument('paths', type=str, nargs='+',
+                        help='npz files or directories to search for them (e.g. <run_dir>/visuals/best)')
+    parser.add_argument('--overwrite', action='store_true', help='Render again if HTML already exists')
+    args = parser.parse_args()
+
+    main(**vars(args))
@@ -1,6 +1,6 @@
-from .generator_factory import GeneratorFactory
+from slam.utils.lazy_import import attach
 
 
-__all__ = [
-    'GeneratorFactory'
-]
+__getattr__, __dir__, __all__ = attach(__name__, {
+    'generator_factory': ['GeneratorFactory']
+})
@@ -1,13 +1,20 @@
 import os
 import psutil
+import threading
 import numpy as np
 from pathlib import Path
+from multiprocessing.pool import ThreadPool
 import keras_preprocessing.image as keras_image
 
 from slam.utils import (get_channels_num,
                         get_fill_fn,
                         load_image_arr,
-                        resize_image_arr)
+                        load_npy_arr,
+                        load_compressed_arr,
+                        get_compressed_array_ext,
+                        load_depth_png,
+                        resize_image_arr,
+                        Profiler)
 
 from slam.linalg import Intrinsics, create_optical_flow_from_rt
 
@@ -30,6 +37,12 @@ def get_proba_fn(mode, proba=None, steps=None):
     return proba_fn
 
 
+# channels of 7-channel motion maps (stored as CHW) needed for each load mode, None for all channels
+MOTION_MAPS_CHANNELS = {'motion_maps': None,
+                        'motion_maps_z': [2, 5],
+                        'motion_maps_xy': [0, 1, 4, 5]}
+
+
 def sample_coordinates(image_size):
     return np.random.uniform(low=(0, 0), high=image_size).astype(int)
 
@@ -72,6 +85,11 @@ class ExtendedDataFrameIterator(keras_image.iterator.BatchFromFilesMixin, keras_
                  augment_with_rectangle_mode='constant',
                  epochs=100,
                  predict_generator=False,
+                 profile=False,
+                 profile_report_period=100,
+                 decode_workers=0,
+                 frame_group_size=0,
+                 planar_flow=False,
                  **kwargs):
 
         if target_size == -1:
@@ -98,6 +116,17 @@ class ExtendedDataFrameIterator(keras_image.iterator.BatchFromFilesMixin, keras_
         self.df = dataframe
         self._include_last() if include_last else None
 
+        # rows sharing frames are close to each other in this order (see _set_index_array)
+        self.frame_group_size = frame_group_size
+        self.frame_order = self._get_frame_order()
+
+        # .npy optical flow is stored as CHW (see --planar_flow of prepare_dataset), compressed arrays keep layout
+        self.planar_flow = planar_flow
+
+        self.decode_workers = decode_workers
+        self.decode_pool = None
+        self.decode_pool_pid = None
+
         self.directory = directory
         self.dtype = dtype
         self.samples = len(self.df)
@@ -115,8 +144,8 @@ class ExtendedDataFrameIterator(keras_image.iterator.BatchFromFilesMixin, keras_
         if not self.predict_generator:
             assert set(self.y_cols) <= set(self.df.columns)
 
-        print('y columns', self.return_cols)
         self.return_cols = self.y_cols[:]
+        print('y columns', self.return_cols)
 
         weight_col = weight_col or []
         self.w_cols = [weight_col] if isinstance(weight_col, str) else weight_col
@@ -199,6 +228,10 @@ class ExtendedDataFrameIterator(keras_image.iterator.BatchFromFilesMixin, keras_
         self.set_cache(cached_images)
         self.max_memory_consumption = max_memory_consumption
         self.stop_caching = False
+        # cache is updated by decode threads (see _load_frames)
+        self.cache_lock = threading.Lock()
+
+        self.profiler = Profiler(enabled=profile, name='data', report_period=profile_report_period)
 
     @property
     def channel_counts(self):
@@ -217,6 +250,44 @@ class ExtendedDataFrameIterator(keras_image.iterator.BatchFromFilesMixin, keras_
             if col_next in self.df.columns:
                 self.df.at[index, col] = self.df[col_next].iloc[index - 1]
 
+    def _get_frame_order(self):
+        first_frame_index = np.minimum(self.df['from_index'].values, self.df['to_index'].values)
+        if 'trajectory_id' in self.df.columns:
+            trajectory_codes = self.df['trajectory_id'].astype('category').cat.codes.values
+            return np.lexsort((first_frame_index, trajectory_codes))
+        return np.argsort(first_frame_index, kind='mergesort')
+
+    def _set_index_array(self):
+        if not (self.shuffle and self.frame_group_size > 1):
+            return super()._set_index_array()
+
+        # groups of frame_group_size neighbouring rows are shuffled instead of single rows, so that most of rows
+        # in batch share frames with other rows and frames are decoded once (see _load_frames)
+        offset = np.random.randint(self.frame_group_size)
+        split_indices = np.arange(offset, self.n, self.frame_group_size)
+        groups = np.split(self.frame_order, split_indices[split_indices > 0])
+        self.index_array = np.concatenate([groups[i] for i in np.random.permutation(len(groups))])
+
+    def _get_decode_pool(self):
+        # threads do not survive fork, so each worker process of keras creates its own pool
+        if self.decode_pool is None or self.decode_pool_pid != os.getpid():
+            self.decode_pool = ThreadPool(self.decode_workers)
+            self.decode_pool_pid = os.getpid()
+        return self.decode_pool
+
+    def _load_frames(self, frame_keys):
+        """
+        Decodes and preprocesses each (fname, load_mode, preprocess_mode) once, in decode_workers threads if set.
+
+        Returns:
+            dict with frame_keys as keys and preprocessed images (or None for invalid ones) as values
+        """
+        if self.decode_workers and len(frame_keys) > 1:
+            images = self._get_decode_pool().map(lambda key: self._get_preprocessed_image(*key), frame_keys)
+        else:
+            images = [self._get_preprocessed_image(*key) for key in frame_keys]
+        return dict(zip(frame_keys, images))
+
     def _check_stop_caching(self):
         self.stop_caching = False
         if (self.cached_images is not None) and (len(self.cached_images) % 1000 == 0):
@@ -235,35 +306,49 @@ class ExtendedDataFrameIterator(keras_image.iterator.BatchFromFilesMixin, keras_
         if os.path.islink(fpath):
             fpath = os.readlink(fpath)
 
-        if fpath.endswith('.npy'):
-            image_arr = np.load(fpath)
-        else:
-            pil_mode = None
-            if load_mode == 'grayscale':
-                pil_mode = 'L'
-            elif load_mode == 'rgba':
-                pil_mode = 'RGBA'
-            elif load_mode == 'rgb':
-                pil_mode = 'RGB'
-
-            image_arr = load_image_arr(fpath, mode=pil_mode)
+        if self.profiler.enabled:
+            self.profiler.add_bytes(os.path.getsize(fpath))
+
+        with self.profiler.stage('read'):
+            if fpath.endswith('.npy'):
+                # only channel planes required by load mode are read from channel-planar arrays
+                is_planar_flow = self.planar_flow and load_mode in ('flow_xy', 'flow_xy_nan')
+                image_arr = load_npy_arr(fpath,
+                                         channels=MOTION_MAPS_CHANNELS.get(load_mode),
+                                         channels_first=load_mode in MOTION_MAPS_CHANNELS or is_planar_flow)
+            elif get_compressed_array_ext(fpath) is not None:
+                # quantized arrays (e.g. float16 or int16 optical flow) in compressed containers
+                image_arr = load_compressed_arr(fpath,
+                                                channels=MOTION_MAPS_CHANNELS.get(load_mode),
+                                                channels_first=True if load_mode in MOTION_MAPS_CHANNELS else None)
+            elif fpath.endswith('.png') and load_mode in ('depth', 'disparity'):
+                # uint16 depth PNG with depth scale (PNG without it is loaded as is)
+                image_arr = load_depth_png(fpath,
+                                           target_size=self.target_size,
+                                           interpolation=self.interpolation)
+            else:
+                pil_mode = None
+                if load_mode == 'grayscale':
+                    pil_mode = 'L'
+                elif load_mode == 'rgba':
+                    pil_mode = 'RGBA'
+                elif load_mode == 'rgb':
+                    pil_mode = 'RGB'
+
+                # images are decoded near target size and resized before conversion to float
+                image_arr = load_image_arr(fpath,
+                                           mode=pil_mode,
+                                           target_size=self.target_size,
+                                           interpolation=self.interpolation)
 
         if len(image_arr.shape) == 2:
             image_arr = np.expand_dims(image_arr, -1)
 
-        if load_mode == 'motion_maps':
-            image_arr = image_arr.transpose((1, 2, 0))
-
-        if load_mode == 'motion_maps_z':
-            image_arr = image_arr[[2, 5]].transpose((1, 2, 0))
-
-        if load_mode == 'motion_maps_xy':
-            image_arr = image_arr[[0, 1, 4, 5]].transpose((1, 2, 0))
-
-        image_arr = resize_image_arr(image_arr,
-                                     self.target_size,
-                                     data_format=self.data_format,
-                                     mode=self.interpolation)
+        with self.profiler.stage('resize'):
+            image_arr = resize_image_arr(image_arr,
+                                         self.target_size,
+                                         data_format=self.data_format,
+                                         mode=self.interpolation)
         return image_arr
 
     def _preprocess_image(self, image_arr, load_mode, preprocess_mode):
@@ -314,15 +399,21 @@ class ExtendedDataFrameIterator(keras_image.iterator.BatchFromFilesMixin, keras_
     def _get_preprocessed_image(self, fname, load_mode, preprocess_mode):
         fpath = os.path.join(self.directory, fname)
         if (self.cached_images is not None) and (fpath in self.cached_images):
+            self.profiler.add_cache_access(hit=True)
             image_arr = self.cached_images[fpath]
         else:
+            if self.cached_images is not None:
+                self.profiler.add_cache_access(hit=False)
+
             image_arr = self._load_image(fpath, load_mode)
-            image_arr = self._preprocess_image(image_arr, load_mode, preprocess_mode)
+            with self.profiler.stage('preprocess'):
+                image_arr = self._preprocess_image(image_arr, load_mode, preprocess_mode)
 
             if image_arr is not None:
-                self._check_stop_caching()
-                if (self.cached_images is not None) and (not self.stop_caching):
-                    self.cached_images[fpath] = image_arr
+                with self.cache_lock:
+                    self._check_stop_caching()
+                    if (self.cached_images is not None) and (not self.stop_caching):
+                        self.cached_images[fpath] = image_arr
 
         if image_arr is None:
             return None
@@ -348,6 +439,12 @@ class ExtendedDataFrameIterator(keras_image.iterator.BatchFromFilesMixin, keras_
         return batch
 
     def _get_batches_of_transformed_samples(self, index_array):
+        with self.profiler.stage('batch'):
+            batch = self._build_batch(index_array)
+        self.profiler.end_batch()
+        return batch
+
+    def _build_batch(self, index_array):
         batch_x = self._init_batch(self.x_cols, index_array)
         if self.predict_generator:
             batch_y = None
@@ -359,16 +456,28 @@ class ExtendedDataFrameIterator(keras_image.iterator.BatchFromFilesMixin, keras_
         if generate_flow_by_rt_proba > 0:
             print(f'batch #{self.batches_seen} / {len(self)}: p={generate_flow_by_rt_proba}')
 
-        # build batch of image data
+        generate_flow_by_rt_samples = generate_flow_by_rt_proba > np.random.uniform(size=len(index_array))
+
+        # frames shared by several rows (e.g. path_to_rgb_next of row k and path_to_rgb of row k + 1) are loaded once
+        image_rows = self.df_images.values[index_array]
+        frame_keys = dict()
+        for image_row, generate_flow_by_rt in zip(image_rows, generate_flow_by_rt_samples):
+            for col, fname in zip(self.image_cols, image_row):
+                if col == 'path_to_optical_flow' and generate_flow_by_rt:
+                    continue
+                frame_keys[(fname, self.load_mode[col], self.preprocess_mode[col])] = None
+        frames = self._load_frames(list(frame_keys))
+
+        # build batch of image data, images of frames are only read here (flow synthesis creates new arrays)
         valid_samples = np.ones(len(index_array)).astype(bool)
         for index_in_batch, df_row_index in enumerate(index_array):
-            generate_flow_by_rt = generate_flow_by_rt_proba > np.random.uniform()
+            generate_flow_by_rt = generate_flow_by_rt_samples[index_in_batch]
 
-            for col, fname in self.df_images.iloc[df_row_index].iteritems():
+            for col, fname in zip(self.image_cols, image_rows[index_in_batch]):
                 if col == 'path_to_optical_flow' and generate_flow_by_rt:
                     continue
 
-                image_arr = self._get_preprocessed_image(fname, self.load_mode[col], self.preprocess_mode[col])
+                image_arr = frames[(fname, self.load_mode[col], self.preprocess_mode[col])]
                 if image_arr is None:
                     valid_samples[index_in_batch] = False
                     continue
@@ -396,10 +505,11 @@ class ExtendedDataFrameIterator(keras_image.iterator.BatchFromFilesMixin, keras_
                     intrinsics_args = dict(self.df_intrinsics.iloc[df_row_index])
                     intrinsics_args.update({'width': image_arr.shape[1], 'height': image_arr.shape[0]})
 
-                    image_arr = create_optical_flow_from_rt(image_arr[..., 0],
-                                                            Intrinsics(**intrinsics_args),
-                                                            rotation_vector,
-                                                            translation_vector)
+                    with self.profiler.stage('flow_synthesis'):
+                        image_arr = create_optical_flow_from_rt(image_arr[..., 0],
+                                                                Intrinsics(**intrinsics_args),
+                                                                rotation_vector,
+                                                                translation_vector)
                     if image_arr is None:
                         valid_samples[index_in_batch] = False
                         continue
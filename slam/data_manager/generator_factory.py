@@ -10,6 +10,7 @@ import pandas as pd
 from keras_preprocessing.image import ImageDataGenerator
 
 from slam.data_manager.generator import ExtendedDataFrameIterator
+from slam.data_manager.stride_pairs import load_stride_pairs
 from slam.linalg import RelativeTrajectory, GlobalTrajectory, convert
 from slam.utils import mlflow_logging
 
@@ -39,13 +40,19 @@ class GeneratorFactory:
                  test_strides=1,
                  batch_size=128,
                  cached_images=None,
+                 frames_csv_name=None,
+                 pair_estimators=None,
                  *args, **kwargs):
 
         self.dataset_root = dataset_root
 
+        self.dataset_config = self._load_dataset_config()
         self._log_dataset_params()
 
         self.csv_name = csv_name
+        # if set, pairs of every stride are created from single frames (see stride_pairs.load_stride_pairs)
+        self.frames_csv_name = frames_csv_name
+        self.pair_estimators = pair_estimators
 
         self.x_col = list(x_col)
         self.y_col = list(y_col)
@@ -95,25 +102,35 @@ class GeneratorFactory:
         if type(self.cached_images) == str:
             self.load_cache(self.cached_images)
 
+    @property
+    def planar_flow(self):
+        """Layout of .npy optical flow as written by prepare_dataset.py"""
+        return bool(self.dataset_config and self.dataset_config.get('planar_flow', False))
+
     @property
     def input_shapes(self):
         return (self.get_train_generator().input_shapes if self.train_trajectories
                 else self.get_val_generator().input_shapes)
 
+    def _load_dataset_config(self):
+        dataset_config_path = os.path.join(self.dataset_root, 'prepare_dataset.json')
+        try:
+            with open(dataset_config_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
     def _log_dataset_params(self):
         if mlflow.active_run():
-
-            dataset_config_path = os.path.join(self.dataset_root, 'prepare_dataset.json')
-            try:
-                with open(dataset_config_path, 'r') as f:
-                    dataset_config = json.load(f)
-                    mlflow.log_param('depth_checkpoint', dataset_config['depth_checkpoint'])
-                    mlflow.log_param('optical_flow_checkpoint', dataset_config['optical_flow_checkpoint'])
-            except FileNotFoundError:
+            if self.dataset_config is None:
+                dataset_config_path = os.path.join(self.dataset_root, 'prepare_dataset.json')
                 warnings.warn('WARNING!!!. No prepare_dataset.json for this dataset. You need to rerun '
                               f'prepare_dataset.py for this dataset. Path {dataset_config_path}', UserWarning)
                 mlflow.log_param('depth_checkpoint', None)
                 mlflow.log_param('optical_flow_checkpoint', None)
+            else:
+                mlflow.log_param('depth_checkpoint', self.dataset_config['depth_checkpoint'])
+                mlflow.log_param('optical_flow_checkpoint', self.dataset_config['optical_flow_checkpoint'])
 
     def transform_to_camera_coordinate_system(self, current_df):
         assert current_df['T_body_cam'].nunique() == 1
@@ -148,19 +165,27 @@ class GeneratorFactory:
         if not trajectories:
             return df, df_as_is
 
-        strides = [strides] * len(trajectories) if isinstance(strides, int) else strides
+        # int (or tuple of strides for virtual pairs) is used for every trajectory, list is given per trajectory
+        strides = [strides] * len(trajectories) if isinstance(strides, (int, tuple)) else strides
 
         for trajectory_name, stride in tqdm.tqdm(zip(trajectories, strides),
                                                  total=len(trajectories),
                                                  desc=f'Collect {subset} trajectories'):
-            current_df = pd.read_csv(os.path.join(self.dataset_root, trajectory_name, self.csv_name))
+            if self.frames_csv_name:
+                current_df = load_stride_pairs(os.path.join(self.dataset_root, trajectory_name),
+                                               stride,
+                                               frames_csv_name=self.frames_csv_name,
+                                               csv_name=self.csv_name,
+                                               pair_estimators=self.pair_estimators)
+            else:
+                current_df = pd.read_csv(os.path.join(self.dataset_root, trajectory_name, self.csv_name))
+                current_df['stride'] = stride
 
             image_col_next = [image_col + '_next' for image_col in self.image_col]
             image_col_all = self.image_col + list(filter(lambda x: x in current_df.columns, image_col_next))
             current_df[image_col_all] = trajectory_name + '/' + current_df[image_col_all]
 
             current_df['trajectory_id'] = trajectory_name
-            current_df['stride'] = stride
 
             if self.weight_col:
                 current_df = self.set_samples_weights(current_df)
@@ -170,7 +195,8 @@ class GeneratorFactory:
 
             df = current_df if df is None else df.append(current_df, sort=False)
 
-            current_df_as_is = current_df.iloc[::stride]
+            as_is_stride = current_df['stride'].min()
+            current_df_as_is = current_df[current_df['stride'] == as_is_stride].iloc[::as_is_stride]
             df_as_is = current_df_as_is if df_as_is is None else df_as_is.append(current_df_as_is, sort=False)
 
         df.index = range(len(df))
@@ -225,7 +251,7 @@ class GeneratorFactory:
             filter_invalid=filter_invalid,
             include_last=include_last,
             trajectory_id=trajectory_id,
-            *self.args, **{**self.kwargs, **generator_args})
+            *self.args, **{'planar_flow': self.planar_flow, **self.kwargs, **generator_args})
 
     def _get_generators_list(self, dataframe, generator_args, trajectories, include_last=False):
 
@@ -0,0 +1,164 @@
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from slam.linalg import convert_euler_angles_to_rotation_matrices, convert_rotation_matrices_to_euler_angles
+from slam.utils import get_compressed_array_ext
+from slam.preprocessing.prepare_trajectory import transform_single_frame_df_to_paired
+
+
+DOF_COLS = ['euler_x', 'euler_y', 'euler_z', 't_x', 't_y', 't_z']
+
+
+def get_relative_dofs(global_dofs, next_global_dofs):
+    """
+    Vectorized version of Global2RelativeEstimator: n x 6 global euler angles with translations of first and
+    second frames in, n x 6 relative euler angles with translations out.
+    """
+    global_dofs = np.asarray(global_dofs, dtype=np.float64)
+    next_global_dofs = np.asarray(next_global_dofs, dtype=np.float64)
+
+    rotation_matrices = convert_euler_angles_to_rotation_matrices(global_dofs[:, :3])
+    next_rotation_matrices = convert_euler_angles_to_rotation_matrices(next_global_dofs[:, :3])
+
+    # inv([R|t]) @ [R'|t'] = [R^T R' | R^T (t' - t)]
+    inverse_rotation_matrices = rotation_matrices.transpose((0, 2, 1))
+    relative_rotation_matrices = inverse_rotation_matrices @ next_rotation_matrices
+    relative_translations = np.einsum('nij,nj->ni',
+                                      inverse_rotation_matrices,
+                                      next_global_dofs[:, 3:] - global_dofs[:, 3:])
+
+    relative_euler_angles = convert_rotation_matrices_to_euler_angles(relative_rotation_matrices)
+    return np.concatenate([relative_euler_angles, relative_translations], axis=1)
+
+
+def get_pair_product_path(sub_dir, fname, next_fname, ext='npy'):
+    """Path of pairwise product as saved by NetworkEstimator (e.g. optical_flow/0_1.npy for rgb/0.png, rgb/1.png)"""
+    return os.path.join(sub_dir, f'{Path(fname).stem}_{Path(next_fname).stem}.{ext}')
+
+
+def create_stride_pairs(frames_df, strides, frame_col='path_to_rgb'):
+    """
+    Creates rows of (i, i + stride) pairs for every stride from dataframe of single frames with global poses.
+
+    Args:
+        frames_df:  dataframe of single frames with global euler angles and translations (saved by
+                    prepare_trajectory as frames.csv)
+        strides:    int or list of ints
+        frame_col:  column with frame paths, pair products are named after it
+
+    Returns:
+        dataframe of pairs as prepared by prepare_trajectory (<col> and <col>_next columns, relative dofs)
+        with stride column
+    """
+    strides = [strides] if isinstance(strides, int) else list(strides)
+
+    first_part_indices, second_part_indices, pair_strides = list(), list(), list()
+    for stride in strides:
+        assert stride >= 1
+        first_part_indices.append(np.arange(len(frames_df) - stride))
+        second_part_indices.append(np.arange(stride, len(frames_df)))
+        pair_strides.append(np.full(max(len(frames_df) - stride, 0), stride))
+
+    first_part_indices = np.concatenate(first_part_indices)
+    second_part_indices = np.concatenate(second_part_indices)
+    frames_df = frames_df.reset_index(drop=True)
+
+    paired_df = transform_single_frame_df_to_paired(frames_df, zip(first_part_indices, second_part_indices))
+    global_dofs = frames_df[DOF_COLS].values
+    paired_df[DOF_COLS] = get_relative_dofs(global_dofs[first_part_indices], global_dofs[second_part_indices])
+    paired_df = paired_df.drop(columns=[col + '_next' for col in DOF_COLS])
+    paired_df['stride'] = np.concatenate(pair_strides)
+    return paired_df
+
+
+def get_pair_columns(pairs_df, frames_df):
+    """Finds pairwise products (path columns of prepared pairs which are not frame columns) and their sub dirs"""
+    pair_columns = dict()
+    for col in pairs_df.columns:
+        if not col.startswith('path_to_') or col.endswith('_next') or col in frames_df.columns:
+            continue
+        fpath = pairs_df[col].dropna()
+        if len(fpath):
+            fpath = fpath.iloc[0]
+            # compressed arrays have double extensions (e.g. npz.zst)
+            ext = get_compressed_array_ext(fpath) or os.path.splitext(fpath)[1][1:]
+            pair_columns[col] = (os.path.dirname(fpath), ext)
+    return pair_columns
+
+
+def add_pair_products(paired_df,
+                      trajectory_root,
+                      pair_columns,
+                      pair_estimators=None,
+                      frame_col='path_to_rgb'):
+    """
+    Sets paths of pairwise products (e.g. optical flow) of virtual pairs. Products already saved for some pair
+    (e.g. by preparation of stride 1) are reused, missing ones are computed by estimator with the same output
+    column and saved, so they are computed once for any set of strides.
+
+    Args:
+        paired_df:         dataframe of create_stride_pairs
+        trajectory_root:   directory of trajectory
+        pair_columns:      dict with column names as keys and (sub_dir, ext) as values
+        pair_estimators:   estimators (e.g. PWCNetEstimator) to compute missing products
+        frame_col:         column with frame paths, pair products are named after it
+
+    Returns:
+        paired_df with pair columns
+    """
+    estimators = {estimator.output_col: estimator for estimator in pair_estimators or []}
+    for estimator in estimators.values():
+        pair_columns.setdefault(estimator.output_col, (estimator.dir, estimator.ext))
+
+    for col, (sub_dir, ext) in pair_columns.items():
+        paired_df[col] = [get_pair_product_path(sub_dir, fname, next_fname, ext)
+                          for fname, next_fname in zip(paired_df[frame_col], paired_df[frame_col + '_next'])]
+
+        is_missing = np.array([not os.path.exists(os.path.join(trajectory_root, fpath)) for fpath in paired_df[col]])
+        if not is_missing.any():
+            continue
+
+        if col not in estimators:
+            raise RuntimeError(f'{is_missing.sum()} files of {col} are missing in {trajectory_root}. '
+                               f'Pass estimator for {col} in pair_estimators to compute them')
+
+        print(f'Computing {is_missing.sum()} files of {col} in {trajectory_root}')
+        missing_indices = np.where(is_missing)[0]
+        if getattr(estimators[col], 'batch', False):
+            # e.g. PWCNetMultiStrideEstimator shares computations between pairs of all strides
+            missing_df = estimators[col].run_batch(paired_df.iloc[missing_indices], trajectory_root)
+            paired_df.loc[missing_indices, col] = missing_df[col].values
+            continue
+
+        for index in missing_indices:
+            row = estimators[col].run(paired_df.iloc[index].copy(), trajectory_root)
+            paired_df.at[index, col] = row[col]
+
+    return paired_df
+
+
+def load_stride_pairs(trajectory_root,
+                      strides,
+                      frames_csv_name='frames.csv',
+                      csv_name='df.csv',
+                      pair_estimators=None,
+                      frame_col='path_to_rgb'):
+    """
+    Loads single frames of trajectory and creates pairs for every stride. Pairwise products are taken from
+    pairs prepared with the trajectory (csv_name) or computed by pair_estimators.
+    """
+    frames_df = pd.read_csv(os.path.join(trajectory_root, frames_csv_name))
+    paired_df = create_stride_pairs(frames_df, strides, frame_col=frame_col)
+
+    pairs_csv_path = os.path.join(trajectory_root, csv_name)
+    pair_columns = dict()
+    if os.path.exists(pairs_csv_path):
+        pair_columns = get_pair_columns(pd.read_csv(pairs_csv_path, nrows=1), frames_df)
+
+    return add_pair_products(paired_df,
+                             trajectory_root,
+                             pair_columns,
+                             pair_estimators=pair_estimators,
+                             frame_col=frame_col)
@@ -1,23 +1,26 @@
-from .evaluate import calculate_metrics
-from .evaluate import average_metrics
-from .evaluate import normalize_metrics
-from .evaluate import calculate_loops_metrics
+from slam.utils.lazy_import import attach
 
-from .callbacks import CyclicLR
-from .callbacks import MlflowLogger
-from .callbacks import ModelCheckpoint
-from .callbacks import Predict
-from .callbacks import TerminateOnLR
 
-
-__all__ = [
-    'calculate_metrics',
-    'average_metrics',
-    'normalize_metrics',
-    'calculate_loops_metrics',
-    'CyclicLR',
-    'MlflowLogger',
-    'ModelCheckpoint',
-    'Predict',
-    'TerminateOnLR'
-]
+__getattr__, __dir__, __all__ = attach(__name__, {
+    'evaluate': ['calculate_metrics',
+                 'average_metrics',
+                 'normalize_metrics',
+                 'calculate_loops_metrics',
+                 'calculate_loops_mae',
+                 'GTMetricsContext'],
+    'batch_evaluate': ['calculate_metrics_batch'],
+    'streaming': ['evaluate_files',
+                  'evaluate_dataset',
+                  'RunningMetrics'],
+    'directory_evaluation': ['MetricsCache',
+                             'find_prediction_files',
+                             'evaluate_predictions',
+                             'aggregate_predictions',
+                             'normalize_predictions'],
+    'callbacks': ['CyclicLR',
+                  'MlflowLogger',
+                  'ModelCheckpoint',
+                  'Predict',
+                  'ProfilerCallback',
+                  'TerminateOnLR']
+})
@@ -0,0 +1,347 @@
+import numpy as np
+import torch
+from contextlib import contextmanager
+
+from slam.evaluation.evaluate import get_steps, get_pairs_of_indices, calculate_cumulative_distances
+
+
+def pad(arrays, device='cpu'):
+    """
+    Stacks arrays of different length into a single zero-padded tensor.
+
+    Args:
+        arrays:  list of nparrays, n_i x ...
+        device:  torch device
+
+    Returns:
+        padded:  tensor, batch_size x max(n_i) x ...
+        lengths: nparray, batch_size
+    """
+    lengths = np.array([len(array) for array in arrays])
+    padded = np.zeros((len(arrays), max(list(lengths) + [1])) + arrays[0].shape[1:])
+    for index, array in enumerate(arrays):
+        padded[index, :len(array)] = array
+    return torch.from_numpy(padded).to(device), lengths
+
+
+def get_mask(lengths, max_length, device='cpu'):
+    lengths = torch.from_numpy(np.asarray(lengths)).to(device)
+    return (torch.arange(max_length, device=device)[None] < lengths[:, None]).double()
+
+
+def quaternions_to_rotation_matrices(quaternions):
+    """..., 4 (q_w, q_x, q_y, q_z) in, ..., 3, 3 out"""
+    norms = (quaternions ** 2).sum(-1, keepdim=True) ** 0.5
+    w, x, y, z = (quaternions / norms.clamp(min=1e-12)).unbind(-1)
+    rows = [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w),
+            2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w),
+            2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)]
+    return torch.stack(rows, -1).view(quaternions.shape[:-1] + (3, 3))
+
+
+def euler_angles_to_rotation_matrices(euler_angles):
+    """..., 3 (euler_x, euler_y, euler_z) in, ..., 3, 3 out. Same convention as convert_euler_angles_to_rotation_matrix"""
+    cos_r, cos_p, cos_y = torch.cos(euler_angles).unbind(-1)
+    sin_r, sin_p, sin_y = torch.sin(euler_angles).unbind(-1)
+    rows = [cos_y * cos_p, cos_y * sin_p * sin_r - sin_y * cos_r, cos_y * sin_p * cos_r + sin_y * sin_r,
+            sin_y * cos_p, sin_y * sin_p * sin_r + cos_y * cos_r, sin_y * sin_p * cos_r - cos_y * sin_r,
+            -sin_p, cos_p * sin_r, cos_p * cos_r]
+    return torch.stack(rows, -1).view(euler_angles.shape[:-1] + (3, 3))
+
+
+def integrate(relative_dofs):
+    """
+    Integrates relative poses into global trajectories with a parallel prefix product (log2(n) batched matmuls).
+
+    Args:
+        relative_dofs: tensor, batch_size x n x 6 (euler_x, euler_y, euler_z, t_x, t_y, t_z)
+
+    Returns:
+        rotation matrices: tensor, batch_size x (n + 1) x 3 x 3
+        points:            tensor, batch_size x (n + 1) x 3
+    """
+    batch_size, length = relative_dofs.shape[:2]
+    transformations = relative_dofs.new_zeros((batch_size, length + 1, 4, 4))
+    transformations[..., 3, 3] = 1
+    transformations[:, 0, :3, :3] = torch.eye(3, dtype=relative_dofs.dtype, device=relative_dofs.device)
+    transformations[:, 1:, :3, :3] = euler_angles_to_rotation_matrices(relative_dofs[..., :3])
+    transformations[:, 1:, :3, 3] = relative_dofs[..., 3:]
+
+    offset = 1
+    while offset < length + 1:
+        transformations = torch.cat([transformations[:, :offset],
+                                     torch.matmul(transformations[:, :-offset], transformations[:, offset:])], 1)
+        offset *= 2
+
+    return transformations[..., :3, :3], transformations[..., :3, 3]
+
+
+def align(points, reference_points, mask):
+    """
+    Batched version of slam.linalg.align (by='mean').
+
+    Args:
+        points:           tensor, batch_size x n x 3
+        reference_points: tensor, batch_size x n x 3
+        mask:             tensor, batch_size x n
+
+    Returns:
+        rotation matrices: tensor, batch_size x 3 x 3
+        translations:      tensor, batch_size x 3
+        scales:            tensor, batch_size
+    """
+    counts = mask.sum(1, keepdim=True).clamp(min=1)
+    align_points = (points * mask[..., None]).sum(1) / counts
+    reference_align_points = (reference_points * mask[..., None]).sum(1) / counts
+
+    points_shifted = (points - align_points[:, None]) * mask[..., None]
+    reference_points_shifted = (reference_points - reference_align_points[:, None]) * mask[..., None]
+
+    W = torch.einsum('bni,bnj->bij', (points_shifted, reference_points_shifted))
+
+    # 3 x 3 decompositions are negligible next to the reductions above, and batched svd/det are not available
+    # in every supported torch version
+    U, _, Vh = np.linalg.svd(W.transpose(1, 2).cpu().numpy())
+    S = np.tile(np.eye(3), (len(U), 1, 1))
+    S[np.linalg.det(U) * np.linalg.det(Vh) < 0, 2, 2] = -1
+    rotation_matrices = torch.from_numpy(U @ S @ Vh).to(points.device)
+
+    points_rotated = torch.matmul(points_shifted, rotation_matrices.transpose(1, 2))
+    dots = (reference_points_shifted * points_rotated).sum((1, 2))
+    norms = (points_shifted ** 2).sum((1, 2))
+    scales = dots / norms
+    translations = reference_align_points - scales[:, None] * torch.matmul(align_points[:, None],
+                                                                           rotation_matrices.transpose(1, 2))[:, 0]
+    return rotation_matrices, translations, scales
+
+
+def calculate_absolute_trajectory_error(gt_points, predicted_points, mask):
+    rotation_matrices, translations, scales = align(predicted_points, gt_points, mask)
+    predicted_points_aligned = scales[:, None, None] * torch.matmul(predicted_points, rotation_matrices.transpose(1, 2)) \
+        + translations[:, None]
+    pointwise_distances = ((predicted_points_aligned - gt_points) ** 2).sum(2) * mask
+    return (pointwise_distances.sum(1) / mask.sum(1).clamp(min=1)) ** 0.5
+
+
+def _get_kitti_indices(lengths, has_step, step, rpe_mode, distances):
+    """Pads pairs of distance-based indices for the given step of every trajectory, which has this step"""
+    first_indices = [[] for _ in lengths]
+    second_indices = [[] for _ in lengths]
+    for index, length in enumerate(lengths):
+        if has_step[index]:
+            first_indices[index], second_indices[index] = get_pairs_of_indices(
+                length, step, stride=(1 if rpe_mode == 'rmse' else 10), distances=distances[index])
+
+    max_pairs = max(len(indices) for indices in first_indices)
+    first = np.zeros((len(lengths), max_pairs), dtype=np.int64)
+    second = np.zeros((len(lengths), max_pairs), dtype=np.int64)
+    mask = np.zeros((len(lengths), max_pairs))
+    for index in range(len(lengths)):
+        pairs_num = len(first_indices[index])
+        first[index, :pairs_num] = first_indices[index]
+        second[index, :pairs_num] = second_indices[index]
+        mask[index, :pairs_num] = 1
+    return first, second, mask
+
+
+def _calculate_errors(R_first, R_gt_inv_second, R_predicted_second, delta_predicted, delta_gt):
+    E_translation = torch.matmul(R_first, delta_predicted[..., None])[..., 0] - delta_gt
+    l2_norms = (E_translation ** 2).sum(-1)
+
+    # trace(A @ B) == sum(A * B^T), which saves the last matmul
+    traces = (torch.matmul(R_gt_inv_second, R_first) * R_predicted_second.transpose(-1, -2)).sum((-1, -2))
+    thetas = torch.acos(torch.clamp((traces - 1) / 2, -1, 1)) * 180 / np.pi
+    return l2_norms, thetas
+
+
+def calculate_relative_pose_error(gt_points, gt_rotation_matrices,
+                                  predicted_points, predicted_rotation_matrices,
+                                  lengths, rpe_indices='full', rpe_modes=('rpe', 'rmse')):
+    """
+    Batched version of slam.evaluation.calculate_relative_pose_error. Errors of every step are computed once
+    for all requested modes unless indices depend on mode (rpe_indices='kitti').
+
+    Args:
+        gt_points:                   tensor, batch_size x n x 3
+        gt_rotation_matrices:        tensor, batch_size x n x 3 x 3
+        predicted_points:            tensor, batch_size x n x 3
+        predicted_rotation_matrices: tensor, batch_size x n x 3 x 3
+        lengths:                     nparray, batch_size
+        rpe_indices:                 'sqrt', 'log', 'full' or 'kitti'
+        rpe_modes:                   sequence of 'rpe' and/or 'rmse'
+
+    Returns:
+        dict with (RPE translation, RPE rotation, RPE divider) for every mode, each is nparray of batch_size
+    """
+    device = gt_points.device
+    batch_size = len(lengths)
+    batch_indices = torch.arange(batch_size, device=device)[:, None]
+
+    R = torch.matmul(gt_rotation_matrices, predicted_rotation_matrices.transpose(2, 3))
+    R_gt_inv = gt_rotation_matrices.transpose(2, 3)
+
+    distances = None
+    if rpe_indices == 'kitti':
+        distances = [calculate_cumulative_distances(points[:length])
+                     for points, length in zip(gt_points.cpu().numpy(), lengths)]
+
+    rpe_translation = {mode: torch.zeros(batch_size, dtype=torch.float64, device=device) for mode in rpe_modes}
+    rpe_rotation = {mode: torch.zeros(batch_size, dtype=torch.float64, device=device) for mode in rpe_modes}
+    num_samples = {mode: np.zeros(batch_size) for mode in rpe_modes}
+
+    def accumulate(rpe_mode, l2_norms, thetas, mask, pairs_num, scale):
+        if rpe_mode == 'rmse':
+            counts = torch.from_numpy(np.maximum(pairs_num, 1)).to(device)
+            t_err = ((l2_norms * mask).sum(1) / counts) ** 0.5
+            r_err = ((thetas ** 2 * mask).sum(1) / counts) ** 0.5
+        else:
+            t_err = (l2_norms ** 0.5 * mask).sum(1)
+            r_err = (thetas * mask).sum(1)
+
+        rpe_translation[rpe_mode] += t_err * scale
+        rpe_rotation[rpe_mode] += r_err * scale
+        num_samples[rpe_mode] += pairs_num
+
+    steps = [set(get_steps(length, rpe_indices)) for length in lengths]
+    max_length = gt_points.shape[1]
+    for step in sorted(set().union(*steps)):
+        has_step = np.array([step in trajectory_steps for trajectory_steps in steps])
+
+        if rpe_indices == 'kitti':
+            for rpe_mode in rpe_modes:
+                first, second, mask = _get_kitti_indices(lengths, has_step, step, rpe_mode, distances)
+                pairs_num = mask.sum(1)
+                if not pairs_num.any():
+                    continue
+
+                first = torch.from_numpy(first).to(device)
+                second = torch.from_numpy(second).to(device)
+                l2_norms, thetas = _calculate_errors(
+                    R[batch_indices, first],
+                    R_gt_inv[batch_indices, second],
+                    predicted_rotation_matrices[batch_indices, second],
+                    predicted_points[batch_indices, second] - predicted_points[batch_indices, first],
+                    gt_points[batch_indices, second] - gt_points[batch_indices, first])
+                accumulate(rpe_mode, l2_norms, thetas, torch.from_numpy(mask).to(device), pairs_num, 100. / step)
+        else:
+            if step >= max_length:
+                continue
+
+            # consecutive indices, so pairs are plain slices of padded tensors
+            mask = (np.arange(max_length - step)[None] + step < lengths[:, None]) & has_step[:, None]
+            mask = mask.astype(np.float64)
+            pairs_num = mask.sum(1)
+            l2_norms, thetas = _calculate_errors(
+                R[:, :-step],
+                R_gt_inv[:, step:],
+                predicted_rotation_matrices[:, step:],
+                predicted_points[:, step:] - predicted_points[:, :-step],
+                gt_points[:, step:] - gt_points[:, :-step])
+            for rpe_mode in rpe_modes:
+                accumulate(rpe_mode, l2_norms, thetas, torch.from_numpy(mask).to(device), pairs_num, 1.)
+
+    errors = dict()
+    for rpe_mode in rpe_modes:
+        translation = rpe_translation[rpe_mode].cpu().numpy()
+        rotation = rpe_rotation[rpe_mode].cpu().numpy()
+
+        if rpe_mode == 'rmse':
+            steps_num = np.array([len(trajectory_steps) for trajectory_steps in steps])
+            errors[rpe_mode] = (translation / steps_num, rotation / steps_num, np.ones(batch_size))
+        else:
+            errors[rpe_mode] = (translation, rotation, num_samples[rpe_mode])
+
+    return errors
+
+
+def calculate_loops_mae(gt_loops, predicted_loops, device='cpu'):
+    """Batched version of slam.evaluation.calculate_loops_mae over lists of m_i x 6 arrays"""
+    gt_loops, lengths = pad(gt_loops, device)
+    predicted_loops, _ = pad(predicted_loops, device)
+    mask = get_mask(lengths, gt_loops.shape[1], device)
+
+    dofs_mae = ((gt_loops - predicted_loops).abs() * mask[..., None]).sum(1) / mask.sum(1, keepdim=True).clamp(min=1)
+    dofs_mae = dofs_mae.cpu().numpy()
+    return [{'loops_MAE_t': np.mean(mae[3:]), 'loops_MAE_r': np.mean(mae[:3])} for mae in dofs_mae]
+
+
+@contextmanager
+def torch_num_threads(num_threads=None):
+    """Sets number of threads of CPU torch (if given) and restores the previous one on exit"""
+    previous_num_threads = torch.get_num_threads()
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    try:
+        yield
+    finally:
+        if num_threads:
+            torch.set_num_threads(previous_num_threads)
+
+
+def calculate_metrics_batch(gt_trajectories,
+                            predicted_trajectories,
+                            gt_loops=None,
+                            predicted_loops=None,
+                            rpe_indices='full',
+                            relative=False,
+                            cuda=False,
+                            num_threads=None):
+    """
+    Calculates metrics of many trajectories at once with torch: trajectories are padded to the same length and
+    every step is a single batched operation with masks.
+
+    Args:
+        gt_trajectories:        list of nparrays, either global poses n_i x 7 (see AbstractTrajectory.to_array)
+                                or relative poses of consecutive frames (n_i - 1) x 6 if relative=True
+        predicted_trajectories: list of nparrays, same format as gt_trajectories
+        gt_loops:               list of nparrays m_i x 6 or None
+        predicted_loops:        list of nparrays m_i x 6 or None
+        rpe_indices:            see calculate_relative_pose_error
+        relative:               whether trajectories have to be integrated first
+        cuda:                   whether to use GPU
+        num_threads:            number of threads for CPU torch during the call
+
+    Returns:
+        list of dicts, same as calculate_metrics (and calculate_loops_mae if loops are given) for every trajectory
+    """
+    if not len(gt_trajectories):
+        return list()
+
+    with torch_num_threads(num_threads):
+        device = 'cuda' if cuda else 'cpu'
+
+        gt, lengths = pad(gt_trajectories, device)
+        predicted, predicted_lengths = pad(predicted_trajectories, device)
+        assert np.all(lengths == predicted_lengths), 'Trajectories must have the same length'
+
+        if relative:
+            gt_rotation_matrices, gt_points = integrate(gt)
+            predicted_rotation_matrices, predicted_points = integrate(predicted)
+            lengths = lengths + 1
+        else:
+            gt_rotation_matrices, gt_points = quaternions_to_rotation_matrices(gt[..., :4]), gt[..., 4:]
+            predicted_rotation_matrices, predicted_points = \
+                quaternions_to_rotation_matrices(predicted[..., :4]), predicted[..., 4:]
+
+        mask = get_mask(lengths, gt_points.shape[1], device)
+        ate = calculate_absolute_trajectory_error(gt_points, predicted_points, mask).cpu().numpy()
+
+        poses = (gt_points, gt_rotation_matrices, predicted_points, predicted_rotation_matrices, lengths)
+        errors = calculate_relative_pose_error(*poses, rpe_indices=rpe_indices)
+        rpe_t, rpe_r, divider = errors['rpe']
+        rmse_t, rmse_r, _ = errors['rmse']
+
+        records = list()
+        for index in range(len(lengths)):
+            records.append({'ATE': ate[index],
+                            'RMSE_t': rmse_t[index],
+                            'RMSE_r': rmse_r[index],
+                            'RPE_t': rpe_t[index],
+                            'RPE_r': rpe_r[index],
+                            'RPE_divider': divider[index]})
+
+        if gt_loops is not None:
+            for record, loops_metrics in zip(records, calculate_loops_mae(gt_loops, predicted_loops, device)):
+                record.update(loops_metrics)
+
+        return records
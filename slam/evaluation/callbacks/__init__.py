@@ -9,6 +9,8 @@ from .model_checkpoint_callback import ModelCheckpoint
 
 from .predict_callback import Predict
 
+from .profiler_callback import ProfilerCallback
+
 from .terminate_on_lr_callback import TerminateOnLR
 
 
@@ -17,6 +19,7 @@ __all__ = [
     'MlflowLogger',
     'ModelCheckpoint',
     'Predict',
+    'ProfilerCallback',
     'TerminateOnLR'
 ]
 
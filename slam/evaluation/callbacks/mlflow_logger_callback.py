@@ -3,6 +3,8 @@ import keras
 import mlflow
 import numpy as np
 
+from slam.utils import ArtifactSyncer, buffered_logger
+
 
 class MlflowLogger(keras.callbacks.Callback):
 
@@ -25,6 +27,7 @@ class MlflowLogger(keras.callbacks.Callback):
 
         os.makedirs(self.run_dir, exist_ok=True)
         self.save_artifacts = self.run_dir and self.artifact_dir
+        self.artifact_syncer = None
 
     def on_epoch_end(self, epoch, logs=None):
         logs = logs or {}
@@ -32,6 +35,7 @@ class MlflowLogger(keras.callbacks.Callback):
 
         try:
             if mlflow.active_run():
+                metrics = dict()
                 for key, value in dict({'epoch': epoch + 1, **logs}).items():
                     if key in self.ignore:
                         continue
@@ -40,10 +44,14 @@ class MlflowLogger(keras.callbacks.Callback):
                     if self.prefix:
                         name = self.prefix + '_' + name
 
-                    mlflow.log_metric(name, float(value), step=epoch)
+                    metrics[name] = float(value)
+
+                buffered_logger.log_metrics(metrics, step=epoch)
 
                 if self.save_artifacts:
-                    mlflow.log_artifacts(self.run_dir, self.artifact_dir)
+                    if self.artifact_syncer is None:
+                        self.artifact_syncer = ArtifactSyncer(self.run_dir, self.artifact_dir)
+                    self.artifact_syncer.sync()
         except Exception as e:
             print(e)
 
@@ -51,4 +59,11 @@ class MlflowLogger(keras.callbacks.Callback):
 
     def on_train_end(self, logs=None):
         logs = self.on_epoch_end(self.epoch, logs)
+        try:
+            buffered_logger.flush()
+        except Exception as e:
+            print(f'Failed to log buffered params and metrics to mlflow: {e}')
+        if self.artifact_syncer is not None:
+            self.artifact_syncer.close()
+            self.artifact_syncer = None
         return logs
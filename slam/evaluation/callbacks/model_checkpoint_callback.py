@@ -35,7 +35,8 @@ class ModelCheckpoint(keras.callbacks.ModelCheckpoint):
         if reuse:
             file_path = self.filepath.format(epoch=self.epoch + 1, **logs)
             if self.last_file_path != file_path:
-                shutil.copyfile(self.last_file_path, file_path)
+                # keras rewrites checkpoints in place, so final checkpoint is copied rather than linked
+                shutil.copy2(self.last_file_path, file_path)
         else:
             self.save_best_only = False
             self.period = 1
@@ -1,38 +1,54 @@
 import os
-import shutil
 import numpy as np
 import pandas as pd
 from collections import Counter
 from multiprocessing import Pool
+from concurrent.futures import ThreadPoolExecutor
 
 import keras
 from pathlib import Path
 
-from slam.evaluation import calculate_metrics, average_metrics, normalize_metrics, calculate_loops_metrics
-from slam.linalg import RelativeTrajectory, convert
+from slam.evaluation import (calculate_metrics,
+                             calculate_metrics_batch,
+                             GTMetricsContext,
+                             average_metrics,
+                             normalize_metrics,
+                             calculate_loops_mae)
+from slam.linalg import GlobalTrajectory, RelativeTrajectory, convert
 from slam.utils import (visualize_trajectory_with_gt,
                         visualize_trajectory,
                         create_vis_file_path,
                         create_prediction_file_path,
+                        link_or_copy,
+                        link_or_copy_tree,
+                        replacing_file,
+                        buffered_logger,
                         chmod)
 
 
+# GTMetricsContext of every trajectory, set once per worker process by pool initializer
+gt_contexts = dict()
+
+
+def set_gt_contexts(contexts):
+    global gt_contexts
+    gt_contexts = contexts
+
+
 def process_single_task(args):
-    predicted_df = args['predicted_df']
-    gt_df = args['gt_df']
-    gt_trajectory = args['gt']
-    predicted_trajectory = args['predicted']
-    rpe_indices = args['rpe_indices']
-    backend = args['backend']
-    cuda = args['cuda']
-    loop_threshold = args['loop_threshold']
-    trajectory_metrics = calculate_metrics(gt_trajectory,
-                                           predicted_trajectory,
-                                           rpe_indices=rpe_indices,
-                                           backend=backend,
-                                           cuda=cuda)
-
-    loops_metrics = calculate_loops_metrics(gt_df, predicted_df, loop_threshold)
+    predicted_trajectory = GlobalTrajectory.from_array(args['predicted'])
+    context = args.get('context') or gt_contexts.get(args.get('context_key'))
+    if context is not None:
+        trajectory_metrics = context.calculate_metrics(predicted_trajectory)
+    else:
+        gt_trajectory = GlobalTrajectory.from_array(args['gt'])
+        trajectory_metrics = calculate_metrics(gt_trajectory,
+                                               predicted_trajectory,
+                                               rpe_indices=args['rpe_indices'],
+                                               backend=args['backend'],
+                                               cuda=args['cuda'])
+
+    loops_metrics = calculate_loops_mae(args['gt_loops'], args['predicted_loops'])
     trajectory_metrics.update(loops_metrics)
 
     return trajectory_metrics
@@ -52,7 +68,24 @@ class Predict(keras.callbacks.Callback):
                  backend='numpy',
                  cuda=False,
                  workers=8,
+                 asynchronous=False,
+                 max_pending=2,
+                 checkpoint_path=None,
+                 prefix=None,
+                 visuals_format='npz',
                  **kwargs):
+        """
+        Args:
+            asynchronous: if True, only predictions are made at the end of epoch. Trajectory integration,
+                metrics and artifacts are computed in background thread while next epoch is trained.
+                Metrics are logged to mlflow with step of the epoch they belong to once ready.
+            max_pending: maximum number of evaluations waiting in background, training waits if exceeded
+            checkpoint_path: if given, model weights are saved together with predictions (same best/period
+                logic and template). In asynchronous mode weights are snapshotted when predictions are made.
+            prefix: prefix of metrics logged to mlflow in asynchronous mode
+            visuals_format: 'npz' saves poses of trajectories (render them with
+                scripts/visualization/render_trajectories.py), 'html' saves plotly pages right away
+        """
 
         super().__init__(**kwargs)
 
@@ -71,15 +104,28 @@ class Predict(keras.callbacks.Callback):
         else:
             self.template = '_'.join(['{epoch:03d}', self.monitor, '{' + self.monitor + ':.6f}'])
         self.max_to_visualize = max_to_visualize
+        if visuals_format not in ('npz', 'html'):
+            raise ValueError(f'Unknown visuals format option: "{visuals_format}"')
+        self.visuals_format = visuals_format
         self.evaluate = evaluate
         self.rpe_indices = rpe_indices
         self.backend = backend
         self.cuda = cuda
-        self.workers = workers if backend == 'numpy' else 0
+        self.workers = workers
 
         self.last_prediction_id = None
         self.last_logs = None
 
+        self.asynchronous = asynchronous
+        self.max_pending = max_pending
+        self.checkpoint_path = checkpoint_path
+        self.last_checkpoint_path = None
+        self.prefix = prefix
+        self.executor = ThreadPoolExecutor(max_workers=1) if self.asynchronous else None
+        self.pool = None
+        self.pending = list()
+        self.evaluated_logs = dict()
+
         self.train_generator = dataset.get_train_generator(as_is=self.evaluate, augment=False)
         self.val_generator = dataset.get_val_generator(augment=False)
         self.test_generator = dataset.get_test_generator(augment=False)
@@ -91,7 +137,16 @@ class Predict(keras.callbacks.Callback):
         self.y_cols = self.train_generator.y_cols[:]
         self.dof_cols = self.train_generator.dof_cols[:]
 
-    def _create_trajectory(self, df, T=None):
+        # gt side of every trajectory does not change during training, so it is prepared once
+        self.gt_cache = dict()
+        for subset, generator in (('train', self.train_generator),
+                                  ('val', self.val_generator),
+                                  ('test', self.test_generator)):
+            if generator is not None:
+                self.gt_cache[subset] = self._create_gt_cache(generator.df)
+
+    def _get_relative_dofs(self, df, T=None):
+        """Converts dofs of df with T (in place) and returns dofs of pairs of minimal stride"""
         if T is not None:
             for index, row in df.iterrows():
                 dofs = row[self.dof_cols].values
@@ -102,7 +157,17 @@ class Predict(keras.callbacks.Callback):
         index_difference = df.to_index - df.from_index
         min_stride = np.min(index_difference.values)
         consecutive_df = df[index_difference == min_stride].reset_index(drop=True)
-        return RelativeTrajectory.from_dataframe(consecutive_df[self.dof_cols]).to_global()
+        return consecutive_df[self.dof_cols]
+
+    def _create_trajectory(self, df, T=None):
+        return RelativeTrajectory.from_dataframe(self._get_relative_dofs(df, T=T)).to_global()
+
+    @staticmethod
+    def _get_predicted_trajectory(task):
+        """With torch backend predicted trajectory is integrated only when it is visualized"""
+        if task['predicted'] is None:
+            task['predicted'] = RelativeTrajectory.from_dataframe(task['predicted_relative']).to_global()
+        return task['predicted']
 
     def _create_prediction_file_path(self, trajectory_id, subset, prediction_id):
         return create_prediction_file_path(trajectory_id=trajectory_id,
@@ -114,7 +179,8 @@ class Predict(keras.callbacks.Callback):
         return create_vis_file_path(trajectory_id=trajectory_id,
                                     subset=subset,
                                     prediction_id=prediction_id,
-                                    save_dir=self.save_dir)
+                                    save_dir=self.save_dir,
+                                    ext=self.visuals_format)
 
     @staticmethod
     def _get_dir(prediction_id, create_file_path):
@@ -134,7 +200,9 @@ class Predict(keras.callbacks.Callback):
                                                 trajectory_id=trajectory_id,
                                                 prediction_id=prediction_id,
                                                 subset=subset)
-        predictions.to_csv(file_path)
+        # files are replaced instead of rewritten in place, so that final predictions linked to them do not change
+        with replacing_file(file_path) as tmp_path:
+            predictions.to_csv(tmp_path)
         chmod(file_path)
 
     def _visualize_trajectory(self,
@@ -144,21 +212,27 @@ class Predict(keras.callbacks.Callback):
                               subset,
                               prediction_id,
                               record=None):
-        file_path = create_vis_file_path(save_dir=self.save_dir,
-                                         trajectory_id=trajectory_id,
-                                         prediction_id=prediction_id,
-                                         subset=subset)
+        file_path = self._create_vis_file_path(trajectory_id, subset, prediction_id)
 
-        if gt_trajectory is None:
+        if gt_trajectory is None or record is None:
             title = trajectory_id.upper()
-            visualize_trajectory(predicted_trajectory, title=title, file_path=file_path)
         else:
             record_as_str = ', '.join([f'{k}: {v:.6f}' for k, v in normalize_metrics(record).items()])
             title = f'{trajectory_id.upper()}: {record_as_str}'
-            visualize_trajectory_with_gt(gt_trajectory,
-                                         predicted_trajectory,
-                                         title=title,
-                                         file_path=file_path)
+
+        with replacing_file(file_path) as tmp_path:
+            if self.visuals_format == 'npz':
+                arrays = {'predicted': predicted_trajectory.to_array(), 'title': title}
+                if gt_trajectory is not None:
+                    arrays['gt'] = gt_trajectory.to_array()
+                np.savez_compressed(tmp_path, **arrays)
+            elif gt_trajectory is None:
+                visualize_trajectory(predicted_trajectory, title=title, file_path=tmp_path)
+            else:
+                visualize_trajectory_with_gt(gt_trajectory,
+                                             predicted_trajectory,
+                                             title=title,
+                                             file_path=tmp_path)
         chmod(file_path)
 
     def _predict_generator(self, generator):
@@ -177,18 +251,22 @@ class Predict(keras.callbacks.Callback):
         predictions['path_to_rgb_next'] = generator.df.path_to_rgb_next
         return predictions
 
-    def _create_tasks(self, generator, subset):
-        tasks = []
-
+    def _predict_subset(self, generator):
         if generator is None:
-            return tasks
-
-        gt = generator.df
-        predictions = self._predict_generator(generator)
-
-        for trajectory_id, indices in gt.groupby(by='trajectory_id').indices.items():
-
-            predicted_df = predictions.iloc[indices].copy()
+            return None
+        return generator.df, self._predict_generator(generator)
+
+    def _create_gt_cache(self, gt):
+        """
+        Returns:
+            dict with indices of rows, gt_df, GlobalTrajectory and GTMetricsContext (if evaluate) of every trajectory
+        """
+        gt_cache = dict()
+        groups = gt.groupby(by='trajectory_id').indices
+        gt = gt[[col for col in ['path_to_rgb', 'path_to_rgb_next', 'T_cam_body'] + self.dof_cols
+                 if col in gt.columns]]
+
+        for trajectory_id, indices in groups.items():
             gt_df = gt.iloc[indices].copy()
 
             if 'T_cam_body' in gt_df.columns:
@@ -196,18 +274,44 @@ class Predict(keras.callbacks.Callback):
             else:
                 T_cam_body = None
 
-            predicted_trajectory = self._create_trajectory(predicted_df, T=T_cam_body)
-
+            gt_relative = None
+            gt_trajectory = None
+            context = None
             if self.evaluate:
-                gt_trajectory = self._create_trajectory(gt_df, T=T_cam_body)
-            else:
-                gt_df = None
-                gt_trajectory = None
+                gt_relative = self._get_relative_dofs(gt_df, T=T_cam_body)
+                gt_trajectory = RelativeTrajectory.from_dataframe(gt_relative).to_global()
+                if self.backend == 'numpy':
+                    context = GTMetricsContext(gt_trajectory, rpe_indices=self.rpe_indices)
+
+            gt_cache[trajectory_id] = {'indices': indices,
+                                       'T': T_cam_body,
+                                       'gt_df': gt_df if self.evaluate else None,
+                                       'gt': gt_trajectory,
+                                       'gt_relative': gt_relative,
+                                       'context': context}
+        return gt_cache
+
+    def _create_tasks_from_predictions(self, subset_predictions, subset):
+        tasks = []
+
+        if subset_predictions is None:
+            return tasks
+
+        _, predictions = subset_predictions
+        for trajectory_id, gt_entry in self.gt_cache[subset].items():
+            predicted_df = predictions.iloc[gt_entry['indices']].copy()
+            predicted_relative = self._get_relative_dofs(predicted_df, T=gt_entry['T'])
+            # with torch backend trajectories are integrated in batch by calculate_metrics_batch
+            predicted_trajectory = (None if self.backend == 'torch'
+                                    else RelativeTrajectory.from_dataframe(predicted_relative).to_global())
 
             tasks.append({'predicted_df': predicted_df,
-                          'gt_df': gt_df,
+                          'gt_df': gt_entry['gt_df'],
                           'predicted': predicted_trajectory,
-                          'gt': gt_trajectory,
+                          'predicted_relative': predicted_relative,
+                          'gt': gt_entry['gt'],
+                          'gt_relative': gt_entry['gt_relative'],
+                          'context': gt_entry['context'],
                           'id': trajectory_id,
                           'subset': subset,
                           'rpe_indices': self.rpe_indices,
@@ -217,6 +321,9 @@ class Predict(keras.callbacks.Callback):
 
         return tasks
 
+    def _create_tasks(self, generator, subset):
+        return self._create_tasks_from_predictions(self._predict_subset(generator), subset)
+
     def _save_tasks(self, tasks, prediction_id, max_to_visualize=None):
         max_to_visualize = max_to_visualize or len(tasks)
 
@@ -233,7 +340,7 @@ class Predict(keras.callbacks.Callback):
 
             if counter[subset] < max_to_visualize:
                 gt_trajectory = task['gt']
-                predicted_trajectory = task['predicted']
+                predicted_trajectory = self._get_predicted_trajectory(task)
                 record = task.get('record', None)
 
                 self._visualize_trajectory(predicted_trajectory,
@@ -244,12 +351,68 @@ class Predict(keras.callbacks.Callback):
                                            record)
             counter[subset] += 1
 
+    @staticmethod
+    def _get_loops(task):
+        """Returns gt and predicted dofs of loops of task"""
+        dofs = ['euler_x', 'euler_y', 'euler_z', 't_x', 't_y', 't_z']
+        gt_df = task['gt_df']
+        is_loop = (gt_df.to_index - gt_df.from_index >= task['loop_threshold']).values
+        return gt_df[dofs].values[is_loop], task['predicted_df'][dofs].values[is_loop]
+
+    def _create_payload(self, task):
+        """
+        Packs only arrays needed for metrics, so that sending task to worker is cheap. GTMetricsContext is sent to
+        workers once, when pool is created, so only its key is packed.
+        """
+        gt_loops, predicted_loops = self._get_loops(task)
+        payload = {'predicted': task['predicted'].to_array(),
+                   'gt_loops': gt_loops,
+                   'predicted_loops': predicted_loops,
+                   'rpe_indices': task['rpe_indices'],
+                   'backend': task['backend'],
+                   'cuda': task['cuda']}
+
+        if task.get('context') is None:
+            payload['gt'] = task['gt'].to_array()
+        elif self.workers:
+            payload['context_key'] = (task['subset'], task['id'])
+        else:
+            payload['context'] = task['context']
+        return payload
+
+    def _get_pool(self):
+        if self.pool is None:
+            contexts = {(subset, trajectory_id): gt_entry['context']
+                        for subset, subset_cache in self.gt_cache.items()
+                        for trajectory_id, gt_entry in subset_cache.items()
+                        if gt_entry['context'] is not None}
+            self.pool = Pool(self.workers, initializer=set_gt_contexts, initargs=(contexts,))
+        return self.pool
+
+    def _close_pool(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
     def _process_tasks(self, tasks):
+        if self.backend == 'torch':
+            # relative dofs are integrated on tensors together with metrics
+            loops = [self._get_loops(task) for task in tasks]
+            return calculate_metrics_batch([task['gt_relative'].values for task in tasks],
+                                           [task['predicted_relative'].values for task in tasks],
+                                           [gt_loops for gt_loops, _ in loops],
+                                           [predicted_loops for _, predicted_loops in loops],
+                                           rpe_indices=self.rpe_indices,
+                                           relative=True,
+                                           cuda=self.cuda,
+                                           num_threads=self.workers)
+
+        payloads = [self._create_payload(task) for task in tasks]
         if self.workers:
-            with Pool(self.workers) as pool:
-                records = [res for res in pool.imap(process_single_task, tasks)]
+            records = self._get_pool().map(process_single_task, payloads)
         else:
-            records = [process_single_task(task) for task in tasks]
+            records = [process_single_task(payload) for payload in payloads]
         return records
 
     def _evaluate_tasks(self, tasks):
@@ -272,6 +435,69 @@ class Predict(keras.callbacks.Callback):
         self.best_loss = min(loss, self.best_loss)
         return is_best
 
+    def _save_weights(self, logs, epoch, weights=None):
+        file_path = self.checkpoint_path.format(epoch=epoch + 1, **logs)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        with replacing_file(file_path) as tmp_path:
+            if weights is None:
+                self.model.save_weights(tmp_path, overwrite=True)
+            else:
+                current_weights = self.model.get_weights()
+                self.model.set_weights(weights)
+                self.model.save_weights(tmp_path, overwrite=True)
+                self.model.set_weights(current_weights)
+
+        self.last_checkpoint_path = file_path
+
+    def _evaluate_predictions(self, epoch, logs, train_predictions, val_predictions):
+        train_tasks = self._create_tasks_from_predictions(train_predictions, 'train')
+        val_tasks = self._create_tasks_from_predictions(val_predictions, 'val')
+
+        if self.evaluate:
+            train_tasks, train_metrics = self._evaluate_tasks(train_tasks)
+            val_tasks, val_metrics = self._evaluate_tasks(val_tasks)
+
+            logs = dict(**logs, **train_metrics, **val_metrics)
+
+        prediction_id = self.template.format(epoch=epoch + 1, **logs)
+
+        is_saved = not self.evaluate or not self.save_best_only or self._is_best(logs)
+        if is_saved:
+            self._save_tasks(train_tasks + val_tasks, prediction_id, self.max_to_visualize)
+
+        return logs, prediction_id, is_saved
+
+    def _on_evaluated(self, epoch, logs, prediction_id, is_saved, weights=None):
+        if is_saved:
+            self.epochs_since_last_predict = self.epoch - epoch
+            self.last_prediction_id = prediction_id
+            if self.checkpoint_path:
+                self._save_weights(logs, epoch, weights)
+
+        self.evaluated_logs[epoch] = logs
+
+    def _log_evaluated(self, epoch, logs, epoch_logs):
+        metrics = dict()
+        for key, value in logs.items():
+            if key in epoch_logs:
+                continue
+            name = self.prefix + '_' + key if self.prefix else key
+            metrics[name] = float(value)
+
+        buffered_logger.log_metrics(metrics, step=epoch)
+
+    def _collect_pending(self, wait=False):
+        while self.pending:
+            epoch, epoch_logs, weights, future = self.pending[0]
+            if not wait and not future.done() and len(self.pending) < self.max_pending:
+                break
+
+            self.pending.pop(0)
+            logs, prediction_id, is_saved = future.result()
+            self._on_evaluated(epoch, logs, prediction_id, is_saved, weights)
+            self._log_evaluated(epoch, logs, epoch_logs)
+
     def on_epoch_end(self, epoch, logs=None):
         if logs is None:
             prediction_id = self.last_prediction_id
@@ -281,31 +507,44 @@ class Predict(keras.callbacks.Callback):
         self.epoch = epoch
         self.epochs_since_last_predict += 1
 
-        if self.period and self.epochs_since_last_predict % self.period == 0:
+        if self.asynchronous:
+            self._collect_pending()
 
-            train_tasks = self._create_tasks(self.train_generator, 'train')
-            val_tasks = self._create_tasks(self.val_generator, 'val')
-
-            if self.evaluate:
-                train_tasks, train_metrics = self._evaluate_tasks(train_tasks)
-                val_tasks, val_metrics = self._evaluate_tasks(val_tasks)
-
-                logs = dict(**logs, **train_metrics, **val_metrics)
+        if self.period and self.epochs_since_last_predict % self.period == 0:
 
-            prediction_id = self.template.format(epoch=epoch + 1, **logs)
+            train_predictions = self._predict_subset(self.train_generator)
+            val_predictions = self._predict_subset(self.val_generator)
 
-            if not self.evaluate or not self.save_best_only or self._is_best(logs):
-                self._save_tasks(train_tasks + val_tasks, prediction_id, self.max_to_visualize)
-                self.epochs_since_last_predict = 0
-                self.last_prediction_id = prediction_id
+            if self.asynchronous:
+                weights = self.model.get_weights() if self.checkpoint_path else None
+                future = self.executor.submit(self._evaluate_predictions,
+                                              epoch, dict(logs), train_predictions, val_predictions)
+                self.pending.append((epoch, dict(logs), weights, future))
+            else:
+                logs, prediction_id, is_saved = self._evaluate_predictions(epoch,
+                                                                           logs,
+                                                                           train_predictions,
+                                                                           val_predictions)
+                self._on_evaluated(epoch, logs, prediction_id, is_saved)
 
         self.last_logs = logs
         return logs
 
     def on_train_end(self, logs=None):
+        if self.asynchronous:
+            self._collect_pending(wait=True)
+            self.executor.shutdown()
+            self.asynchronous = False
+            if self.last_logs is not None:
+                self.last_logs = self.evaluated_logs.get(self.epoch, self.last_logs)
+
         # Check to not calculate metrics twice on_train_end
         if self.save_best_only:
             self.template = 'final'
+            if self.checkpoint_path:
+                file_dir, file_name = os.path.split(self.checkpoint_path)
+                file_name, ext = os.path.splitext(file_name)
+                self.checkpoint_path = os.path.join(file_dir, 'final' + ext)
 
         reuse = ((self.epochs_since_last_predict == 0 and self.last_prediction_id is not None)
                  or (not self.evaluate and self.last_logs is not None))
@@ -313,13 +552,16 @@ class Predict(keras.callbacks.Callback):
             logs = self.last_logs
             final_prediction_id = self.template.format(epoch=self.epoch, **logs)
 
-            final_prediction_dir = self._get_prediction_dir(final_prediction_id)
-            shutil.rmtree(final_prediction_dir)
-            shutil.copytree(self._get_prediction_dir(self.last_prediction_id), final_prediction_dir)
+            if final_prediction_id != self.last_prediction_id:
+                link_or_copy_tree(self._get_prediction_dir(self.last_prediction_id),
+                                  self._get_prediction_dir(final_prediction_id))
+                link_or_copy_tree(self._get_vis_dir(self.last_prediction_id),
+                                  self._get_vis_dir(final_prediction_id))
 
-            final_vis_dir = self._get_vis_dir(final_prediction_id)
-            shutil.rmtree(final_vis_dir)
-            shutil.copytree(self._get_vis_dir(self.last_prediction_id), final_vis_dir)
+            if self.checkpoint_path and self.last_checkpoint_path:
+                final_checkpoint_path = self.checkpoint_path.format(epoch=self.epoch + 1, **logs)
+                if final_checkpoint_path != self.last_checkpoint_path:
+                    link_or_copy(self.last_checkpoint_path, final_checkpoint_path)
         else:
             self.save_best_only = False
             self.period = 1
@@ -332,5 +574,6 @@ class Predict(keras.callbacks.Callback):
             logs = dict(**logs, **test_metrics)
 
         self._save_tasks(test_tasks, prediction_id='test')
+        self._close_pool()
 
         return logs
@@ -0,0 +1,16 @@
+import keras
+
+
+class ProfilerCallback(keras.callbacks.Callback):
+    """
+    Ends epochs of profilers (e.g. of train generator) with epoch numbers of training loop. Keras calls
+    on_epoch_end of generators without epoch number and, with workers, when they are read ahead, not when
+    epoch of training ends.
+    """
+    def __init__(self, profilers, **kwargs):
+        super().__init__(**kwargs)
+        self.profilers = profilers
+
+    def on_epoch_end(self, epoch, logs=None):
+        for profiler in self.profilers:
+            profiler.end_epoch(epoch)
@@ -0,0 +1,177 @@
+import os
+import json
+import hashlib
+import tempfile
+import pandas as pd
+from pathlib import Path
+from multiprocessing import Pool
+
+from slam.evaluation.evaluate import average_metrics
+from slam.evaluation.streaming import evaluate_files
+
+
+def hash_file(file_path, block_size=2 ** 20):
+    file_hash = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+class MetricsCache:
+    """
+    Stores metrics of a trajectory as json file named by hash of prediction file, gt file and evaluation parameters,
+    so that unchanged predictions are never evaluated twice
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.gt_hashes = dict()
+
+    @staticmethod
+    def get_key(predicted_hash, gt_hash, **evaluation_args):
+        key = json.dumps([predicted_hash, gt_hash, sorted(evaluation_args.items())], default=str)
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def get_file_key(self, gt_path, predicted_path, **evaluation_args):
+        if gt_path not in self.gt_hashes:
+            self.gt_hashes[gt_path] = hash_file(gt_path)
+        return self.get_key(hash_file(predicted_path), self.gt_hashes[gt_path], **evaluation_args)
+
+    def _get_path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._get_path(key), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, key, record):
+        # write to temporary file first, so that concurrent readers never see partially written record
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({k: float(v) for k, v in record.items()}, f)
+        os.replace(tmp_path, self._get_path(key))
+
+
+def find_prediction_files(prediction_root, dataset_root, csv_name='df.csv'):
+    """
+    Matches prediction files saved by Predict callback (<prediction_root>/<subset>/<trajectory_name>.csv) with
+    gt files of dataset (<dataset_root>/<trajectory_id>/df.csv).
+
+    Returns:
+        list of dicts with trajectory_id, subset, gt_path and predicted_path
+    """
+    prediction_root, dataset_root = Path(prediction_root), Path(dataset_root)
+
+    gt_paths = dict()
+    for gt_path in dataset_root.rglob(csv_name):
+        trajectory_id = gt_path.parent.relative_to(dataset_root).as_posix()
+        gt_paths[trajectory_id.replace('/', '_')] = (trajectory_id, gt_path.as_posix())
+
+    prediction_files = list()
+    for predicted_path in sorted(prediction_root.rglob('*.csv')):
+        if predicted_path.stem not in gt_paths:
+            print(f'No gt for {predicted_path.as_posix()}')
+            continue
+
+        trajectory_id, gt_path = gt_paths[predicted_path.stem]
+        prediction_files.append({'trajectory_id': trajectory_id,
+                                 'subset': predicted_path.parent.relative_to(prediction_root).as_posix(),
+                                 'gt_path': gt_path,
+                                 'predicted_path': predicted_path.as_posix()})
+    return prediction_files
+
+
+def _evaluate_files(args):
+    gt_path, predicted_path, evaluation_args = args
+    return evaluate_files(gt_path, predicted_path, **evaluation_args)
+
+
+def evaluate_predictions(prediction_files,
+                         cache_dir=None,
+                         workers=0,
+                         loop_threshold=50,
+                         rpe_indices='full',
+                         backend='numpy',
+                         cuda=False):
+    """
+    Evaluates prediction files in parallel, results of files which have not changed since last evaluation
+    are taken from cache.
+
+    Args:
+        prediction_files:  list of dicts with gt_path and predicted_path (see find_prediction_files)
+        cache_dir:         directory of MetricsCache, no caching if None
+        workers:           number of processes, evaluation is done in main process if 0
+        loop_threshold:    see evaluate_files
+        rpe_indices:       see calculate_relative_pose_error
+        backend:           'numpy' or 'torch'
+        cuda:              whether to use GPU (only for backend='torch')
+
+    Returns:
+        DataFrame with a row of unnormalized metrics (with RPE_divider) per prediction file
+    """
+    evaluation_args = {'loop_threshold': loop_threshold, 'rpe_indices': rpe_indices}
+    cache = MetricsCache(cache_dir) if cache_dir is not None else None
+
+    records = [None] * len(prediction_files)
+    keys = [None] * len(prediction_files)
+    for index, prediction_file in enumerate(prediction_files):
+        if cache is not None:
+            # numpy and torch results differ slightly, so backend is a part of the key
+            keys[index] = cache.get_file_key(prediction_file['gt_path'],
+                                             prediction_file['predicted_path'],
+                                             backend=backend,
+                                             **evaluation_args)
+            records[index] = cache.get(keys[index])
+
+    not_cached = [index for index, record in enumerate(records) if record is None]
+    print(f'{len(prediction_files) - len(not_cached)} of {len(prediction_files)} files are evaluated already')
+
+    # files with the same content (e.g. predictions linked by Predict callback) are evaluated once
+    to_evaluate = dict()
+    for index in not_cached:
+        to_evaluate.setdefault(keys[index] or index, index)
+
+    tasks = [(prediction_files[index]['gt_path'],
+              prediction_files[index]['predicted_path'],
+              {**evaluation_args, 'backend': backend, 'cuda': cuda})
+             for index in to_evaluate.values()]
+    if workers and len(tasks) > 1:
+        with Pool(workers) as pool:
+            evaluated_records = dict(zip(to_evaluate, pool.map(_evaluate_files, tasks)))
+    else:
+        evaluated_records = dict(zip(to_evaluate, map(_evaluate_files, tasks)))
+
+    for key, record in evaluated_records.items():
+        if cache is not None:
+            cache.put(key, record)
+
+    for index in not_cached:
+        records[index] = evaluated_records[keys[index] or index]
+
+    metrics = pd.DataFrame(records)
+    metrics['cached'] = True
+    metrics.loc[not_cached, 'cached'] = False
+    return pd.concat((pd.DataFrame(prediction_files), metrics), axis=1)
+
+
+def aggregate_predictions(metrics, by='subset'):
+    """Averages per-trajectory metrics of evaluate_predictions as average_metrics does"""
+    metric_columns = [col for col in metrics.columns
+                      if col in ('ATE', 'RMSE_t', 'RMSE_r', 'loops_MAE_t', 'loops_MAE_r', 'RPE_t', 'RPE_r',
+                                 'RPE_divider')]
+    aggregated = dict()
+    for group, group_metrics in metrics.groupby(by):
+        aggregated[group] = average_metrics(group_metrics[metric_columns].to_dict('records'))
+    return pd.DataFrame(aggregated).T
+
+
+def normalize_predictions(metrics):
+    """Normalizes RPE of per-trajectory metrics of evaluate_predictions"""
+    metrics = metrics.copy()
+    for column in ('RPE_t', 'RPE_r'):
+        metrics[column] /= metrics['RPE_divider']
+    return metrics.drop(columns='RPE_divider')
@@ -5,6 +5,7 @@ from collections import OrderedDict
 from copy import copy
 
 from slam.utils import Toolbox
+from slam.linalg.align import align
 
 
 def calculate_relative_distances(points):
@@ -62,16 +63,24 @@ def get_pairs_of_indices(trajectory_length, step, stride=None, distances=None):
         first_indices = np.arange(trajectory_length - step)
         second_indices = first_indices + step
     else:
-        first_indices, second_indices = [], []
-        first_index = 0
-        second_distance = step
-        while first_index < trajectory_length:
-            second_distance = (distances[first_index - 1] if first_index else 0) + step
-            if second_distance > distances[-1]:
-                break
-            first_indices.append(first_index)
-            second_indices.append(find_closest_index(distances, second_distance) + 1)
-            first_index += stride
+        if not isinstance(distances, np.ndarray):
+            distances = distances.cpu().numpy()
+        distances = distances.reshape(-1)
+
+        first_indices = np.arange(0, trajectory_length, stride)
+        first_distances = np.concatenate(([0], distances))[first_indices]
+        second_distances = first_distances + step
+
+        # pairs are taken until the first one, which goes beyond the end of trajectory
+        is_beyond = second_distances > distances[-1]
+        if is_beyond.any():
+            first_indices = first_indices[:np.argmax(is_beyond)]
+            second_distances = second_distances[:len(first_indices)]
+
+        # same as find_closest_index(distances, second_distance) + 1
+        closest_indices = np.searchsorted(distances, second_distances, side='right')
+        closest_indices[closest_indices == len(distances)] = -1
+        second_indices = closest_indices + 1
 
     return first_indices, second_indices
 
@@ -199,8 +208,117 @@ def calculate_absolute_trajectory_error(gt_trajectory, predicted_trajectory):
     return np.mean(pointwise_distances) ** 0.5
 
 
+class GTMetricsContext:
+    """
+    Everything calculate_metrics needs from the ground truth: points, rotation matrices, pairs of indices of every
+    RPE step and gt deltas. It is fixed for a trajectory, so it is built once and reused for every prediction.
+    RPE in both modes and ATE are computed in a single pass over the steps.
+    """
+    def __init__(self, gt_trajectory, rpe_indices='full', max_cached_pairs=2 * 10 ** 6):
+        """
+        Args:
+            gt_trajectory:     GlobalTrajectory
+            rpe_indices:       see calculate_relative_pose_error
+            max_cached_pairs:  gt deltas are kept only if total number of pairs does not exceed it
+        """
+        self.rpe_indices = rpe_indices
+        self.length = len(gt_trajectory)
+        self.gt_points = gt_trajectory.points
+        self.R_gt = gt_trajectory.rotation_matrices
+        self.steps_num = len(get_steps(self.length, rpe_indices))
+        self.steps = self._get_steps(max_cached_pairs)
+
+    def _get_steps(self, max_cached_pairs):
+        steps = list()
+        if self.rpe_indices == 'kitti':
+            distances = calculate_cumulative_distances(self.gt_points)
+            for step in get_steps(self.length, self.rpe_indices):
+                # pairs of 'rpe' mode (stride 10) are every 10th pair of 'rmse' mode (stride 1)
+                first_indices, second_indices = get_pairs_of_indices(self.length, step, stride=1, distances=distances)
+                if len(first_indices):
+                    steps.append({'first': first_indices,
+                                  'second': second_indices,
+                                  'rpe_stride': 10,
+                                  'scale': 100. / step})
+        else:
+            for step in get_steps(self.length, self.rpe_indices):
+                if step < self.length:
+                    steps.append({'first': slice(0, self.length - step),
+                                  'second': slice(step, self.length),
+                                  'rpe_stride': 1,
+                                  'scale': 1.})
+
+        pairs_num = sum(len(self.gt_points[step['first']]) for step in steps)
+        for step in steps:
+            step['delta_gt'] = None
+            if pairs_num <= max_cached_pairs:
+                step['delta_gt'] = self.gt_points[step['second']] - self.gt_points[step['first']]
+        return steps
+
+    def calculate_absolute_trajectory_error(self, predicted_points):
+        """Same as calculate_absolute_trajectory_error without building aligned GlobalTrajectory"""
+        rotation_matrix, translation, scale = align(predicted_points, self.gt_points)
+        predicted_points_aligned = scale * (predicted_points @ rotation_matrix.T) + translation
+        return np.mean(np.sum((predicted_points_aligned - self.gt_points) ** 2, axis=1)) ** 0.5
+
+    def calculate_relative_pose_error(self, predicted_points, R_predicted):
+        """
+        Returns:
+            dict with (RPE translation, RPE rotation, RPE divider) for 'rpe' and 'rmse' modes
+        """
+        R = self.R_gt @ R_predicted.transpose((0, 2, 1))
+
+        rpe_translation, rpe_rotation, num_samples = 0, 0, 0
+        rmse_translation, rmse_rotation = 0, 0
+        for step in self.steps:
+            first, second = step['first'], step['second']
+
+            delta_gt = step['delta_gt']
+            if delta_gt is None:
+                delta_gt = self.gt_points[second] - self.gt_points[first]
+            delta_predicted = predicted_points[second] - predicted_points[first]
+
+            R_first = R[first]
+            E_translation = (R_first @ delta_predicted[..., None])[..., 0] - delta_gt
+            l2_norms = (E_translation ** 2).sum(1)
+
+            # trace(R_gt_inv @ M) == sum(R_gt * M), which saves transposition and the last matmul
+            traces = (self.R_gt[second] * (R_first @ R_predicted[second])).sum((1, 2))
+            thetas = np.arccos(np.clip((traces - 1) / 2, -1, 1)) * 180 / np.pi
+
+            scale = step['scale']
+            rmse_translation += l2_norms.mean() ** 0.5 * scale
+            rmse_rotation += (thetas ** 2).mean() ** 0.5 * scale
+
+            rpe_stride = step['rpe_stride']
+            rpe_translation += (l2_norms[::rpe_stride] ** 0.5).sum() * scale
+            rpe_rotation += thetas[::rpe_stride].sum() * scale
+            num_samples += len(l2_norms[::rpe_stride])
+
+        return {'rpe': (rpe_translation, rpe_rotation, num_samples),
+                'rmse': (rmse_translation / self.steps_num, rmse_rotation / self.steps_num, 1.)}
+
+    def calculate_metrics(self, predicted_trajectory):
+        """Same as calculate_metrics(gt_trajectory, predicted_trajectory, rpe_indices)"""
+        predicted_points = predicted_trajectory.points
+        errors = self.calculate_relative_pose_error(predicted_points, predicted_trajectory.rotation_matrices)
+        rpe_t, rpe_r, divider = errors['rpe']
+        rmse_t, rmse_r, _ = errors['rmse']
+        return {
+           'ATE': self.calculate_absolute_trajectory_error(predicted_points),
+           'RMSE_t': rmse_t,
+           'RMSE_r': rmse_r,
+           'RPE_t': rpe_t,
+           'RPE_r': rpe_r,
+           'RPE_divider': divider
+        }
+
+
 def calculate_metrics(gt_trajectory, predicted_trajectory, rpe_indices='full',
                       backend='numpy', cuda=False):
+    if backend == 'numpy':
+        return GTMetricsContext(gt_trajectory, rpe_indices=rpe_indices).calculate_metrics(predicted_trajectory)
+
     ate = calculate_absolute_trajectory_error(gt_trajectory, predicted_trajectory)
     rpe_t, rpe_r, divider = calculate_relative_pose_error(gt_trajectory, predicted_trajectory,
                                                           rpe_indices=rpe_indices, rpe_mode='rpe',
@@ -220,25 +338,36 @@ def calculate_metrics(gt_trajectory, predicted_trajectory, rpe_indices='full',
     return metrics
 
 
-def calculate_loops_metrics(gt_df, predicted_df, loop_threshold):
-    df_merged = pd.merge(gt_df, predicted_df, on=('to_index', 'from_index'))
-    index_difference = df_merged.to_index - df_merged.from_index
-    loops_df = df_merged[index_difference >= loop_threshold].reset_index(drop=True)
-    if not len(loops_df):
+def calculate_loops_mae(gt_loops, predicted_loops):
+    """
+    Calculates MAE of relative poses of loop pairs.
+
+    Args:
+        gt_loops:        nparray, m x 6 (euler_x, euler_y, euler_z, t_x, t_y, t_z)
+        predicted_loops: nparray, m x 6
+
+    Returns:
+        dict with loops_MAE_t, loops_MAE_r
+    """
+    if not len(gt_loops):
         return {'loops_MAE_t': 0, 'loops_MAE_r': 0}
-    translation_dofs = ['t_x', 't_y', 't_z']
-    rotation_dofs = ['euler_x', 'euler_y', 'euler_z']
 
-    loop_metrics_intermediate = {}
-    for dof in translation_dofs + rotation_dofs:
-        loop_metrics_intermediate[f'loops_MAE_{dof}'] = \
-            np.abs((loops_df[f'{dof}_x'] - loops_df[f'{dof}_y']).values).mean()
+    dofs_mae = np.abs(gt_loops - predicted_loops).mean(0)
     loop_metrics = {}
-    loop_metrics[f'loops_MAE_t'] = np.mean([loop_metrics_intermediate[f'loops_MAE_{dof}'] for dof in translation_dofs])
-    loop_metrics[f'loops_MAE_r'] = np.mean([loop_metrics_intermediate[f'loops_MAE_{dof}'] for dof in rotation_dofs])
+    loop_metrics['loops_MAE_t'] = np.mean(dofs_mae[3:])
+    loop_metrics['loops_MAE_r'] = np.mean(dofs_mae[:3])
     return loop_metrics
 
 
+def calculate_loops_metrics(gt_df, predicted_df, loop_threshold):
+    df_merged = pd.merge(gt_df, predicted_df, on=('to_index', 'from_index'))
+    index_difference = df_merged.to_index - df_merged.from_index
+    loops_df = df_merged[index_difference >= loop_threshold].reset_index(drop=True)
+    dofs = ['euler_x', 'euler_y', 'euler_z', 't_x', 't_y', 't_z']
+    return calculate_loops_mae(loops_df[[f'{dof}_x' for dof in dofs]].values,
+                               loops_df[[f'{dof}_y' for dof in dofs]].values)
+
+
 def normalize_metrics(metrics):
     normalized_metrics = copy(metrics)
     normalized_metrics['RPE_t'] /= normalized_metrics['RPE_divider']
@@ -0,0 +1,242 @@
+import re
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from collections import OrderedDict
+
+from slam.linalg import RelativeTrajectory, convert_batch
+from slam.evaluation.evaluate import calculate_metrics, normalize_metrics
+
+
+DOF_COLUMNS = ['euler_x', 'euler_y', 'euler_z', 't_x', 't_y', 't_z']
+
+
+def read_chunks(file_path, chunk_size=100000, columns=None):
+    """
+    Reads prediction file chunk by chunk.
+
+    Args:
+        file_path:   csv file or parquet file (requires pyarrow)
+        chunk_size:  number of rows per chunk (for parquet chunks are row groups)
+        columns:     columns to read, all if None
+
+    Returns:
+        generator of DataFrames
+    """
+    file_path = Path(file_path)
+    if file_path.suffix == '.parquet':
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(file_path.as_posix())
+        for i in range(parquet_file.num_row_groups):
+            yield parquet_file.read_row_group(i, columns=columns).to_pandas()
+    elif file_path.suffix == '.csv':
+        usecols = (lambda c: c in columns) if columns is not None else None
+        yield from pd.read_csv(file_path.as_posix(), chunksize=chunk_size, usecols=usecols)
+    else:
+        raise ValueError(f'Unknown file format: "{file_path.suffix}"')
+
+
+def parse_transform(value):
+    """4x4 matrix of transform column, which is stored as string in csv files"""
+    if isinstance(value, str):
+        value = re.sub(r'\n|\[|\]', '', value).strip().split()
+    return np.array(value, dtype=float).reshape((4, 4))
+
+
+def read_T_cam_body(gt_path):
+    """T_cam_body of gt file or None. As in Predict, gt and predicted poses are converted with it"""
+    for chunk in read_chunks(gt_path, chunk_size=1):
+        if 'T_cam_body' in chunk.columns:
+            return parse_transform(chunk['T_cam_body'].values[0])
+        return None
+    return None
+
+
+def get_dofs(chunk, T=None):
+    dofs = chunk[DOF_COLUMNS].values
+    return dofs if T is None else convert_batch(dofs, T)
+
+
+def get_pair_indices(chunk):
+    if 'to_index' in chunk.columns and 'from_index' in chunk.columns:
+        return chunk['to_index'].values.astype(np.int64), chunk['from_index'].values.astype(np.int64)
+
+    to_index = chunk['path_to_rgb_next'].apply(lambda x: int(Path(x).stem)).values
+    from_index = chunk['path_to_rgb'].apply(lambda x: int(Path(x).stem)).values
+    return to_index, from_index
+
+
+class LoopsMAE:
+    """Running version of calculate_loops_mae"""
+    def __init__(self):
+        self.absolute_error = np.zeros(len(DOF_COLUMNS))
+        self.count = 0
+
+    def update(self, gt_loops, predicted_loops):
+        if len(gt_loops):
+            self.absolute_error += np.abs(gt_loops - predicted_loops).sum(0)
+            self.count += len(gt_loops)
+
+    def result(self):
+        if not self.count:
+            return {'loops_MAE_t': 0, 'loops_MAE_r': 0}
+
+        dofs_mae = self.absolute_error / self.count
+        return {'loops_MAE_t': np.mean(dofs_mae[3:]), 'loops_MAE_r': np.mean(dofs_mae[:3])}
+
+
+class RunningMetrics:
+    """Running version of average_metrics: keeps sums instead of per-trajectory records"""
+    mean_metrics = ('ATE', 'RMSE_t', 'RMSE_r', 'loops_MAE_t', 'loops_MAE_r')
+    sum_metrics = ('RPE_t', 'RPE_r', 'RPE_divider')
+
+    def __init__(self):
+        self.sums = OrderedDict()
+        self.count = 0
+
+    def update(self, record):
+        for metric_name in self.mean_metrics + self.sum_metrics:
+            if metric_name in record:
+                self.sums[metric_name] = self.sums.get(metric_name, 0) + record[metric_name]
+        self.count += 1
+
+    def result(self):
+        if self.count == 0:
+            return dict()
+
+        averaged_metrics = OrderedDict()
+        for metric_name in self.mean_metrics:
+            if metric_name in self.sums:
+                averaged_metrics[metric_name] = self.sums[metric_name] / self.count
+        for metric_name in self.sum_metrics:
+            if metric_name in self.sums:
+                averaged_metrics[metric_name] = self.sums[metric_name]
+
+        return normalize_metrics(averaged_metrics)
+
+
+class ConsecutivePairs:
+    """Keeps only pairs with the minimal stride seen so far, which is enough to restore global trajectory"""
+    def __init__(self):
+        self.min_stride = np.inf
+        self.from_index = list()
+        self.dofs = list()
+
+    def update(self, to_index, from_index, dofs):
+        stride = to_index - from_index
+        if not len(stride):
+            return
+
+        chunk_min_stride = stride.min()
+        if chunk_min_stride < self.min_stride:
+            self.min_stride = chunk_min_stride
+            self.from_index, self.dofs = list(), list()
+
+        mask = stride == self.min_stride
+        self.from_index.append(from_index[mask])
+        self.dofs.append(dofs[mask])
+
+    def to_trajectory(self):
+        dofs = np.concatenate(self.dofs) if self.dofs else np.zeros((0, len(DOF_COLUMNS)))
+        return RelativeTrajectory.from_dataframe(pd.DataFrame(dofs, columns=DOF_COLUMNS)).to_global()
+
+
+def _loop_keys(to_index, from_index):
+    return to_index.astype(np.int64) << 32 | from_index.astype(np.int64)
+
+
+def match_loops(gt_loop_keys, keys):
+    """
+    Matches loop keys with sorted gt loop keys as pd.merge does: every pair of rows with equal keys is matched.
+
+    Returns:
+        indices of matched rows of keys and gt_loop_keys
+    """
+    start = np.searchsorted(gt_loop_keys, keys, side='left')
+    end = np.searchsorted(gt_loop_keys, keys, side='right')
+    counts = end - start
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(np.arange(len(keys)), counts), np.repeat(start, counts) + offsets
+
+
+def collect_gt(gt_path, loop_threshold, chunk_size=100000, T=None):
+    consecutive_pairs = ConsecutivePairs()
+    loop_keys, loop_dofs = list(), list()
+    for chunk in read_chunks(gt_path, chunk_size):
+        to_index, from_index = get_pair_indices(chunk)
+        dofs = get_dofs(chunk, T)
+        consecutive_pairs.update(to_index, from_index, dofs)
+
+        is_loop = to_index - from_index >= loop_threshold
+        loop_keys.append(_loop_keys(to_index[is_loop], from_index[is_loop]))
+        loop_dofs.append(dofs[is_loop])
+
+    loop_keys = np.concatenate(loop_keys) if loop_keys else np.zeros(0, dtype=np.int64)
+    loop_dofs = np.concatenate(loop_dofs) if loop_dofs else np.zeros((0, len(DOF_COLUMNS)))
+    order = np.argsort(loop_keys, kind='stable')
+    return consecutive_pairs.to_trajectory(), loop_keys[order], loop_dofs[order]
+
+
+def evaluate_files(gt_path,
+                   predicted_path,
+                   loop_threshold=50,
+                   chunk_size=100000,
+                   rpe_indices='full',
+                   backend='numpy',
+                   cuda=False):
+    """
+    Streams gt and predicted pair files and evaluates them without loading all pairs at once. Only pairs
+    with the minimal stride (to restore global trajectories) and loop pairs are kept in memory.
+
+    Args:
+        gt_path:         csv (or parquet) with gt relative poses of pairs. If it has T_cam_body column,
+                         gt and predicted poses are converted with it (as in Predict)
+        predicted_path:  csv (or parquet) with predicted relative poses of pairs
+        loop_threshold:  minimal index difference for pair to be a loop
+        chunk_size:      number of rows read at once
+        rpe_indices:     see calculate_relative_pose_error
+        backend:         'numpy' or 'torch'
+        cuda:            whether to use GPU (only for backend='torch')
+
+    Returns:
+        dict with metrics of calculate_metrics and calculate_loops_metrics
+    """
+    T_cam_body = read_T_cam_body(gt_path)
+    gt_trajectory, gt_loop_keys, gt_loop_dofs = collect_gt(gt_path, loop_threshold, chunk_size, T=T_cam_body)
+
+    consecutive_pairs = ConsecutivePairs()
+    loops_mae = LoopsMAE()
+    for chunk in read_chunks(predicted_path, chunk_size):
+        to_index, from_index = get_pair_indices(chunk)
+        dofs = get_dofs(chunk, T_cam_body)
+        consecutive_pairs.update(to_index, from_index, dofs)
+
+        is_loop = to_index - from_index >= loop_threshold
+        if not is_loop.any() or not len(gt_loop_keys):
+            continue
+
+        keys = _loop_keys(to_index[is_loop], from_index[is_loop])
+        predicted_rows, gt_rows = match_loops(gt_loop_keys, keys)
+        loops_mae.update(gt_loop_dofs[gt_rows], dofs[is_loop][predicted_rows])
+
+    predicted_trajectory = consecutive_pairs.to_trajectory()
+    metrics = calculate_metrics(gt_trajectory,
+                                predicted_trajectory,
+                                rpe_indices=rpe_indices,
+                                backend=backend,
+                                cuda=cuda)
+    metrics.update(loops_mae.result())
+    return metrics
+
+
+def evaluate_dataset(file_pairs, **kwargs):
+    """
+    Evaluates (gt_path, predicted_path) pairs one by one and aggregates metrics on the fly.
+
+    Returns:
+        same dict as average_metrics over per-trajectory records
+    """
+    running_metrics = RunningMetrics()
+    for gt_path, predicted_path in file_pairs:
+        running_metrics.update(evaluate_files(gt_path, predicted_path, **kwargs))
+    return running_metrics.result()
@@ -1,7 +1,7 @@
-from .graph_optimizer import GraphOptimizer
-from .trajectory_estimator import TrajectoryEstimator
+from slam.utils.lazy_import import attach
 
-__all__ = [
-    'GraphOptimizer',
-    'TrajectoryEstimator'
-]
+
+__getattr__, __dir__, __all__ = attach(__name__, {
+    'graph_optimizer': ['GraphOptimizer'],
+    'trajectory_estimator': ['TrajectoryEstimator']
+})
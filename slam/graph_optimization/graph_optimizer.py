@@ -12,9 +12,41 @@ from slam.linalg import (GlobalTrajectory,
 from slam.utils import mlflow_logging
 
 
+ROBUST_KERNELS = {'huber': g2o.RobustKernelHuber,
+                  'cauchy': g2o.RobustKernelCauchy,
+                  'dcs': g2o.RobustKernelDCS}
+
+
 @mlflow_logging(prefix='aggregator', name='GraphOptimizer')
 class GraphOptimizer:
-    def __init__(self, max_iterations=100, verbose=False, online=False):
+    def __init__(self,
+                 max_iterations=100,
+                 verbose=False,
+                 online=False,
+                 robust_kernel=None,
+                 robust_kernel_delta=1.,
+                 loop_threshold=None,
+                 odometry_strides=(),
+                 chi2_threshold=None,
+                 gating_rounds=3):
+        """
+        Args:
+            robust_kernel:       None, 'huber', 'cauchy' or 'dcs'. Applied to loop edges only
+                                 (to every edge if loop_threshold is None)
+            robust_kernel_delta: width of robust kernel (phi for 'dcs')
+            loop_threshold:      edge is a loop if (to_index - from_index) > loop_threshold and is not
+                                 in odometry_strides
+            odometry_strides:    index differences of odometry edges (strides of TrajectoryEstimator),
+                                 these edges are never robustified or gated
+            chi2_threshold:      if set, loop edges with chi2 above threshold are deactivated between
+                                 solves (12.59 is the 95% quantile for 6 DoF). Requires loop_threshold
+            gating_rounds:       max number of re-solves made by chi2 gating
+        """
+        if robust_kernel is not None and robust_kernel not in ROBUST_KERNELS:
+            raise ValueError(f'Unknown robust kernel: "{robust_kernel}"')
+        if chi2_threshold is not None and loop_threshold is None:
+            raise ValueError('chi2_threshold requires loop_threshold')
+
         solver = g2o.BlockSolverSE3(g2o.LinearSolverEigenSE3())
         solver = g2o.OptimizationAlgorithmLevenberg(solver)
 
@@ -26,10 +58,19 @@ class GraphOptimizer:
         self.max_iterations = max_iterations
         self.verbose = verbose
         self.online = online
+        self.robust_kernel = robust_kernel
+        self.robust_kernel_delta = robust_kernel_delta
+        self.loop_threshold = loop_threshold
+        self.odometry_strides = set(odometry_strides)
+        self.chi2_threshold = chi2_threshold
+        self.gating_rounds = gating_rounds
+
+        self.loop_edges = None
         self.clear()
 
     def clear(self):
         self.optimizer.clear()
+        self.loop_edges = list()
         self.optimizer.set_verbose(self.verbose)
         vertex = self.create_vertex(np.eye(3), np.zeros(3), index=0)
         self.optimizer.add_vertex(vertex)
@@ -64,6 +105,9 @@ class GraphOptimizer:
             edge = self.create_edge(row)
             self.optimizer.add_edge(edge)
 
+            if self.is_loop(row):
+                self.loop_edges.append(edge)
+
         if self.online:
             self.optimize()
 
@@ -100,6 +144,19 @@ class GraphOptimizer:
         vertex.set_fixed(index == 0)
         return vertex
 
+    def is_loop(self, row: pd.Series) -> bool:
+        diff = row.to_index - row.from_index
+        if self.loop_threshold is None or diff in self.odometry_strides:
+            return False
+        return diff > self.loop_threshold
+
+    def create_robust_kernel(self, row: pd.Series):
+        if self.robust_kernel is None:
+            return None
+        if self.loop_threshold is not None and not self.is_loop(row):
+            return None
+        return ROBUST_KERNELS[self.robust_kernel](self.robust_kernel_delta)
+
     def create_edge(self, row: pd.Series) -> g2o.EdgeSE3:
         euler_angles = row[['euler_x', 'euler_y', 'euler_z']].values
         translation = row[['t_x', 't_y', 't_z']].values
@@ -123,12 +180,41 @@ class GraphOptimizer:
         edge.set_information(information)
         edge.set_vertex(0, self.optimizer.vertex(int(row['from_index'])))
         edge.set_vertex(1, self.optimizer.vertex(int(row['to_index'])))
+
+        robust_kernel = self.create_robust_kernel(row)
+        if robust_kernel is not None:
+            edge.set_robust_kernel(robust_kernel)
         return edge
 
+    def update_loop_edges_levels(self):
+        """Moves loop edges inconsistent with current estimate to level 1 (excluded from optimization) and
+        restores previously rejected edges that became consistent again. Returns number of changed edges."""
+        changed = 0
+        for edge in self.loop_edges:
+            edge.compute_error()
+            level = int(edge.chi2() > self.chi2_threshold)
+            if edge.level() != level:
+                edge.set_level(level)
+                changed += 1
+        return changed
+
     def optimize(self):
-        self.optimizer.initialize_optimization()
+        self.optimizer.initialize_optimization(0)
         self.optimizer.optimize(self.max_iterations)
 
+        if self.chi2_threshold is None or not self.loop_edges:
+            return
+
+        for _ in range(self.gating_rounds):
+            if self.update_loop_edges_levels() == 0:
+                break
+            self.optimizer.initialize_optimization(0)
+            self.optimizer.optimize(self.max_iterations)
+
+        if self.verbose:
+            rejected = sum(edge.level() for edge in self.loop_edges)
+            print(f'Rejected {rejected} of {len(self.loop_edges)} loop edges')
+
     def get_trajectory(self, raw=False):
 
         if not raw or not self.online:
@@ -14,6 +14,9 @@ class TrajectoryEstimator:
                  loop_threshold=0,
                  rotation_weight=1,
                  max_iterations=100,
+                 robust_kernel=None,
+                 robust_kernel_delta=1.,
+                 chi2_threshold=None,
                  online=False,
                  verbose=False,
                  rpe_indices='full',
@@ -26,6 +29,9 @@ class TrajectoryEstimator:
         self.loop_threshold = loop_threshold
         self.rotation_weight = rotation_weight
         self.max_iterations = max_iterations
+        self.robust_kernel = robust_kernel
+        self.robust_kernel_delta = robust_kernel_delta
+        self.chi2_threshold = chi2_threshold
         self.online = online
         self.verbose = verbose
         self.rpe_indices = rpe_indices
@@ -57,7 +63,10 @@ class TrajectoryEstimator:
                   'loop_sigma': [self.loop_sigma],
                   'loop_threshold': [self.loop_threshold],
                   'rotation_weight': [self.rotation_weight],
-                  'max_iterations': [self.max_iterations]}
+                  'max_iterations': [self.max_iterations],
+                  'robust_kernel': [self.robust_kernel],
+                  'robust_kernel_delta': [self.robust_kernel_delta],
+                  'chi2_threshold': [self.chi2_threshold]}
         return params
 
     def _apply_g2o_coef(self, row):
@@ -84,7 +93,13 @@ class TrajectoryEstimator:
             print(f'\t{i + 1}. Len {len(df[consecutive_ind])}')
             df_with_coef = df.apply(self._apply_g2o_coef, axis=1)
 
-            g2o = GraphOptimizer(max_iterations=self.max_iterations, online=self.online)
+            g2o = GraphOptimizer(max_iterations=self.max_iterations,
+                                 online=self.online,
+                                 robust_kernel=self.robust_kernel,
+                                 robust_kernel_delta=self.robust_kernel_delta,
+                                 loop_threshold=self.loop_threshold,
+                                 odometry_strides=list(self.strides_sigmas),
+                                 chi2_threshold=self.chi2_threshold)
             g2o.append(df_with_coef[self.all_cols])
             predicted_trajectory = g2o.get_trajectory()
             preds.append(predicted_trajectory)
@@ -1,36 +1,24 @@
-from .linalg_utils import convert_rotation_matrix_to_euler_angles
-from .linalg_utils import convert_euler_angles_to_rotation_matrix
-from .linalg_utils import get_relative_se3_matrix
-from .linalg_utils import form_se3
-from .linalg_utils import split_se3
-from .linalg_utils import convert_euler_uncertainty_to_quaternion_uncertainty
-from .linalg_utils import get_covariance_matrix_from_euler_uncertainty
-from .linalg_utils import euler_to_quaternion
-from .linalg_utils import shortest_path_with_normalization
-from .linalg_utils import create_optical_flow_from_rt
-from .linalg_utils import convert
+from slam.utils.lazy_import import attach
 
-from .trajectory import GlobalTrajectory
-from .trajectory import RelativeTrajectory
 
-from .quaternion import QuaternionWithTranslation
-
-from .intrinsics import Intrinsics
-
-__all__ = [
-    'convert_rotation_matrix_to_euler_angles',
-    'convert_euler_angles_to_rotation_matrix',
-    'get_relative_se3_matrix',
-    'form_se3',
-    'split_se3',
-    'GlobalTrajectory',
-    'RelativeTrajectory',
-    'convert_euler_uncertainty_to_quaternion_uncertainty',
-    'get_covariance_matrix_from_euler_uncertainty',
-    'euler_to_quaternion',
-    'shortest_path_with_normalization',
-    'QuaternionWithTranslation',
-    'Intrinsics',
-    'create_optical_flow_from_rt',
-    'convert'
-]
+__getattr__, __dir__, __all__ = attach(__name__, {
+    'linalg_utils': ['convert_rotation_matrix_to_euler_angles',
+                     'convert_euler_angles_to_rotation_matrix',
+                     'convert_rotation_matrices_to_euler_angles',
+                     'convert_euler_angles_to_rotation_matrices',
+                     'get_relative_se3_matrix',
+                     'form_se3',
+                     'split_se3',
+                     'convert_euler_uncertainty_to_quaternion_uncertainty',
+                     'get_covariance_matrix_from_euler_uncertainty',
+                     'euler_to_quaternion',
+                     'quaternion_distance',
+                     'shortest_path_with_normalization',
+                     'create_optical_flow_from_rt',
+                     'convert',
+                     'convert_batch'],
+    'trajectory': ['GlobalTrajectory',
+                   'RelativeTrajectory'],
+    'quaternion': ['QuaternionWithTranslation'],
+    'intrinsics': ['Intrinsics']
+})
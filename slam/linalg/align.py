@@ -34,10 +34,8 @@ def align(trajectory_points, reference_trajectory_points, by='mean'):
     trajectory_points_shifted = trajectory_points - align_point
     reference_trajectory_points_shifted = reference_trajectory_points - reference_align_point
 
-    W = np.zeros((3, 3))
-    for index in range(n):
-        W += np.outer(trajectory_points_shifted[index], reference_trajectory_points_shifted[index])
-    
+    W = trajectory_points_shifted.T @ reference_trajectory_points_shifted
+
     U, d, Vh = np.linalg.linalg.svd(W.transpose())
     
     S = np.identity(3)
@@ -46,12 +44,9 @@ def align(trajectory_points, reference_trajectory_points, by='mean'):
 
     rotation_matrix = U @ S @ Vh
     trajectory_points_rotated = trajectory_points_shifted @ rotation_matrix.T
-    
-    dots = 0.0
-    norms = 0.0
-    for index in range(n):
-        dots += np.dot(reference_trajectory_points_shifted[index], trajectory_points_rotated[index])
-        norms += np.inner(trajectory_points_shifted[index], trajectory_points_shifted[index])
+
+    dots = np.sum(reference_trajectory_points_shifted * trajectory_points_rotated)
+    norms = np.sum(trajectory_points_shifted ** 2)
 
     scale = float(dots / norms)
     translation = (reference_align_point - scale * (align_point @ rotation_matrix.T))[0]
@@ -52,6 +52,50 @@ def convert_euler_angles_to_rotation_matrix(euler_angles_xyz):
     return R
 
 
+def convert_euler_angles_to_rotation_matrices(euler_angles_xyz):
+    """Vectorized version of convert_euler_angles_to_rotation_matrix: n x 3 euler angles in, n x 3 x 3 out"""
+    euler_angles_xyz = np.asarray(euler_angles_xyz, dtype=np.float64)
+    cos_r, cos_p, cos_y = np.cos(euler_angles_xyz).T
+    sin_r, sin_p, sin_y = np.sin(euler_angles_xyz).T
+
+    R = np.empty((len(euler_angles_xyz), 3, 3))
+    R[:, 0, 0] = cos_y * cos_p
+    R[:, 0, 1] = cos_y * sin_p * sin_r - sin_y * cos_r
+    R[:, 0, 2] = cos_y * sin_p * cos_r + sin_y * sin_r
+    R[:, 1, 0] = sin_y * cos_p
+    R[:, 1, 1] = sin_y * sin_p * sin_r + cos_y * cos_r
+    R[:, 1, 2] = sin_y * sin_p * cos_r - cos_y * sin_r
+    R[:, 2, 0] = -sin_p
+    R[:, 2, 1] = cos_p * sin_r
+    R[:, 2, 2] = cos_p * cos_r
+    return R
+
+
+def convert_rotation_matrices_to_euler_angles(R):
+    """Vectorized version of convert_rotation_matrix_to_euler_angles: n x 3 x 3 in, n x 3 euler angles out"""
+    sin_y = np.sqrt(R[:, 0, 0] * R[:, 0, 0] + R[:, 1, 0] * R[:, 1, 0])
+    singular = sin_y < 1e-6
+
+    x = np.where(singular, np.arctan2(-R[:, 1, 2], R[:, 1, 1]), np.arctan2(R[:, 2, 1], R[:, 2, 2]))
+    y = np.arctan2(-R[:, 2, 0], sin_y)
+    z = np.where(singular, 0, np.arctan2(R[:, 1, 0], R[:, 0, 0]))
+    return np.stack([x, y, z], axis=1)
+
+
+def quaternion_distance(q0, q1):
+    """Geodesic distance between rows of n x 4 arrays of quaternions (q_w, q_x, q_y, q_z).
+
+    Matches pyquaternion.Quaternion.distance applied to unit quaternions pairwise.
+    """
+    q0 = q0 / np.linalg.norm(q0, axis=1, keepdims=True)
+    q1 = q1 / np.linalg.norm(q1, axis=1, keepdims=True)
+
+    w = (q0 * q1).sum(axis=1)
+    v = q0[:, :1] * q1[:, 1:] - q1[:, :1] * q0[:, 1:] - np.cross(q0[:, 1:], q1[:, 1:])
+    v_norm = np.linalg.norm(v, axis=1)
+    return np.where(v_norm < 1e-17, 0, np.arccos(np.clip(w, -1, 1)))
+
+
 def get_relative_se3_matrix(global_se3_matrix, next_global_se3_matrix):
     return np.linalg.inv(global_se3_matrix) @ next_global_se3_matrix
 
@@ -191,3 +235,13 @@ def convert(dofs, T):
 
     dofs_T = np.concatenate([rotation_vector_T, translation_vector_T])
     return dofs_T
+
+
+def convert_batch(dofs, T):
+    """Vectorized version of convert: n x 6 dofs in, n x 6 dofs out"""
+    dofs = np.asarray(dofs, dtype=np.float64)
+    se3 = np.tile(np.eye(4), (len(dofs), 1, 1))
+    se3[:, :3, :3] = convert_euler_angles_to_rotation_matrices(dofs[:, :3])
+    se3[:, :3, 3] = dofs[:, 3:]
+    se3_T = np.linalg.inv(T) @ se3 @ T
+    return np.concatenate([convert_rotation_matrices_to_euler_angles(se3_T[:, :3, :3]), se3_T[:, :3, 3]], axis=1)
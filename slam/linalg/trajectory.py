@@ -1,14 +1,17 @@
 import numpy as np
 import pandas as pd
-import plotly.offline as ply
-import plotly.graph_objs as go
 from pyquaternion import Quaternion
 
+from slam.utils.lazy_import import lazy_import
 from slam.linalg.quaternion import QuaternionWithTranslation
 from slam.linalg.align import align
 from slam.linalg.linalg_utils import (convert_euler_angles_to_rotation_matrix,
                                       convert_rotation_matrix_to_euler_angles)
 
+ply = lazy_import('plotly.offline')
+go = lazy_import('plotly.graph_objs')
+
+
 class AbstractTrajectory:
     def __init__(self):
         self.positions = []
@@ -41,6 +44,21 @@ class AbstractTrajectory:
             result.append(pos.to_quaternion())
         return result
 
+    @classmethod
+    def from_array(cls, array):
+        trajectory = cls()
+        for row in array:
+            trajectory.append(QuaternionWithTranslation(q=Quaternion(row[:4]), t=row[4:]))
+        return trajectory
+
+    def to_array(self):
+        """Returns n x 7 array of quaternions (q_w, q_x, q_y, q_z) followed by translations"""
+        result = np.zeros((len(self), 7))
+        for i, pos in enumerate(self.positions):
+            result[i, :4] = pos.quaternion.elements
+            result[i, 4:] = pos.translation
+        return result
+
     @classmethod
     def from_transformation_matrices(cls, transformations):
         trajectory = cls()
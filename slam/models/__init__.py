@@ -1,37 +1,21 @@
-from .model_factory import PretrainedModelFactory
-from .model_factory import ModelFactory
-from .model_factory import ModelWithDecoderFactory
-from .model_factory import ModelWithConfidenceFactory
+from slam.utils.lazy_import import attach
 
-from .odometry import construct_simple_model
-from .odometry import construct_resnet50_model
-from .odometry import construct_depth_flow_model
-from .odometry import construct_st_vo_model
-from .odometry import construct_ls_vo_model
-from .odometry import construct_ls_vo_rt_model
-from .odometry import construct_ls_vo_rt_no_decoder_model
-from .odometry import construct_flexible_model
-from .odometry import construct_multiscale_model
-from .odometry import construct_rigidity_model
-from .odometry import construct_sequential_rt_model
 
-from .relocalization import BoVW
-
-__all__ = [
-    'PretrainedModelFactory',
-    'ModelFactory',
-    'ModelWithDecoderFactory',
-    'ModelWithConfidenceFactory',
-    'construct_simple_model',
-    'construct_resnet50_model',
-    'construct_depth_flow_model',
-    'construct_st_vo_model',
-    'construct_ls_vo_model',
-    'construct_ls_vo_rt_model',
-    'construct_ls_vo_rt_no_decoder_model',
-    'construct_flexible_model',
-    'construct_multiscale_model',
-    'construct_rigidity_model',
-    'construct_sequential_rt_model',
-    'BoVW'
-]
+__getattr__, __dir__, __all__ = attach(__name__, {
+    'model_factory': ['PretrainedModelFactory',
+                      'ModelFactory',
+                      'ModelWithDecoderFactory',
+                      'ModelWithConfidenceFactory'],
+    'odometry': ['construct_simple_model',
+                 'construct_resnet50_model',
+                 'construct_depth_flow_model',
+                 'construct_st_vo_model',
+                 'construct_ls_vo_model',
+                 'construct_ls_vo_rt_model',
+                 'construct_ls_vo_rt_no_decoder_model',
+                 'construct_flexible_model',
+                 'construct_multiscale_model',
+                 'construct_rigidity_model',
+                 'construct_sequential_rt_model'],
+    'relocalization': ['BoVW']
+})
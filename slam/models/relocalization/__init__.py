@@ -1,5 +1,13 @@
 from .bovw import BoVW
+from .vocabulary_tree import VocabularyTree
+from .vocabulary_tree import InvertedIndex
+from .descriptor_store import DescriptorStore
+from .kmeans import MiniBatchKMeans
 
 __all__ = [
-    'BoVW'
+    'BoVW',
+    'VocabularyTree',
+    'InvertedIndex',
+    'DescriptorStore',
+    'MiniBatchKMeans'
 ]
\ No newline at end of file
@@ -1,3 +1,4 @@
+import os
 import cv2
 import copy
 import mlflow
@@ -5,10 +6,28 @@ import pickle
 import numpy as np
 import pandas as pd
 from pathlib import Path
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
 from tqdm import trange
 
 from slam.utils import mlflow_logging
 from slam.utils import resize_image
+from .vocabulary_tree import VocabularyTree, InvertedIndex
+from .descriptor_store import DescriptorStore
+from .kmeans import MiniBatchKMeans
+
+
+_extractor = None
+
+
+def init_extractor():
+    global _extractor
+    _extractor = cv2.xfeatures2d.SIFT_create()
+
+
+def compute_descriptors(image):
+    _, des = _extractor.detectAndCompute(image, None)
+    return des
 
 
 class BoVW:
@@ -20,6 +39,17 @@ class BoVW:
                  min_descriptors_num=10,
                  feature='SIFT',
                  matcher_type='BruteForce',
+                 retrieval='flat',
+                 branching=10,
+                 depth=4,
+                 descriptor_dtype='float32',
+                 pca_components=None,
+                 matching_workers=0,
+                 kmeans='full',
+                 kmeans_batch_size=10000,
+                 kmeans_epochs=3,
+                 chunk_size=100000,
+                 workers=0,
                  run_dir=None):
 
         if feature == 'SIFT':
@@ -33,15 +63,37 @@ class BoVW:
             flann_params = dict(algorithm=1, trees=5)
             self.knn_matcher = cv2.FlannBasedMatcher(flann_params, {})
 
+        if retrieval not in ('flat', 'tree'):
+            raise ValueError(f'Unknown retrieval option: "{retrieval}"')
+
+        if kmeans not in ('full', 'minibatch'):
+            raise ValueError(f'Unknown kmeans option: "{kmeans}"')
+
+        if retrieval == 'tree' and kmeans == 'minibatch':
+            raise ValueError('Vocabulary tree is fitted on all descriptors at once, use kmeans "full" with it')
+
         self.clusters_num = clusters_num
         self.BoVW = cv2.BOWKMeansTrainer(clusters_num)
         self.voc = None
+        self.retrieval = retrieval
+        self.vocabulary_tree = VocabularyTree(branching=branching, depth=depth) if retrieval == 'tree' else None
+        self.inverted_index = InvertedIndex()
+        self.descriptor_store = DescriptorStore(dtype=descriptor_dtype, pca_components=pca_components)
+        # threads of matching pool are started on first query and stopped by close
+        self.matching_workers = matching_workers
+        self.matching_pool = None
         self.descriptor_extractor = cv2.BOWImgDescriptorExtractor(self.extractor, self.knn_matcher)
         self.knn = knn
         self.matches_threshold = matches_threshold
 
+        self.kmeans = kmeans
+        self.kmeans_batch_size = kmeans_batch_size
+        self.kmeans_epochs = kmeans_epochs
+        self.chunk_size = chunk_size
+        self.workers = workers
+
         self.histograms = None
-        self.images = None
+        self.histograms_matrix = None
         self.matches = None
         self.counter = None
 
@@ -58,18 +110,138 @@ class BoVW:
 
         self.min_descriptors_num = min_descriptors_num
 
+    @staticmethod
+    def iterate_images(generator, skip_images=0):
+        """
+        Yields batches of uint8 images, starting from image skip_images. Keras iterators are read from the batch
+        of this image on, other generators are read with len() and next() and skipped images are dropped.
+        """
+        if not hasattr(generator, '_get_batches_of_transformed_samples'):
+            start = 0
+            for _ in trange(len(generator)):
+                x, _ = next(generator)
+                yield [np.uint8(image) for image in x[0][max(skip_images - start, 0):]]
+                start += len(x[0])
+            return
+
+        first_batch_start = skip_images - skip_images % generator.batch_size
+        for start in trange(first_batch_start, generator.n, generator.batch_size):
+            index_array = np.arange(start, min(start + generator.batch_size, generator.n))
+            x, _ = generator._get_batches_of_transformed_samples(index_array)
+            yield [np.uint8(image) for image in x[0][max(skip_images - start, 0):]]
+
+    def extract_descriptors(self, generator, skip_images=0):
+        """
+        Yields descriptors of every image (None if image has no keypoints). Images are read in order of
+        generator dataframe, so that extraction can be resumed by skipping images which were processed already.
+        """
+        pool = Pool(self.workers, initializer=init_extractor) if self.workers > 0 else None
+        try:
+            for images in self.iterate_images(generator, skip_images=skip_images):
+                if pool is not None:
+                    yield from pool.imap(compute_descriptors, images)
+                else:
+                    yield from (self.extractor.detectAndCompute(image, None)[1] for image in images)
+        finally:
+            pool.terminate() if pool is not None else None
+
+    @staticmethod
+    def save_descriptor_chunk(chunks_dir, chunk_index, chunk, images_num):
+        """Chunk is written to temporary file first, so that interrupted extraction never leaves partial chunk"""
+        chunk_path = chunks_dir / f'chunk_{chunk_index:05d}.npz'
+        tmp_path = chunks_dir / f'chunk_{chunk_index:05d}.tmp'
+        with open(tmp_path.as_posix(), 'wb') as f:
+            np.savez(f, descriptors=np.vstack(chunk), lengths=[len(des) for des in chunk], images_num=images_num)
+        os.replace(tmp_path.as_posix(), chunk_path.as_posix())
+
+    @staticmethod
+    def get_saved_images_num(chunks_dir):
+        """Number of images processed by previous (possibly interrupted) runs of save_descriptor_chunks"""
+        chunk_paths = sorted(chunks_dir.glob('chunk_*.npz'))
+        images_num = 0
+        for chunk_path in chunk_paths:
+            with np.load(chunk_path.as_posix()) as chunk:
+                images_num += int(chunk['images_num'])
+        return len(chunk_paths), images_num
+
+    def save_descriptor_chunks(self, descriptors, chunks_dir, chunk_index=0):
+        """
+        Writes descriptors to chunks_dir in files of about chunk_size descriptors each, starting from chunk_index.
+        Every chunk keeps number of images it covers (including images without descriptors) to resume extraction.
+        """
+        chunks_dir.mkdir(parents=True, exist_ok=True)
+
+        chunk = list()
+        images_num = 0
+        descriptors_num = 0
+        for des in descriptors:
+            images_num += 1
+            if des is None:
+                continue
+
+            chunk.append(des)
+            descriptors_num += len(des)
+            if descriptors_num >= self.chunk_size:
+                self.save_descriptor_chunk(chunks_dir, chunk_index, chunk, images_num)
+                chunk = list()
+                chunk_index += 1
+                images_num = 0
+                descriptors_num = 0
+
+        if chunk:
+            self.save_descriptor_chunk(chunks_dir, chunk_index, chunk, images_num)
+
+        (chunks_dir / 'complete').touch()
+
+    @staticmethod
+    def load_descriptor_chunks(chunks_dir, random_state=None):
+        """Yields list of per-image descriptors for every chunk, chunks are shuffled if random_state is given"""
+        chunk_paths = sorted(chunks_dir.glob('chunk_*.npz'))
+        if random_state is not None:
+            chunk_paths = [chunk_paths[index] for index in random_state.permutation(len(chunk_paths))]
+
+        for chunk_path in chunk_paths:
+            with np.load(chunk_path.as_posix()) as chunk:
+                yield np.split(chunk['descriptors'], np.cumsum(chunk['lengths'])[:-1])
+
     def fit(self, generator):
 
-        for _ in trange(len(generator)):
-            x, _ = next(generator)
-            images = x[0]
-            for i in range(images.shape[0]):
-                image = np.uint8(images[i])
-                kp, des = self.extractor.detectAndCompute(image, None)
-                self.BoVW.add(des) if des is not None else None
+        if self.run_dir:
+            chunks_dir = Path(self.run_dir) / 'descriptors'
+            if not (chunks_dir / 'complete').exists():
+                chunks_num, images_num = self.get_saved_images_num(chunks_dir)
+                if images_num:
+                    print(f'Resuming extraction of descriptors from image {images_num} ({chunks_num} chunks saved)')
+                descriptors = self.extract_descriptors(generator, skip_images=images_num)
+                self.save_descriptor_chunks(descriptors, chunks_dir, chunk_index=chunks_num)
+            else:
+                print(f'Reusing descriptors from {chunks_dir}')
+
+            def get_chunks(random_state=None):
+                return self.load_descriptor_chunks(chunks_dir, random_state=random_state)
+        else:
+            descriptors = [des for des in self.extract_descriptors(generator) if des is not None]
+
+            def get_chunks(random_state=None):
+                return [descriptors]
+
+        if self.retrieval == 'tree':
+            self.voc = self.vocabulary_tree.fit([des for chunk in get_chunks() for des in chunk])
+        elif self.kmeans == 'minibatch':
+            kmeans = MiniBatchKMeans(self.clusters_num, batch_size=self.kmeans_batch_size)
+            for _ in trange(self.kmeans_epochs):
+                # images are read in trajectory order, so chunks are shuffled for every epoch
+                for chunk in get_chunks(kmeans.random_state):
+                    kmeans.partial_fit(np.vstack(chunk))
+            self.voc = kmeans.centers
+        else:
+            for chunk in get_chunks():
+                for des in chunk:
+                    self.BoVW.add(des)
+            self.voc = self.BoVW.cluster()
 
-        self.voc = self.BoVW.cluster()
-        self.descriptor_extractor.setVocabulary(self.voc)
+        if self.retrieval == 'flat':
+            self.descriptor_extractor.setVocabulary(self.voc)
 
         self.save(Path(self.run_dir) / f'vocabulary.pkl') if self.run_dir else None
 
@@ -82,7 +254,7 @@ class BoVW:
         with open(path.as_posix(), 'wb') as f:
             pickle.dump(self.voc, f)
 
-        mlflow.log_artifacts(self.run_dir) if mlflow.active_run() else None
+        mlflow.log_artifact(path.as_posix()) if mlflow.active_run() else None
 
     def load(self, path):
 
@@ -91,6 +263,12 @@ class BoVW:
 
         with open(path.as_posix(), 'rb') as f:
             self.voc = pickle.load(f)
+
+        if isinstance(self.voc, VocabularyTree):
+            self.retrieval = 'tree'
+            self.vocabulary_tree = self.voc
+        else:
+            self.retrieval = 'flat'
             self.descriptor_extractor.setVocabulary(self.voc)
 
     @staticmethod
@@ -106,29 +284,27 @@ class BoVW:
                 good_matches.append(match)
         return good_matches
 
+    def count_good_matches(self, index, des1):
+        des2 = self.descriptor_store[index]
+        descriptors_match = self.knn_matcher.knnMatch(des2, des1, 2)
+        return len(self.ratio_test(descriptors_match))
+
     def keypoints_overlap_test(self, match, des1):
 
         knn_matches_num = 2
-        good_matches = list()
         if match is None or len(match) == 0 or des1 is None or len(des1) < knn_matches_num:
             return list()
 
-        for k in range(len(match[0])):
-            index = match[0][k].trainIdx
-
-            image = np.uint8(self.images[index])
-
-            kp2, des2 = self.extractor.detectAndCompute(image, None)
-
-            if des2 is None or len(des2) < knn_matches_num:
-                return list()
-
-            descriptors_match = self.knn_matcher.knnMatch(des2, des1, knn_matches_num)
-            good_descriptors_match = self.ratio_test(descriptors_match)
-
-            if len(good_descriptors_match) >= self.matches_threshold:
-                good_matches.append((match[0][k], len(good_descriptors_match)))
+        des1 = self.descriptor_store.project(des1)
+        candidates = [m.trainIdx for m in match[0]]
+        if self.matching_workers > 0:
+            if self.matching_pool is None:
+                self.matching_pool = ThreadPool(self.matching_workers)
+            matches_num = self.matching_pool.starmap(self.count_good_matches, [(i, des1) for i in candidates])
+        else:
+            matches_num = [self.count_good_matches(i, des1) for i in candidates]
 
+        good_matches = [(m, n) for m, n in zip(match[0], matches_num) if n >= self.matches_threshold]
         good_matches.sort(key=lambda tup: tup[1], reverse=True)
 
         return good_matches
@@ -140,28 +316,79 @@ class BoVW:
         if hist is None or len(hist) == 0 or self.counter == 1:
             return self.empty_predict
 
-        histograms = np.vstack(self.histograms[:-1])
-        assert histograms.shape[0] >= min(self.counter - 1, self.knn)
+        df = self.query(hist, des, index, self.counter - 1, robust=robust)
+        self.matches = self.matches.append(df)
+
+        return df
+
+    def predict_batch(self, features, indices, robust: bool = True):
+        """
+        Adds all frames to the database at once and then queries each of them against frames added before it,
+        which gives the same matches as calling predict frame by frame.
+
+        Args:
+            features: list of (keypoints, descriptors, histogram) as returned by compute_features
+            indices: frame index for every element of features
+        """
+        added = list()
+        for (kp, des, hist), index in zip(features, indices):
+            if hist is None:
+                continue
+            added.append((self.counter, index, des, hist))
+            self.add_features(kp, des, hist, index)
+
+        if self.retrieval == 'flat' and self.histograms:
+            self.histograms_matrix = np.vstack(self.histograms)
+
+        # the first frame of the database has no frames to match with
+        predicts = [self.query(hist, des, index, db_index, robust=robust)
+                    for db_index, index, des, hist in added if db_index > 0]
+
+        if not predicts:
+            return self.empty_predict
+
+        df = pd.concat(predicts, ignore_index=True)
+        self.matches = self.matches.append(df)
+        return df
+
+    def query(self, hist, des, index, db_index, robust=True):
+        """Finds matches of db_index frame among frames added before it"""
         try:
-            match = self.knn_matcher.knnMatch(hist, histograms, min(self.counter - 1, self.knn))
+            match = self.find_candidates(hist, db_index)
             match = self.keypoints_overlap_test(match, des) if robust else match
         except Exception as e:
-            np.save('histograms.npy', histograms)
-            print('Error in BoVW class. Histograms has been dumped')
+            if self.retrieval == 'flat':
+                np.save('histograms.npy', np.vstack(self.histograms[:db_index]))
+                print('Error in BoVW class. Histograms has been dumped')
             print(e)
             return self.empty_predict
 
-        df = pd.DataFrame({'to_db_index': [self.counter - 1] * len(match),
-                           'from_db_index': [m[0].trainIdx for m in match],
-                           'to_index': [index] * len(match),
-                           'from_index': [self.index_mapping[m[0].trainIdx] for m in match],
-                           'matches_num': [m[1] for m in match]})
+        return pd.DataFrame({'to_db_index': [db_index] * len(match),
+                             'from_db_index': [m[0].trainIdx for m in match],
+                             'to_index': [index] * len(match),
+                             'from_index': [self.index_mapping[m[0].trainIdx] for m in match],
+                             'matches_num': [m[1] for m in match]})
 
-        self.matches = self.matches.append(df)
+    def find_candidates(self, hist, db_index):
+        knn = min(db_index, self.knn)
 
-        return df
+        if self.retrieval == 'tree':
+            candidates = self.inverted_index.query(hist, knn, limit=db_index)
+            return [[cv2.DMatch(0, document, 1. - score) for document, score in candidates]]
 
-    def add(self, image, index):
+        if self.histograms_matrix is not None and len(self.histograms_matrix) > db_index:
+            histograms = self.histograms_matrix[:db_index]
+        else:
+            histograms = np.vstack(self.histograms[:db_index])
+        assert histograms.shape[0] >= knn
+        return self.knn_matcher.knnMatch(hist, histograms, knn)
+
+    def compute_histogram(self, image, keypoints, descriptors):
+        if self.retrieval == 'tree':
+            return self.vocabulary_tree.transform(descriptors)
+        return self.descriptor_extractor.compute(image=image, keypoints=keypoints)
+
+    def compute_features(self, image):
         height, width, channels_num = image.shape
         small_height = height // 4
         small_width = width // 4
@@ -170,22 +397,44 @@ class BoVW:
         kp, des = self.extractor.detectAndCompute(image, None)
 
         if des is None or len(des) < self.min_descriptors_num:
-            return None, None
+            return None, None, None
 
-        hist = self.descriptor_extractor.compute(image=image, keypoints=kp)
+        hist = self.compute_histogram(image, kp, des)
 
         if hist is None or len(hist) == 0:
-            return None, None
+            return None, None, None
+
+        return kp, des, hist
 
+    def add_features(self, kp, des, hist, index):
         self.index_mapping[self.counter] = index
-        self.images.append(image)
-        self.histograms.append(hist)
+        self.descriptor_store.add(kp, des)
+        if self.retrieval == 'tree':
+            self.inverted_index.add(hist)
+        else:
+            self.histograms.append(hist)
+            self.histograms_matrix = None
         self.counter += 1
 
+    def add(self, image, index):
+        kp, des, hist = self.compute_features(image)
+
+        if hist is None:
+            return None, None
+
+        self.add_features(kp, des, hist, index)
         return hist, des
 
+    def close(self):
+        if self.matching_pool is not None:
+            self.matching_pool.close()
+            self.matching_pool.join()
+            self.matching_pool = None
+
     def clear(self):
         self.histograms = list()
-        self.images = list()
+        self.histograms_matrix = None
+        self.inverted_index.clear()
+        self.descriptor_store.clear()
         self.matches = copy.deepcopy(self.empty_predict)
         self.counter = 0
@@ -0,0 +1,68 @@
+import numpy as np
+
+
+class DescriptorStore:
+    """
+    Keeps keypoint coordinates and descriptors of every keyframe so that geometric verification
+    does not need to recompute features.
+
+    Descriptors can be stored as float16 and/or reduced with PCA. PCA basis is fitted once
+    pca_samples_num descriptors have been collected; descriptors stored before that are projected at that moment.
+    """
+    def __init__(self, dtype='float32', pca_components=None, pca_samples_num=10000):
+        if dtype not in ('float32', 'float16'):
+            raise ValueError(f'Unknown descriptor dtype: "{dtype}"')
+
+        self.dtype = dtype
+        self.pca_components = pca_components
+        self.pca_samples_num = pca_samples_num
+
+        self.keypoints = None
+        self.descriptors = None
+        self.mean = None
+        self.basis = None
+        self.clear()
+
+    def __len__(self):
+        return len(self.descriptors)
+
+    def __getitem__(self, index):
+        return self.descriptors[index].astype(np.float32)
+
+    @property
+    def nbytes(self):
+        return sum(d.nbytes for d in self.descriptors) + sum(k.nbytes for k in self.keypoints)
+
+    def project(self, descriptors):
+        descriptors = np.asarray(descriptors, dtype=np.float32)
+        if self.basis is None:
+            return descriptors
+        return (descriptors - self.mean) @ self.basis
+
+    def _compress(self, descriptors):
+        return self.project(descriptors).astype(self.dtype)
+
+    def _fit_pca(self):
+        samples = np.vstack(self.descriptors).astype(np.float32)
+        self.mean = samples.mean(0)
+        _, _, vh = np.linalg.svd(samples - self.mean, full_matrices=False)
+        self.basis = np.ascontiguousarray(vh[:self.pca_components].T)
+        self.descriptors = [self._compress(descriptors) for descriptors in self.descriptors]
+
+    def add(self, keypoints, descriptors):
+        if not isinstance(keypoints, np.ndarray):
+            keypoints = np.array([keypoint.pt for keypoint in keypoints], dtype=np.float32)
+        self.keypoints.append(keypoints)
+        self.descriptors.append(self._compress(descriptors))
+
+        if self.pca_components and self.basis is None:
+            if sum(len(d) for d in self.descriptors) >= self.pca_samples_num:
+                self._fit_pca()
+
+        return len(self) - 1
+
+    def clear(self):
+        self.keypoints = list()
+        self.descriptors = list()
+        self.mean = None
+        self.basis = None
@@ -0,0 +1,54 @@
+import cv2
+import numpy as np
+
+
+class MiniBatchKMeans:
+    """
+    Streaming k-means with per-center learning rates. Only one batch of descriptors has to be kept in memory.
+
+    D. Sculley. Web-scale k-means clustering. WWW 2010.
+    """
+    def __init__(self, clusters_num, batch_size=10000, seed=42):
+        self.clusters_num = clusters_num
+        self.batch_size = batch_size
+        self.random_state = np.random.RandomState(seed)
+
+        self.centers = None
+        self.counts = None
+
+    def _initialize(self, descriptors):
+        if len(descriptors) < self.clusters_num:
+            raise RuntimeError(f'Need at least {self.clusters_num} descriptors to initialize k-means, '
+                               f'got {len(descriptors)}')
+
+        criteria = (cv2.TERM_CRITERIA_MAX_ITER, 1, 0)
+        _, _, self.centers = cv2.kmeans(descriptors, self.clusters_num, None, criteria, 1, cv2.KMEANS_PP_CENTERS)
+        self.counts = np.zeros(self.clusters_num)
+
+    def predict(self, descriptors):
+        distances = (self.centers ** 2).sum(1)[None] - 2 * descriptors @ self.centers.T
+        return distances.argmin(1)
+
+    def _update(self, batch):
+        labels = self.predict(batch)
+
+        sums = np.zeros_like(self.centers, dtype=np.float64)
+        np.add.at(sums, labels, batch)
+        batch_counts = np.bincount(labels, minlength=self.clusters_num)
+
+        updated = batch_counts > 0
+        self.counts[updated] += batch_counts[updated]
+        learning_rate = (batch_counts[updated] / self.counts[updated])[:, None]
+        means = sums[updated] / batch_counts[updated, None]
+        self.centers[updated] = (1 - learning_rate) * self.centers[updated] + learning_rate * means
+
+    def partial_fit(self, descriptors):
+        descriptors = np.asarray(descriptors, dtype=np.float32)
+        if self.centers is None:
+            self._initialize(descriptors[:self.batch_size * 10])
+
+        descriptors = descriptors[self.random_state.permutation(len(descriptors))]
+        for start in range(0, len(descriptors), self.batch_size):
+            self._update(descriptors[start:start + self.batch_size])
+
+        return self
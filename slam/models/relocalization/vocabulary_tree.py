@@ -0,0 +1,134 @@
+import cv2
+import heapq
+import numpy as np
+from collections import defaultdict
+
+
+class VocabularyTree:
+    """
+    Hierarchical k-means vocabulary with TF-IDF weighting.
+
+    D. Nister and H. Stewenius. Scalable recognition with a vocabulary tree. CVPR 2006.
+    """
+    def __init__(self, branching=10, depth=4, attempts=3):
+        self.branching = branching
+        self.depth = depth
+        self.attempts = attempts
+
+        self.centers = list()
+        self.children = list()
+        self.node_words = list()
+        self.idf = None
+
+        self._leaves_num = 0
+
+    @property
+    def words_num(self):
+        return 0 if self.idf is None else len(self.idf)
+
+    def _add_node(self):
+        self.centers.append(None)
+        self.children.append(None)
+        self.node_words.append(-1)
+        return len(self.centers) - 1
+
+    def _build(self, node, descriptors, level):
+        if level == self.depth or len(descriptors) <= self.branching:
+            self.node_words[node] = self._leaves_num
+            self._leaves_num += 1
+            return
+
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 1e-3)
+        _, labels, centers = cv2.kmeans(descriptors, self.branching, None, criteria, self.attempts,
+                                        cv2.KMEANS_PP_CENTERS)
+        labels = labels.ravel()
+
+        self.centers[node] = centers
+        self.children[node] = np.array([self._add_node() for _ in range(self.branching)])
+        for child_index, child in enumerate(self.children[node]):
+            self._build(child, descriptors[labels == child_index], level + 1)
+
+    def fit(self, descriptors_per_image):
+        """
+        Args:
+            descriptors_per_image: list of nparrays, k_i x descriptor_size
+        """
+        self.centers, self.children, self.node_words = list(), list(), list()
+        self._leaves_num = 0
+        root = self._add_node()
+
+        descriptors = np.vstack(descriptors_per_image).astype(np.float32)
+        self._build(root, descriptors, level=0)
+        self.node_words = np.array(self.node_words)
+
+        document_frequency = np.zeros(self._leaves_num)
+        for image_descriptors in descriptors_per_image:
+            document_frequency[np.unique(self.quantize(image_descriptors))] += 1
+
+        self.idf = np.log(len(descriptors_per_image) / np.maximum(document_frequency, 1)).astype(np.float32)
+        return self
+
+    def quantize(self, descriptors):
+        """Returns word index for every descriptor. Each descriptor is compared with branching x depth centers."""
+        descriptors = np.asarray(descriptors, dtype=np.float32)
+        nodes = np.zeros(len(descriptors), dtype=int)
+
+        for _ in range(self.depth):
+            for node in np.unique(nodes):
+                if self.children[node] is None:
+                    continue
+
+                mask = nodes == node
+                centers = self.centers[node]
+                distances = (centers ** 2).sum(1)[None] - 2 * descriptors[mask] @ centers.T
+                nodes[mask] = self.children[node][distances.argmin(1)]
+
+        return self.node_words[nodes]
+
+    def transform(self, descriptors):
+        """Returns L1-normalized TF-IDF vector as dict {word: weight}"""
+        words, counts = np.unique(self.quantize(descriptors), return_counts=True)
+        weights = counts * self.idf[words]
+        norm = np.abs(weights).sum()
+        if norm == 0:
+            return dict()
+        return dict(zip(words.tolist(), (weights / norm).tolist()))
+
+
+class InvertedIndex:
+    """Database of TF-IDF vectors that is queried only through the words of the query."""
+    def __init__(self):
+        self.index = defaultdict(list)
+        self.documents_num = 0
+
+    def __len__(self):
+        return self.documents_num
+
+    def add(self, bow):
+        document = self.documents_num
+        for word, weight in bow.items():
+            self.index[word].append((document, weight))
+        self.documents_num += 1
+        return document
+
+    def query(self, bow, k, exclude=None, limit=None):
+        """
+        Scores documents with L1 similarity 1 - 0.5 * |q - d|, which only needs words shared by q and d.
+        Only documents with index below limit are scored if it is given.
+
+        Returns:
+            list of (document, score) sorted by decreasing score
+        """
+        scores = defaultdict(float)
+        for word, query_weight in bow.items():
+            for document, weight in self.index.get(word, ()):
+                if limit is not None and document >= limit:
+                    break
+                scores[document] += query_weight + weight - abs(query_weight - weight)
+
+        scores.pop(exclude, None)
+        return [(document, score / 2) for document, score in heapq.nlargest(k, scores.items(), key=lambda x: x[1])]
+
+    def clear(self):
+        self.index = defaultdict(list)
+        self.documents_num = 0
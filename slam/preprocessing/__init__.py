@@ -1,39 +1,21 @@
-from .prepare_trajectory import prepare_trajectory
+from slam.utils.lazy_import import attach
 
-from .dataset_configs import DATASET_TYPES
-from .dataset_configs import get_config
-from .dataset_configs import get_dataset_root
 
-from .parsers import KITTIParser
-from .parsers import TUMParser
-from .parsers import RetailBotParser
-from .parsers import DISCOMANJSONParser
-from .parsers import OldDISCOMANParser
-from .parsers import DISCOMANParser
-from .parsers import EuRoCParser
-from .parsers import ZJUParser
-
-from .estimators import Quaternion2EulerEstimator
-from .estimators import Struct2DepthEstimator
-from .estimators import Global2RelativeEstimator
-from .estimators import PWCNetEstimator
-
-
-__all__ = [
-    'DATASET_TYPES',
-    'get_config',
-    'get_dataset_root',
-    'prepare_trajectory',
-    'KITTIParser',
-    'TUMParser',
-    'RetailBotParser',
-    'DISCOMANJSONParser',
-    'DISCOMANParser',
-    'OldDISCOMANParser',
-    'EuRoCParser',
-    'ZJUParser',
-    'Quaternion2EulerEstimator',
-    'Struct2DepthEstimator',
-    'Global2RelativeEstimator',
-    'PWCNetEstimator',
-]
+__getattr__, __dir__, __all__ = attach(__name__, {
+    'dataset_configs': ['DATASET_TYPES',
+                        'get_config',
+                        'get_dataset_root'],
+    'prepare_trajectory': ['prepare_trajectory'],
+    'parsers': ['KITTIParser',
+                'TUMParser',
+                'RetailBotParser',
+                'DISCOMANJSONParser',
+                'DISCOMANParser',
+                'OldDISCOMANParser',
+                'EuRoCParser',
+                'ZJUParser'],
+    'estimators': ['Quaternion2EulerEstimator',
+                   'Struct2DepthEstimator',
+                   'Global2RelativeEstimator',
+                   'PWCNetEstimator']
+})
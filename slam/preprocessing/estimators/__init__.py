@@ -1,28 +1,14 @@
-from .quaternion2euler_estimator import Quaternion2EulerEstimator
-
-from .global2relative_estimator import Global2RelativeEstimator
-
-from .struct2depth_estimator import Struct2DepthEstimator
-
-from .pwcnet_estimator import PWCNetEstimator
-
-from .pwcnet_feature_extractor import PWCNetFeatureExtractor
-
-from .binocular_depth_estimator import BinocularDepthEstimator
-
-from .undistortion_estimator import UndistortionEstimator
-
-from .relocalization_estimator import RelocalizationEstimator
-
-#from .senet_estimator import SENetEstimator
-
-
-__all__ = [
-    'Quaternion2EulerEstimator',
-    'Struct2DepthEstimator',
-    'Global2RelativeEstimator',
-    'PWCNetEstimator',
-    'BinocularDepthEstimator',
-    'UndistortionEstimator',
-    'RelocalizationEstimator'
-]
+from slam.utils.lazy_import import attach
+
+
+__getattr__, __dir__, __all__ = attach(__name__, {
+    'quaternion2euler_estimator': ['Quaternion2EulerEstimator'],
+    'global2relative_estimator': ['Global2RelativeEstimator'],
+    'struct2depth_estimator': ['Struct2DepthEstimator'],
+    'pwcnet_estimator': ['PWCNetEstimator'],
+    'pwcnet_feature_extractor': ['PWCNetFeatureExtractor'],
+    'pwcnet_multi_stride_estimator': ['PWCNetMultiStrideEstimator'],
+    'binocular_depth_estimator': ['BinocularDepthEstimator'],
+    'undistortion_estimator': ['UndistortionEstimator'],
+    'relocalization_estimator': ['RelocalizationEstimator']
+})
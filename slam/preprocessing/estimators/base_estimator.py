@@ -26,5 +26,9 @@ class BaseEstimator:
     def run(self, row: pd.Series, dataset_root: str):
         pass
 
+    def close(self):
+        """Releases resources (e.g. worker threads) once all trajectories are processed"""
+        pass
+
     def __repr__(self):
         return f'{self.name}Estimator(input_col={self.input_col}, output_col={self.output_col})'
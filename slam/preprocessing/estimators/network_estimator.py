@@ -2,7 +2,11 @@ import os
 import numpy as np
 import pandas as pd
 
-from slam.utils import load_image
+from slam.utils import (load_image,
+                        save_compressed_arr,
+                        save_depth_png,
+                        get_compressed_array_ext,
+                        DEPTH_PNG_SCALE)
 from .base_estimator import BaseEstimator
 
 
@@ -16,7 +20,10 @@ class NetworkEstimator(BaseEstimator):
                  input_size=None,
                  target_size=None,
                  name='Network',
-                 ext='npy'):
+                 ext='npy',
+                 channels_first=False,
+                 dtype=None,
+                 scale=None):
         super(NetworkEstimator, self).__init__(input_col=input_col,
                                                output_col=output_col,
                                                ext=ext,
@@ -24,6 +31,12 @@ class NetworkEstimator(BaseEstimator):
 
         self.input_size = input_size
         self.target_size = target_size
+        # predictions can be saved as channel-planar (CHW) arrays of reduced precision
+        self.channels_first = channels_first
+        self.dtype = dtype
+        # ext 'png' saves depth as uint16 PNG, 'npz', 'npz.zst' or 'npz.lz4' save compressed arrays quantized to
+        # dtype (float16 or fixed-point int16), scale is multiplier of quantization
+        self.scale = scale
 
         self.dir = sub_dir
 
@@ -59,6 +72,24 @@ class NetworkEstimator(BaseEstimator):
     def _save_model_prediction(self, model_output, row, dataset_root):
         os.makedirs(os.path.join(dataset_root, self.dir), exist_ok=True)
         output_path = os.path.join(self.dir, self._create_output_filename(row))
+        if self.ext == 'png':
+            save_depth_png(os.path.join(dataset_root, output_path), model_output, scale=self.scale or DEPTH_PNG_SCALE)
+            return output_path
+
+        channels_first = self.channels_first and model_output.ndim == 3
+        if channels_first:
+            model_output = np.ascontiguousarray(model_output.transpose((2, 0, 1)))
+
+        if get_compressed_array_ext(output_path) is not None:
+            save_compressed_arr(os.path.join(dataset_root, output_path),
+                                model_output,
+                                dtype=self.dtype,
+                                scale=self.scale,
+                                channels_first=channels_first)
+            return output_path
+
+        if self.dtype is not None:
+            model_output = model_output.astype(self.dtype)
         np.save(os.path.join(dataset_root, output_path), model_output)
         return output_path
 
@@ -0,0 +1,117 @@
+import os
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+
+from submodules.tfoptflow.tfoptflow.model_pwcnet import ModelPWCNet
+
+from .pwcnet_estimator import PWCNetEstimator
+from slam.utils import load_image
+
+
+class FeaturePyramidPWCNet(ModelPWCNet):
+    """
+    PWC-Net which keeps tensors of feature pyramids of both images. Features can be computed by running these
+    tensors and fed back instead of images, then only cost volumes and flow decoders are computed.
+    """
+    def extract_features(self, x_tnsr, name='featpyr'):
+        self.c1_tnsrs, self.c2_tnsrs = super().extract_features(x_tnsr, name=name)
+        return self.c1_tnsrs, self.c2_tnsrs
+
+
+class PWCNetMultiStrideEstimator(PWCNetEstimator):
+    """
+    Computes optical flow for pairs of any strides (and loops) encoding every frame once: feature pyramids of
+    frames are kept in LRU cache and pairs are processed in order of their last frame, so that pairs of
+    strides up to features_cache_size share features. Runs on the whole dataframe (see run_batch).
+    """
+    def __init__(self, features_cache_size=64, *args, **kwargs):
+        self.features_cache_size = features_cache_size
+        self.features_cache = OrderedDict()
+        self.batch = True
+        super().__init__(*args, **kwargs)
+        self.name = 'PWCNetMultiStride'
+
+    def _load_model(self):
+        self.model = FeaturePyramidPWCNet(mode='test', options=self.get_nn_opts())
+        self.levels = range(self.model.opts['flow_pred_lvl'], self.model.opts['pyr_lvls'] + 1)
+
+    def _pad_batch(self, items):
+        # graph is built for batch_size samples
+        return items + [items[-1]] * (self.batch_size - len(items))
+
+    def _encode_frames(self, fnames, dataset_root):
+        # each pair of images of PWC-Net gives features of two frames
+        images = [load_image(os.path.join(dataset_root, fname)) for fname in fnames]
+        image_pairs = [np.stack(images[index:index + 2] if index + 1 < len(images) else [images[index]] * 2)
+                       for index in range(0, len(images), 2)]
+
+        for start in range(0, len(image_pairs), self.batch_size):
+            batch = image_pairs[start:start + self.batch_size]
+            x_adapt, self.adapt_info = self.model.adapt_x(self._pad_batch(batch))
+            tensors = ([self.model.c1_tnsrs[lvl] for lvl in self.levels] +
+                       [self.model.c2_tnsrs[lvl] for lvl in self.levels])
+            features = self.model.sess.run(tensors, feed_dict={self.model.x_tnsr: x_adapt})
+            first_features, second_features = features[:len(self.levels)], features[len(self.levels):]
+
+            for pair_index in range(len(batch)):
+                fname_index = 2 * (start + pair_index)
+                self._cache_features(fnames[fname_index], [f[pair_index] for f in first_features])
+                if fname_index + 1 < len(fnames):
+                    self._cache_features(fnames[fname_index + 1], [f[pair_index] for f in second_features])
+
+    def _cache_features(self, fname, features):
+        self.features_cache[fname] = features
+        self.features_cache.move_to_end(fname)
+        while len(self.features_cache) > max(self.features_cache_size, 2 * self.batch_size):
+            self.features_cache.popitem(last=False)
+
+    def _get_features(self, fnames, dataset_root):
+        # cached features in use are moved to the end first, so that encoding of missing ones does not evict them
+        for fname in fnames:
+            if fname in self.features_cache:
+                self.features_cache.move_to_end(fname)
+
+        missing_fnames = list(OrderedDict.fromkeys(fname for fname in fnames if fname not in self.features_cache))
+        if missing_fnames:
+            self._encode_frames(missing_fnames, dataset_root)
+        return [self.features_cache[fname] for fname in fnames]
+
+    def _decode_flow(self, first_features, second_features):
+        feed_dict = dict()
+        for level_index, lvl in enumerate(self.levels):
+            feed_dict[self.model.c1_tnsrs[lvl]] = np.stack(self._pad_batch([f[level_index] for f in first_features]))
+            feed_dict[self.model.c2_tnsrs[lvl]] = np.stack(self._pad_batch([f[level_index] for f in second_features]))
+
+        y_hat = self.model.sess.run(self.model.y_hat_test_tnsr, feed_dict=feed_dict)
+        optical_flow, _ = self.model.postproc_y_hat_test(y_hat, self.adapt_info)
+        return self._convert_model_output_to_prediction(optical_flow[:len(first_features)])
+
+    def _get_processing_order(self, df):
+        fnames, next_fnames = df[self.input_col[0]].values, df[self.input_col[1]].values
+        frame_rank = {fname: rank for rank, fname in enumerate(pd.unique(np.concatenate([fnames, next_fnames])))}
+        ranks = np.array([frame_rank[fname] for fname in fnames])
+        next_ranks = np.array([frame_rank[fname] for fname in next_fnames])
+        return np.lexsort((np.minimum(ranks, next_ranks), np.maximum(ranks, next_ranks)))
+
+    def run(self, row: pd.Series, dataset_root: str):
+        return self.run_batch(pd.DataFrame([row]), dataset_root).iloc[0]
+
+    def run_batch(self, df: pd.DataFrame, dataset_root: str):
+        df = df.copy()
+        output_paths = [None] * len(df)
+
+        order = self._get_processing_order(df)
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            rows = [df.iloc[index] for index in indices]
+            first_features = self._get_features([row[self.input_col[0]] for row in rows], dataset_root)
+            second_features = self._get_features([row[self.input_col[1]] for row in rows], dataset_root)
+
+            prediction = self._decode_flow(first_features, second_features)
+            for index, row, optical_flow in zip(indices, rows, prediction):
+                output_paths[index] = self._save_model_prediction(optical_flow, row, dataset_root)
+
+        df[self.output_col] = output_paths
+        self.features_cache.clear()
+        return df
@@ -1,5 +1,7 @@
 import os
+import cv2
 import pandas as pd
+from multiprocessing import Pool
 from slam.models import BoVW
 
 from slam.utils import load_image_arr
@@ -7,6 +9,21 @@ from .network_estimator import NetworkEstimator
 from slam.keyframe_selector import CounterKeyFrameSelector
 
 
+_reloc_model = None
+
+
+def init_worker(model_kwargs, checkpoint):
+    global _reloc_model
+    _reloc_model = BoVW(**model_kwargs)
+    _reloc_model.load(checkpoint)
+
+
+def compute_features(path):
+    kp, des, hist = _reloc_model.compute_features(load_image_arr(path, mode='RGB'))
+    kp = cv2.KeyPoint_convert(kp) if kp is not None else None
+    return kp, des, hist
+
+
 class RelocalizationEstimator(NetworkEstimator):
 
     def __init__(self,
@@ -15,12 +32,22 @@ class RelocalizationEstimator(NetworkEstimator):
                  knn,
                  target_size,
                  matcher_type='BruteForce',
+                 descriptor_dtype='float32',
+                 pca_components=None,
+                 matching_workers=0,
+                 batch=False,
+                 workers=0,
                  *args,
                  **kwargs):
 
         self.keyframe_period = keyframe_period
         self.matches_threshold = matches_threshold
         self.matcher_type = matcher_type
+        self.descriptor_dtype = descriptor_dtype
+        self.pca_components = pca_components
+        self.matching_workers = matching_workers
+        self.batch = batch
+        self.workers = workers
         self.knn = knn
         self.target_size = target_size
         self.relocalization_columns = ['to_index', 'from_index', 'to_db_index', 'from_db_index']
@@ -38,10 +65,16 @@ class RelocalizationEstimator(NetworkEstimator):
                                                       *args,
                                                       **kwargs)
 
+    def _get_model_kwargs(self):
+        return dict(knn=self.knn,
+                    matches_threshold=self.matches_threshold,
+                    matcher_type=self.matcher_type,
+                    descriptor_dtype=self.descriptor_dtype,
+                    pca_components=self.pca_components,
+                    matching_workers=self.matching_workers)
+
     def _load_model(self):
-        self.reloc_model = BoVW(knn=self.knn,
-                                matches_threshold=self.matches_threshold,
-                                matcher_type=self.matcher_type)
+        self.reloc_model = BoVW(**self._get_model_kwargs())
         self.reloc_model.load(self.checkpoint)
         self.keyframe_selector = self._get_keyframe_selector()
 
@@ -69,6 +102,9 @@ class RelocalizationEstimator(NetworkEstimator):
         self.frame_index += 1
         return matches
 
+    def close(self):
+        self.reloc_model.close()
+
     def _get_keyframe_selector(self):
         return CounterKeyFrameSelector(self.keyframe_period)
 
@@ -84,3 +120,40 @@ class RelocalizationEstimator(NetworkEstimator):
         self._save_model_prediction(model_output, row, dataset_root)
         row[self.output_col] = model_output.from_index.values
         return row
+
+    def run_batch(self, df: pd.DataFrame, dataset_root: str):
+        """
+        Processes the whole trajectory at once: features of all keyframes are computed (in parallel if workers > 0),
+        the database is built once and every keyframe is matched only against previous keyframes.
+        Keyframes are selected by frame index only, so selector does not get frame content.
+        """
+        keyframe_indices = [index for index in range(len(df))
+                            if index == 0 or self.keyframe_selector.is_key_frame(None, None, index)]
+        paths = [os.path.join(dataset_root, df[self.input_col].iloc[index]) for index in keyframe_indices]
+
+        if self.workers > 0:
+            with Pool(self.workers, initializer=init_worker,
+                      initargs=(self._get_model_kwargs(), self.checkpoint)) as pool:
+                features = pool.map(compute_features, paths, chunksize=8)
+        else:
+            features = [self.reloc_model.compute_features(load_image_arr(path, mode='RGB')) for path in paths]
+
+        self.reloc_model.clear()
+        try:
+            predicts = self.reloc_model.predict_batch(features, keyframe_indices)
+        finally:
+            self.reloc_model.close()
+
+        matches = pd.DataFrame({'to_index': range(1, len(df)), 'from_index': range(len(df) - 1)})
+        matches = pd.concat((matches, predicts), ignore_index=True, sort=False)
+        matches[['to_index', 'from_index']] = matches[['to_index', 'from_index']].astype(int)
+        matches = matches.sort_values('to_index', kind='mergesort').reset_index(drop=True)
+
+        os.makedirs(os.path.join(dataset_root, self.dir), exist_ok=True)
+        matches.to_csv(os.path.join(dataset_root, self.dir, 'matches.csv'))
+
+        from_indices = matches.groupby('to_index').from_index.apply(lambda x: x.values)
+        df = df.copy()
+        df[self.output_col] = pd.Series([from_indices.get(index, []) for index in range(len(df))],
+                                        index=df.index, dtype=object)
+        return df
@@ -4,7 +4,7 @@ import pandas as pd
 import cv2
 
 from .network_estimator import NetworkEstimator
-from slam.utils import load_image, undistort_image
+from slam.utils import load_image, undistort_image, get_undistortion_maps
 
 
 class UndistortionEstimator(NetworkEstimator):
@@ -14,20 +14,28 @@ class UndistortionEstimator(NetworkEstimator):
         super().__init__(name='Undistortion',
                          *args,
                          **kwargs)
+        # maps are computed once per calibration and image size, all frames of trajectory share them
+        self.maps = dict()
 
     def _load_model(self):
         pass
 
+    def get_maps(self, K, D, R, P, image_size):
+        key = (K.tobytes(), D.tobytes(), R.tobytes(), P.tobytes(), image_size)
+        if key not in self.maps:
+            self.maps[key] = get_undistortion_maps(K, D, R, P, image_size, target_size=self.target_size)
+        return self.maps[key]
+
     def run(self, row: pd.Series, dataset_root: str):
         image_filepath = row[self.input_col[0]]
         image = load_image(os.path.join(dataset_root, image_filepath))
 
-        K = np.array(row[self.input_col[1]])
-        D = np.array(row[self.input_col[2]])
-        R = np.array(row[self.input_col[3]])
-        P = np.array(row[self.input_col[4]])
+        K = np.array(row[self.input_col[1]], dtype=np.float64)
+        D = np.array(row[self.input_col[2]], dtype=np.float64)
+        R = np.array(row[self.input_col[3]], dtype=np.float64)
+        P = np.array(row[self.input_col[4]], dtype=np.float64)
 
-        undistorted_image = undistort_image(image, K=K, D=D, R=R, P=P)
+        undistorted_image = undistort_image(image, maps=self.get_maps(K, D, R, P, image.shape[:2]))
 
         os.makedirs(os.path.join(dataset_root, self.dir), exist_ok=True)
         output_path = os.path.join(self.dir, os.path.basename(image_filepath))
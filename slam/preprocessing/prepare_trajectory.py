@@ -4,6 +4,8 @@ import tqdm
 import pandas as pd
 from pathlib import Path
 
+from slam.utils import Profiler
+
 
 def force_make_dir(column_dst_dir):
     if os.path.exists(column_dst_dir):
@@ -32,6 +34,9 @@ def work_with_parser(root, parser):
 
 
 def work_with_estimator(root, df, estimator):
+    if getattr(estimator, 'batch', False):
+        return estimator.run_batch(df, root)
+
     enriched_rows = []
     for index, row in tqdm.tqdm(df.iterrows(), total=len(df), desc='{:<20}'.format(estimator.name)):
         enriched_rows.append(estimator.run(row, root))
@@ -55,7 +60,9 @@ def create_pair_indices(single_frame_df, stride):
 
 
 def transform_single_frame_df_to_paired(single_frame_df, pair_indices=None):
-    first_part_indices, second_part_indices = zip(*pair_indices)
+    pair_indices = list(pair_indices)
+    # without pairs (e.g. trajectory is shorter than stride) empty dataframe with paired columns is returned
+    first_part_indices, second_part_indices = zip(*pair_indices) if pair_indices else ((), ())
     first_part_df = single_frame_df.iloc[list(first_part_indices)].copy().reset_index(drop=True)
     second_part_df = single_frame_df.iloc[list(second_part_indices)].copy().reset_index(drop=True)
     second_part_df.rename(columns=lambda col: f'{col}_next', inplace=True)
@@ -66,9 +73,14 @@ def prepare_trajectory(root,
                        parser,
                        single_frame_estimators=None,
                        pair_frames_estimators=None,
-                       stride=1):
+                       stride=1,
+                       profiler=None,
+                       frames_csv_name=None):
     assert stride >= 1
 
+    if profiler is None:
+        profiler = Profiler(enabled=False)
+
     if not isinstance(root, Path):
         root = Path(root)
     root.mkdir(parents=True, exist_ok=True)
@@ -78,16 +90,24 @@ def prepare_trajectory(root,
     if pair_frames_estimators is None:
         pair_frames_estimators = []
 
-    single_frame_df = work_with_parser(root.as_posix(), parser)
+    with profiler.stage('parser'):
+        single_frame_df = work_with_parser(root.as_posix(), parser)
 
     for estimator in single_frame_estimators:
-        single_frame_df = work_with_estimator(root.as_posix(), single_frame_df, estimator)
+        with profiler.stage(estimator.name):
+            single_frame_df = work_with_estimator(root.as_posix(), single_frame_df, estimator)
 
-    pair_indices = create_pair_indices(single_frame_df, stride)
+    if frames_csv_name is not None:
+        # single frames are enough to create pairs of any stride later (see slam.data_manager.stride_pairs)
+        single_frame_df.to_csv(root.joinpath(frames_csv_name).as_posix(), index=False)
 
-    paired_frame_df = transform_single_frame_df_to_paired(single_frame_df, pair_indices)
+    with profiler.stage('pairing'):
+        pair_indices = create_pair_indices(single_frame_df, stride)
+        paired_frame_df = transform_single_frame_df_to_paired(single_frame_df, pair_indices)
 
     for estimator in pair_frames_estimators:
-        paired_frame_df = work_with_estimator(root.as_posix(), paired_frame_df, estimator)
+        with profiler.stage(estimator.name):
+            paired_frame_df = work_with_estimator(root.as_posix(), paired_frame_df, estimator)
 
+    profiler.end_batch()
     return paired_frame_df
@@ -3,14 +3,14 @@ import pandas as pd
 from tqdm import tqdm
 from pathlib import Path
 import matplotlib.pyplot as plt
+from multiprocessing import Pool
 from collections import defaultdict
-from pyquaternion import Quaternion
 from statistics import mean, median
 
-from slam.linalg import (convert_euler_angles_to_rotation_matrix,
-                         GlobalTrajectory,
-                         RelativeTrajectory,
-                         euler_to_quaternion)
+from slam.linalg import (convert_euler_angles_to_rotation_matrices,
+                         convert_rotation_matrices_to_euler_angles,
+                         euler_to_quaternion,
+                         quaternion_distance)
 
 
 class DatasetStat:
@@ -37,17 +37,32 @@ class DatasetStat:
     def append_rotation_stat(self, relative_df, global_df):
         to_rotation = global_df[self.rotation_columns].values[relative_df.to_index.values.astype('int')]
         from_rotation = global_df[self.rotation_columns].values[relative_df.from_index.values.astype('int')]
-        quaternions_from = [Quaternion(euler_to_quaternion(euler)).unit for euler in from_rotation]
-        quaternions_to = [Quaternion(euler_to_quaternion(euler)).unit for euler in to_rotation]
-        quaternions_pairs = zip(quaternions_to, quaternions_from)
-        relative_df['rotation_distance'] = [Quaternion.distance(*pair) for pair in quaternions_pairs]
+        quaternions_from = np.stack(euler_to_quaternion(from_rotation.T), axis=1)
+        quaternions_to = np.stack(euler_to_quaternion(to_rotation.T), axis=1)
+        relative_df['rotation_distance'] = quaternion_distance(quaternions_to, quaternions_from)
         return relative_df
 
+    def relative_to_global(self, relative_df):
+        relative_rotations = convert_euler_angles_to_rotation_matrices(relative_df[self.rotation_columns].values)
+        relative_translations = relative_df[self.translation_columns].values.astype(np.float64)
+
+        rotations = np.empty((len(relative_df) + 1, 3, 3))
+        translations = np.empty((len(relative_df) + 1, 3))
+        rotations[0] = np.eye(3)
+        translations[0] = 0
+        for i in range(len(relative_df)):
+            translations[i + 1] = rotations[i] @ relative_translations[i] + translations[i]
+            rotations[i + 1] = rotations[i] @ relative_rotations[i]
+
+        euler_angles = convert_rotation_matrices_to_euler_angles(rotations)
+        global_df = pd.DataFrame(np.concatenate([euler_angles, translations], axis=1),
+                                 columns=self.rotation_columns + self.translation_columns)
+        return global_df
+
     def get_pair_frame_stat(self, relative_df):
         is_adjustment = (relative_df.to_index - relative_df.from_index) <= 1
         consecutive_measurements = relative_df[is_adjustment].reset_index(drop=True)
-        gt_trajectory = RelativeTrajectory.from_dataframe(consecutive_measurements).to_global()
-        global_df = gt_trajectory.to_dataframe()
+        global_df = self.relative_to_global(consecutive_measurements)
         relative_df = self.append_translation_stat(relative_df, global_df)
         relative_df = self.append_rotation_stat(relative_df, global_df)
         return relative_df
@@ -107,16 +122,16 @@ class DatasetStat:
         stat['summary']['loop_fr_num'] = len(loops)
         stat['summary']['unique_loop_fr_num'] = len(loops.to_index.unique()) if len(loops) > 0 else 0
 
-        loops_num = 1
-        previous_index = loops['to_index'].values[0]
-        for index, row in loops.iterrows():
-            if row.to_index - previous_index > 3 * keyframe_period:
-                loops_num += 1
-            previous_index = row.to_index
-
-        stat['summary']['loops_num'] = loops_num
+        stat['summary']['loops_num'] = self.count_loops(loops.to_index.values, keyframe_period)
         return stat
 
+    @staticmethod
+    def count_loops(to_index, keyframe_period):
+        """A new loop starts wherever to_index jumps by more than 3 keyframe periods"""
+        if len(to_index) == 0:
+            return 0
+        return 1 + int(np.count_nonzero(np.diff(to_index) > 3 * keyframe_period))
+
     def filter_outlier(self, x, percentile, get_indices=False):
         if len(x) == 0:
             if get_indices:
@@ -274,11 +289,18 @@ class DatasetStat:
         print('Number of loops: ', stat['summary']['loops_num'])
 
     def append_to_history(self, history, stat):
+        return self.concat_stats([history, stat])
+
+    def concat_stats(self, stats):
+        history = self.init_data()
         for key in self.dataframe_types:
-            history[key] = history[key].append(stat[key]).reset_index(drop=True)
+            frames = [stat[key] for stat in stats if len(stat[key])]
+            if frames:
+                history[key] = pd.concat(frames, ignore_index=True, sort=False)
 
-        for k, v in stat['summary'].items():
-            history['summary'][k] += v
+        for stat in stats:
+            for k, v in stat['summary'].items():
+                history['summary'][k] += v
 
         return history
 
@@ -306,40 +328,56 @@ class DatasetStat:
         gt_path = (found_files[0] / 'df.csv').as_posix()
         return gt_path
 
-    def get_dataset_stat(self, dataset_root, loop_threshold, keyframe_period, predict_root, plot_traj_stat=False):
-        dataset_root = Path(dataset_root)
-        predict_root = Path(predict_root)
+    def get_trajectory_pair_stat(self, dataset_root, predict_path, loop_threshold, keyframe_period, trajectory_id):
+        print('Prediction_path', predict_path)
+        gt_path = self.find_gt(dataset_root, predict_path)
+        if not gt_path:
+            return None
 
-        gt_history = self.init_data()
-        predict_history = self.init_data()
+        print('Gt path', gt_path)
+        gt_stat = self.get_trajectory_stat(gt_path, loop_threshold, keyframe_period, trajectory_id)
 
-        for trajectory_id, predict_path in enumerate(predict_root.iterdir()):
+        if len(gt_stat['all']) == 0:
+            print(f'Skipping {predict_path.as_posix()}. Gt not found')
+            return None
 
-            if predict_path.suffix != '.csv':
-                continue
+        predict_stat = self.get_trajectory_stat(predict_path, loop_threshold, keyframe_period, trajectory_id)
 
-            print('Prediction_path', predict_path)
-            gt_path = self.find_gt(dataset_root, predict_path)
-            if not gt_path:
-                continue
+        assert len(gt_stat) == len(predict_stat), f'GT len: {len(gt_stat)}, Predict len ={len(predict_stat)}'
+        return predict_path, gt_stat, predict_stat
 
-            print('Gt path', gt_path)
-            gt_stat = self.get_trajectory_stat(gt_path, loop_threshold, keyframe_period, trajectory_id)
+    def _get_trajectory_pair_stat(self, args):
+        return self.get_trajectory_pair_stat(*args)
 
-            if len(gt_stat['all']) == 0:
-                print(f'Skipping {directory.as_posix()}. Gt not found')
-                continue
+    def get_dataset_stat(self,
+                         dataset_root,
+                         loop_threshold,
+                         keyframe_period,
+                         predict_root,
+                         plot_traj_stat=False,
+                         workers=0):
+        dataset_root = Path(dataset_root)
+        predict_root = Path(predict_root)
 
-            predict_stat = self.get_trajectory_stat(predict_path, loop_threshold, keyframe_period, trajectory_id)
+        tasks = [(dataset_root, predict_path, loop_threshold, keyframe_period, trajectory_id)
+                 for trajectory_id, predict_path in enumerate(predict_root.iterdir())
+                 if predict_path.suffix == '.csv']
 
-            assert len(gt_stat) == len(predict_stat), f'GT len: {len(gt_stat)}, Predict len ={len(predict_stat)}'
+        if workers > 0:
+            with Pool(workers) as pool:
+                results = pool.map(self._get_trajectory_pair_stat, tasks)
+        else:
+            results = [self._get_trajectory_pair_stat(task) for task in tasks]
 
-            gt_history = self.append_to_history(gt_history, gt_stat)
-            predict_history = self.append_to_history(predict_history, predict_stat)
+        results = [result for result in results if result is not None]
 
-            if plot_traj_stat:
-                self.plot(gt_stat, predict_stat, f'Trajectory {directory.name}')
+        if plot_traj_stat:
+            for predict_path, gt_stat, predict_stat in results:
+                self.plot(gt_stat, predict_stat, f'Trajectory {predict_path.stem}')
                 self.print_stat(gt_stat)
 
+        gt_history = self.concat_stats([gt_stat for _, gt_stat, _ in results])
+        predict_history = self.concat_stats([predict_stat for _, _, predict_stat in results])
+
         self.plot(gt_history, predict_history, 'Dataset stat')
         self.print_stat(gt_history)
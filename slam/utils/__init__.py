@@ -1,56 +1,46 @@
-from .computation_utils import set_computation
-from .computation_utils import make_memory_safe
-
-from .file_utils import chmod
-from .file_utils import create_vis_file_path
-from .file_utils import create_prediction_file_path
-from .file_utils import read_csv
-
-from .image_utils import resize_image
-from .image_utils import save_image
-from .image_utils import load_image
-from .image_utils import undistort_image
-from .image_utils import resize_image_arr
-from .image_utils import load_image_arr
-from .image_utils import convert_hwc_to_chw
-from .image_utils import convert_chw_to_hwc
-from .image_utils import get_channels_num
-from .image_utils import get_fill_fn
-from .image_utils import warp2d
-
-from .visualization_utils import visualize_trajectory_with_gt
-from .visualization_utils import visualize_trajectory
-
-from .video_utils import parse_video
-
-from .logging_utils import mlflow_logging
-
-from .toolbox import Toolbox
-
-from .utils import is_int
-
-__all__ = [
-    'set_computation',
-    'make_memory_safe',
-    'chmod',
-    'create_vis_file_path',
-    'create_prediction_file_path',
-    'resize_image',
-    'save_image',
-    'load_image',
-    'undistort_image',
-    'resize_image_arr',
-    'load_image_arr',
-    'convert_hwc_to_chw',
-    'convert_chw_to_hwc',
-    'get_channels_num',
-    'get_fill_fn',
-    'warp2d',
-    'visualize_trajectory_with_gt',
-    'visualize_trajectory',
-    'parse_video',
-    'mlflow_logging',
-    'Toolbox',
-    'read_csv',
-    'is_int'
-]
+from .lazy_import import attach
+
+
+__getattr__, __dir__, __all__ = attach(__name__, {
+    'computation_utils': ['set_computation',
+                          'make_memory_safe'],
+    'file_utils': ['chmod',
+                   'create_vis_file_path',
+                   'create_prediction_file_path',
+                   'read_csv',
+                   'link_or_copy',
+                   'link_or_copy_tree',
+                   'replacing_file'],
+    'image_utils': ['resize_image',
+                    'save_image',
+                    'load_image',
+                    'undistort_image',
+                    'get_undistortion_maps',
+                    'resize_image_arr',
+                    'load_image_arr',
+                    'load_npy_arr',
+                    'select_channels',
+                    'resize_image_cv2',
+                    'convert_hwc_to_chw',
+                    'convert_chw_to_hwc',
+                    'get_channels_num',
+                    'get_fill_fn',
+                    'warp2d'],
+    'array_codecs': ['save_compressed_arr',
+                     'load_compressed_arr',
+                     'get_compressed_array_ext',
+                     'save_depth_png',
+                     'load_depth_png',
+                     'DEPTH_PNG_SCALE',
+                     'FLOW_FIXED_POINT_SCALE'],
+    'visualization_utils': ['visualize_trajectory_with_gt',
+                            'visualize_trajectory'],
+    'video_utils': ['parse_video'],
+    'logging_utils': ['mlflow_logging',
+                      'ArtifactSyncer',
+                      'BufferedLogger',
+                      'buffered_logger'],
+    'profiling_utils': ['Profiler'],
+    'toolbox': ['Toolbox'],
+    'utils': ['is_int']
+})
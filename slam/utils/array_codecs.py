@@ -0,0 +1,149 @@
+import io
+import numpy as np
+import PIL.Image
+import PIL.PngImagePlugin
+
+from .image_utils import resize_image_cv2, select_channels
+
+
+# depth of up to 256 m with 1/256 m step fits into uint16 PNG (as in KITTI depth benchmark)
+DEPTH_PNG_SCALE = 256.
+# flow of up to 8 (in fractions of image size) with 1/4096 step fits into int16
+FLOW_FIXED_POINT_SCALE = 4096.
+
+COMPRESSED_ARRAY_EXTENSIONS = ('npz', 'npz.zst', 'npz.lz4')
+
+
+def _get_codec(ext):
+    """Compress and decompress functions of container by its extension, zstd and lz4 are optional dependencies"""
+    if ext == 'npz.zst':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(f'Package zstandard is required for .{ext} files')
+        return zstandard.ZstdCompressor(level=3).compress, zstandard.ZstdDecompressor().decompress
+
+    if ext == 'npz.lz4':
+        try:
+            import lz4.frame
+        except ImportError:
+            raise ImportError(f'Package lz4 is required for .{ext} files')
+        return lz4.frame.compress, lz4.frame.decompress
+
+    raise ValueError(f'Unknown compressed array option: "{ext}"')
+
+
+def get_compressed_array_ext(fpath):
+    for ext in COMPRESSED_ARRAY_EXTENSIONS[::-1]:
+        if fpath.endswith('.' + ext):
+            return ext
+    return None
+
+
+def quantize_array(array, dtype=None, scale=None):
+    """
+    Converts float array to dtype. Integer arrays are fixed-point: values are multiplied by scale and rounded,
+    NaN is stored as minimal value of dtype.
+    """
+    dtype = np.dtype(dtype or array.dtype)
+    if scale is None:
+        scale = FLOW_FIXED_POINT_SCALE if dtype.kind == 'i' else 1.
+
+    if dtype.kind == 'f':
+        return (array * scale if scale != 1 else array).astype(dtype), scale
+
+    if dtype.kind != 'i':
+        raise ValueError(f'Unknown quantization dtype option: "{dtype}"')
+
+    info = np.iinfo(dtype)
+    isnan = np.isnan(array)
+    quantized = np.clip(np.round(np.nan_to_num(array) * scale), info.min + 1, info.max).astype(dtype)
+    quantized[isnan] = info.min
+    return quantized, scale
+
+
+def dequantize_array(array, scale):
+    """Inverse of quantize_array, returns float32 array"""
+    dequantized = array.astype('float32')
+    if array.dtype.kind == 'i':
+        dequantized[array == np.iinfo(array.dtype).min] = np.nan
+    if scale != 1:
+        dequantized /= scale
+    return dequantized
+
+
+def save_compressed_arr(fpath, array, dtype=None, scale=None, channels_first=False):
+    """
+    Saves array (e.g. optical flow) quantized to dtype (float16 or fixed-point int16) to .npz container,
+    compressed with zlib (.npz), zstd (.npz.zst) or lz4 (.npz.lz4). Layout of array (HWC or CHW) is stored
+    in container.
+    """
+    ext = get_compressed_array_ext(fpath)
+    quantized, scale = quantize_array(array, dtype=dtype, scale=scale)
+
+    if ext == 'npz':
+        np.savez_compressed(fpath, array=quantized, scale=scale, channels_first=channels_first)
+        return
+
+    compress, _ = _get_codec(ext)
+    buffer = io.BytesIO()
+    np.savez(buffer, array=quantized, scale=scale, channels_first=channels_first)
+    with open(fpath, 'wb') as f:
+        f.write(compress(buffer.getvalue()))
+
+
+def load_compressed_arr(fpath, channels=None, channels_first=None):
+    """
+    Loads array saved by save_compressed_arr as float32 HWC image (see load_npy_arr for parameters). If
+    channels_first is None, layout stored in container is used.
+    """
+    ext = get_compressed_array_ext(fpath)
+    if ext == 'npz':
+        source = fpath
+    else:
+        _, decompress = _get_codec(ext)
+        with open(fpath, 'rb') as f:
+            source = io.BytesIO(decompress(f.read()))
+
+    with np.load(source) as data:
+        array, scale = data['array'], float(data['scale'])
+        if channels_first is None:
+            channels_first = 'channels_first' in data.files and bool(data['channels_first'])
+
+    return select_channels(dequantize_array(array, scale), channels, channels_first)
+
+
+def save_depth_png(fpath, depth, scale=DEPTH_PNG_SCALE):
+    """
+    Saves depth as uint16 PNG of depth * scale, scale is kept in PNG text chunk. Depth beyond range is clipped
+    to maximal value, invalid depth (NaN or negative) is stored as 0, as missing depth of sensors.
+    """
+    quantized = np.round(np.squeeze(depth) * scale)
+    with np.errstate(invalid='ignore'):
+        is_invalid = np.isnan(quantized) | (quantized < 0)
+    quantized = np.clip(quantized, 0, np.iinfo(np.uint16).max)
+    quantized[is_invalid] = 0
+
+    png_info = PIL.PngImagePlugin.PngInfo()
+    png_info.add_text('depth_scale', str(scale))
+    PIL.Image.fromarray(quantized.astype(np.uint16)).save(fpath, pnginfo=png_info)
+
+
+def load_depth_png(fpath, target_size=None, interpolation='nearest'):
+    """
+    Loads depth PNG as float32 HW image of depth in meters. PNG saved without depth scale (e.g. depth of
+    datasets) is loaded as is. Image is resized in uint16 before conversion to float.
+    """
+    with PIL.Image.open(fpath) as image:
+        scale = float(image.info.get('depth_scale', 1))
+        depth = np.asarray(image)
+
+    if target_size is not None:
+        if depth.dtype not in (np.uint8, np.uint16):
+            depth = depth.astype('float32')
+        depth = resize_image_cv2(depth, target_size, interpolation=interpolation)
+
+    depth = depth.astype('float32')
+    if scale != 1:
+        depth /= scale
+    return depth
@@ -1,6 +1,8 @@
 import os
+import shutil
 import pandas as pd
 from pathlib import Path
+from contextlib import contextmanager
 
 
 def chmod(path):
@@ -19,12 +21,12 @@ def _create_file_path(save_dir, trajectory_id, ext, prediction_id='', subset='')
     return file_path
 
 
-def create_vis_file_path(save_dir, trajectory_id, prediction_id='', subset='', sub_dir=''):
+def create_vis_file_path(save_dir, trajectory_id, prediction_id='', subset='', sub_dir='', ext='html'):
     return _create_file_path(save_dir=os.path.join(save_dir, 'visuals', sub_dir),
                              trajectory_id=trajectory_id,
                              prediction_id=prediction_id,
                              subset=subset,
-                             ext='html')
+                             ext=ext)
 
 
 def create_prediction_file_path(save_dir, trajectory_id, prediction_id='', subset=''):
@@ -35,6 +37,39 @@ def create_prediction_file_path(save_dir, trajectory_id, prediction_id='', subse
                              ext='csv')
 
 
+def link_or_copy(src, dst):
+    """Creates hard link to src, copies file if linking is impossible (e.g. different file systems)"""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+@contextmanager
+def replacing_file(file_path):
+    """
+    Yields temporary path next to file_path, which replaces file_path when writing is done. The file gets a new
+    inode, so hard links to its previous version (made by link_or_copy) keep their content.
+    """
+    file_dir, file_name = os.path.split(file_path)
+    tmp_path = os.path.join(file_dir, '.tmp_' + file_name)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def link_or_copy_tree(src, dst):
+    if os.path.exists(dst):
+        shutil.rmtree(dst)
+    shutil.copytree(src, dst, copy_function=link_or_copy)
+
+
 def read_csv(path):
     df = pd.read_csv(path)
     df.rename(columns={'path_to_rgb': 'from_path',
@@ -1,7 +1,7 @@
 from functools import partial
 
 import cv2
-import PIL
+import PIL.Image
 import scipy
 import numpy as np
 
@@ -42,7 +42,35 @@ def load_image(image_filepath, target_size=None):
     return image
 
 
-def undistort_image(image, K, D, R, P):
+def get_undistortion_maps(K, D, R, P, image_size, target_size=None):
+    """
+    Computes fixed-point (CV_16SC2) undistortion and rectification maps for cv::remap(). If target_size is given,
+    new camera matrix is scaled so that remap also resizes image to target_size.
+    Parameters:
+        K, D, R, P: see undistort_image
+        image_size: (height, width) of source image
+        target_size: (height, width) of undistorted image, equals to image_size if None
+    """
+    height, width = image_size
+    target_height, target_width = target_size if target_size is not None else image_size
+
+    scale_x, scale_y = target_width / width, target_height / height
+    P = np.array(P, dtype=np.float64)
+    P[0] *= scale_x
+    P[1] *= scale_y
+    # pixel centers are aligned as in cv2.resize
+    P[0, 2] += (scale_x - 1) / 2
+    P[1, 2] += (scale_y - 1) / 2
+
+    return cv2.fisheye.initUndistortRectifyMap(np.asarray(K, dtype=np.float64),
+                                               np.asarray(D, dtype=np.float64).reshape(4, 1),
+                                               np.asarray(R, dtype=np.float64),
+                                               P,
+                                               (target_width, target_height),
+                                               cv2.CV_16SC2)
+
+
+def undistort_image(image, K=None, D=None, R=None, P=None, maps=None, target_size=None):
     """
     Computes undistortion and rectification maps for image transform by cv::remap().
     Parameters:
@@ -53,10 +81,13 @@ def undistort_image(image, K, D, R, P):
         R: Rectification transformation in the object space: 
            3x3 1-channel, or vector: 3x1/1x3 1-channel or 1x1 3-channel
         P: New camera matrix (3x3) or new projection matrix (3x4)
+        maps: precomputed maps of get_undistortion_maps, K, D, R, P and target_size are ignored if given
+        target_size: (height, width) of undistorted image
     """
-    height, width = image.shape[:2]
-    map_x, map_y = cv2.fisheye.initUndistortRectifyMap(K, D.reshape(4, 1), R, P, (width, height), cv2.CV_32FC1)
-    undistorted_image = cv2.remap(image, map_x, map_y,
+    if maps is None:
+        maps = get_undistortion_maps(K, D, R, P, image.shape[:2], target_size=target_size)
+    map1, map2 = maps
+    undistorted_image = cv2.remap(image, map1, map2,
                                   interpolation=cv2.INTER_LINEAR,
                                   borderMode=cv2.BORDER_CONSTANT)
     return undistorted_image
@@ -78,14 +109,50 @@ def resize_image_arr(image_arr, target_size, data_format, mode):
     return image_arr
 
 
-def load_image_arr(fpath, mode=None):
+CV2_INTERPOLATIONS = {'nearest': cv2.INTER_NEAREST,
+                      'bilinear': cv2.INTER_LINEAR,
+                      'bicubic': cv2.INTER_CUBIC,
+                      'area': cv2.INTER_AREA}
+
+
+def resize_image_cv2(image, target_size, interpolation='nearest'):
+    """
+    Resizes HWC image in its own dtype (uint8 for most images), interpolation modes are named as in torch
+    F.interpolate.
+    Parameters:
+        target_size: (height, width)
+    """
+    if image.shape[:2] == tuple(target_size):
+        return image
+
+    if interpolation not in CV2_INTERPOLATIONS:
+        raise ValueError(f'Unknown interpolation option: "{interpolation}"')
+
+    height, width = target_size
+    resized_image = cv2.resize(image, (width, height), interpolation=CV2_INTERPOLATIONS[interpolation])
+    if resized_image.ndim < image.ndim:
+        resized_image = resized_image[..., None]
+    return resized_image
+
+
+def load_image_arr(fpath, mode=None, target_size=None, interpolation='nearest'):
     image = PIL.Image.open(fpath)
+    if target_size is not None:
+        # JPEG is decoded with DCT scaling at the smallest scale not less than target_size (no-op for other formats)
+        image.draft(mode, tuple(target_size[::-1]))
     image.load()
 
     if mode and image.mode != mode:
         image = image.convert(mode)
 
-    image_arr = np.asarray(image, dtype='float32')
+    if target_size is not None:
+        # resize before conversion to float, 32-bit integer images (not supported by cv2) are converted first
+        image_arr = np.asarray(image)
+        if image_arr.dtype not in (np.uint8, np.uint16):
+            image_arr = image_arr.astype('float32')
+        image_arr = resize_image_cv2(image_arr, target_size, interpolation=interpolation).astype('float32')
+    else:
+        image_arr = np.asarray(image, dtype='float32')
 
     if hasattr(image, 'close'):
         image.close()
@@ -93,6 +160,31 @@ def load_image_arr(fpath, mode=None):
     return image_arr
 
 
+def load_npy_arr(fpath, channels=None, channels_first=False):
+    """
+    Loads .npy array as float32 HWC image. File is memory-mapped, so only requested channel planes are read
+    from channel-planar (CHW) arrays.
+    Parameters:
+        channels: indices of channels to load, all channels if None
+        channels_first: whether array is stored as CHW (e.g. flow prepared with --planar_flow)
+    """
+    return select_channels(np.load(fpath, mmap_mode='r'), channels, channels_first)
+
+
+def select_channels(array, channels=None, channels_first=False):
+    """Converts HWC or CHW array (e.g. memory-mapped) to float32 HWC image, copying only requested channels"""
+    if array.ndim == 2:
+        array = array[None]
+        channels_first = True
+
+    if channels_first:
+        planes = array if channels is None else array[channels]
+        return np.array(planes, dtype='float32').transpose((1, 2, 0))
+
+    image_arr = np.array(array, dtype='float32')
+    return image_arr if channels is None else image_arr[..., channels]
+
+
 def convert_hwc_to_chw(image_arr):
     return image_arr.transpose((2, 0, 1))
 
@@ -0,0 +1,74 @@
+import sys
+import types
+import importlib
+
+
+class LazyModule(types.ModuleType):
+    """Proxy of a module, that is imported on the first attribute access"""
+    def __init__(self, name):
+        super().__init__(name)
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self.__name__)
+        return self._module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(module_name):
+    """
+    Returns module proxy, heavy backend (torch, cv2, plotly, ...) is imported only when it is used for the first time.
+    """
+    module = sys.modules.get(module_name)
+    return module if module is not None else LazyModule(module_name)
+
+
+class LazyPackage(types.ModuleType):
+    """Module type with __getattr__ and __dir__ defined in module namespace for python < 3.7 (see PEP 562)"""
+    def __getattr__(self, name):
+        return self.__dict__['__getattr__'](name)
+
+    def __dir__(self):
+        return self.__dict__['__dir__']()
+
+
+def attach(package_name, submodule_attributes):
+    """
+    Makes attributes of package submodules available as package attributes without importing submodules until
+    attribute is requested. Usage in package __init__:
+
+        __getattr__, __dir__, __all__ = attach(__name__, {'submodule': ['function', 'Class']})
+
+    Args:
+        package_name:          __name__ of package
+        submodule_attributes:  dict with submodule names as keys and lists of exported attribute names as values
+
+    Returns:
+        __getattr__, __dir__ and __all__ of package
+    """
+    attribute_to_submodule = {attribute: submodule
+                              for submodule, attributes in submodule_attributes.items()
+                              for attribute in attributes}
+
+    def __getattr__(name):
+        if name not in attribute_to_submodule:
+            raise AttributeError(f'module "{package_name}" has no attribute "{name}"')
+
+        submodule = importlib.import_module(f'{package_name}.{attribute_to_submodule[name]}')
+        value = getattr(submodule, name)
+        setattr(sys.modules[package_name], name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(sys.modules[package_name])) | set(attribute_to_submodule))
+
+    if sys.version_info < (3, 7):
+        sys.modules[package_name].__class__ = LazyPackage
+
+    return __getattr__, __dir__, list(attribute_to_submodule)
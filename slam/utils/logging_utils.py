@@ -1,7 +1,83 @@
+import os
+import time
+import queue
+import atexit
+import hashlib
 import inspect
 import mlflow
+import threading
 from typing import Tuple
 from functools import wraps
+from mlflow.entities import Metric, Param
+
+
+class BufferedLogger:
+    """
+    Accumulates metrics in memory and sends them with log_batch, at most once in flush_interval seconds. Params are
+    sent with log_batch right away.
+    """
+    max_metrics_per_batch = 1000
+    max_params_per_batch = 100
+
+    def __init__(self, flush_interval=30.):
+        self.flush_interval = flush_interval
+        self.params = dict()
+        self.metrics = dict()
+        self.last_flush_time = time.time()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _get_run_id():
+        run = mlflow.active_run()
+        return run.info.run_id if run else None
+
+    def log_params(self, params):
+        """Params are few and logged once, so they are sent right away and are not lost if run crashes"""
+        run_id = self._get_run_id()
+        if run_id is None:
+            return
+        with self.lock:
+            self.params.setdefault(run_id, dict()).update({k: str(v) for k, v in params.items()})
+        self.flush()
+
+    def log_metrics(self, metrics, step=None):
+        run_id = self._get_run_id()
+        if run_id is None:
+            return
+        timestamp = int(time.time() * 1000)
+        with self.lock:
+            self.metrics.setdefault(run_id, list()).extend(
+                Metric(k, float(v), timestamp, step or 0) for k, v in metrics.items())
+        self._flush_if_needed()
+
+    def log_metric(self, key, value, step=None):
+        self.log_metrics({key: value}, step=step)
+
+    def _flush_if_needed(self):
+        if time.time() - self.last_flush_time >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            params, self.params = self.params, dict()
+            metrics, self.metrics = self.metrics, dict()
+            self.last_flush_time = time.time()
+
+        if not params and not metrics:
+            return
+
+        client = mlflow.tracking.MlflowClient()
+        for run_id in set(params) | set(metrics):
+            run_params = [Param(k, v) for k, v in params.get(run_id, dict()).items()]
+            run_metrics = metrics.get(run_id, list())
+            for start in range(0, len(run_params), self.max_params_per_batch):
+                client.log_batch(run_id, params=run_params[start:start + self.max_params_per_batch])
+            for start in range(0, len(run_metrics), self.max_metrics_per_batch):
+                client.log_batch(run_id, metrics=run_metrics[start:start + self.max_metrics_per_batch])
+
+
+buffered_logger = BufferedLogger()
+atexit.register(buffered_logger.flush)
 
 
 def mlflow_logging(ignore: Tuple[str] = (), prefix: str = '', **kwargs):
@@ -31,23 +107,118 @@ def mlflow_logging(ignore: Tuple[str] = (), prefix: str = '', **kwargs):
         def add_prefix(params):
             return {prefix + k: v for k, v in params.items()}
 
+        arg_spec = inspect.getfullargspec(func)
+        default_params = log_default(arg_spec)
+
         @wraps(func)
         def wrapper(*args, **wrapper_kwargs):
 
             if not mlflow.active_run():
                 return func(*args, **wrapper_kwargs)
 
-            arg_spec = inspect.getargspec(func)
-
-            params = log_default(arg_spec)
-            params = log_input(params, arg_spec, args, wrapper_kwargs)
+            params = log_input(default_params, arg_spec, args, wrapper_kwargs)
             params = filter_ignore(params)
             params = add_prefix(params)
 
-            mlflow.log_params(params)
+            buffered_logger.log_params(params)
 
             return func(*args, **wrapper_kwargs)
 
         return wrapper
 
     return decorator
+
+
+class ArtifactSyncer:
+    """
+    Uploads new and changed files of local_dir to artifacts of mlflow run in background thread.
+
+    Files are compared with manifest of sizes, mtimes and md5 hashes of already uploaded files. Temporary files
+    of files being written (see replacing_file and BoVW.save_descriptor_chunk) are skipped.
+    Sync requests are put into bounded queue, if it is full the request is dropped since
+    pending one will upload the same files.
+    """
+    def __init__(self, local_dir, artifact_path=None, run_id=None, max_queue_size=1):
+        self.local_dir = local_dir
+        self.artifact_path = artifact_path
+        self.run_id = run_id or mlflow.active_run().info.run_id
+        self.client = mlflow.tracking.MlflowClient()
+
+        self.manifest = dict()
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def _hash(file_path):
+        md5 = hashlib.md5()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                md5.update(chunk)
+        return md5.hexdigest()
+
+    @staticmethod
+    def _is_temporary(file_name):
+        return file_name.startswith('.tmp_') or file_name.endswith('.tmp')
+
+    def _get_changed_files(self):
+        for root, _, file_names in os.walk(self.local_dir):
+            for file_name in file_names:
+                if self._is_temporary(file_name):
+                    continue
+
+                file_path = os.path.join(root, file_name)
+                try:
+                    stat = os.stat(file_path)
+                    record = self.manifest.get(file_path)
+                    if record is not None and record[:2] == (stat.st_size, stat.st_mtime_ns):
+                        continue
+
+                    file_hash = self._hash(file_path)
+                except FileNotFoundError:
+                    # file was removed after directory was listed
+                    continue
+
+                if record is not None and record[2] == file_hash:
+                    self.manifest[file_path] = (stat.st_size, stat.st_mtime_ns, file_hash)
+                    continue
+
+                yield file_path, (stat.st_size, stat.st_mtime_ns, file_hash)
+
+    def _upload(self):
+        for file_path, record in list(self._get_changed_files()):
+            relative_dir = os.path.relpath(os.path.dirname(file_path), self.local_dir)
+            parts = [part for part in (self.artifact_path, relative_dir) if part and part != '.']
+            artifact_path = os.path.join(*parts) if parts else None
+            try:
+                self.client.log_artifact(self.run_id, file_path, artifact_path)
+            except FileNotFoundError:
+                continue
+            self.manifest[file_path] = record
+
+    def _run(self):
+        while True:
+            request = self.queue.get()
+            try:
+                if request is None:
+                    break
+                self._upload()
+            except Exception as e:
+                print(e)
+            finally:
+                self.queue.task_done()
+
+    def sync(self):
+        try:
+            self.queue.put_nowait(True)
+        except queue.Full:
+            pass
+
+    def flush(self):
+        self.queue.put(True)
+        self.queue.join()
+
+    def close(self):
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
@@ -0,0 +1,144 @@
+import time
+import threading
+from collections import defaultdict
+
+from slam.utils.logging_utils import buffered_logger
+
+
+if hasattr(time, 'CLOCK_THREAD_CPUTIME_ID'):
+    def cpu_time():
+        return time.clock_gettime(time.CLOCK_THREAD_CPUTIME_ID)
+else:
+    cpu_time = time.process_time
+
+
+class NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+class Stage:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.wall_start = None
+        self.cpu_start = None
+
+    def __enter__(self):
+        self.wall_start = time.perf_counter()
+        self.cpu_start = cpu_time()
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.add_time(self.name, time.perf_counter() - self.wall_start, cpu_time() - self.cpu_start)
+        return False
+
+
+class Profiler:
+    """
+    Collects wall and CPU time of named stages, bytes read and cache hits. Numbers are aggregated per batch
+    and per epoch, printed every report_period batches and logged to mlflow at the end of epoch. Epochs are
+    ended by the training loop (see ProfilerCallback), which knows their numbers.
+
+    When disabled, stage() returns a shared no-op context manager and other methods return immediately.
+    """
+    def __init__(self, enabled=False, name='data', report_period=100, log_to_mlflow=True):
+        self.enabled = enabled
+        self.name = name
+        self.report_period = report_period
+        self.log_to_mlflow = log_to_mlflow
+
+        self.lock = threading.Lock()
+        self.batches_num = 0
+        self.wall_time = defaultdict(float)
+        self.cpu_time = defaultdict(float)
+        self.bytes_read = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def stage(self, name):
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, name)
+
+    def add_time(self, name, wall_time, cpu_time):
+        with self.lock:
+            self.wall_time[name] += wall_time
+            self.cpu_time[name] += cpu_time
+
+    def add_bytes(self, bytes_num):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.bytes_read += bytes_num
+
+    def add_cache_access(self, hit):
+        if not self.enabled:
+            return
+        with self.lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def end_batch(self):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.batches_num += 1
+            should_report = self.report_period and self.batches_num % self.report_period == 0
+        if should_report:
+            print(self.report())
+
+    def get_metrics(self):
+        batches_num = max(self.batches_num, 1)
+        metrics = dict()
+        for name in self.wall_time:
+            metrics[f'{self.name}_{name}_wall_ms'] = self.wall_time[name] / batches_num * 1000
+            metrics[f'{self.name}_{name}_cpu_ms'] = self.cpu_time[name] / batches_num * 1000
+        metrics[f'{self.name}_read_mb'] = self.bytes_read / batches_num / 2 ** 20
+
+        cache_accesses = self.cache_hits + self.cache_misses
+        if cache_accesses:
+            metrics[f'{self.name}_cache_hit_rate'] = self.cache_hits / cache_accesses
+        return metrics
+
+    def report(self, epoch=None):
+        with self.lock:
+            batches_num = max(self.batches_num, 1)
+            epoch_as_str = '' if epoch is None else f', epoch {epoch}'
+            lines = [f'{self.name} profile{epoch_as_str}, {self.batches_num} batches (per batch averages):',
+                     f'    {"stage":<20} {"wall, ms":>10} {"cpu, ms":>10}']
+            for name in sorted(self.wall_time, key=self.wall_time.get, reverse=True):
+                lines.append(f'    {name:<20} {self.wall_time[name] / batches_num * 1000:>10.2f} '
+                             f'{self.cpu_time[name] / batches_num * 1000:>10.2f}')
+            lines.append(f'    read: {self.bytes_read / batches_num / 2 ** 20:.2f} MB per batch')
+
+            cache_accesses = self.cache_hits + self.cache_misses
+            if cache_accesses:
+                lines.append(f'    cache hit rate: {self.cache_hits / cache_accesses:.3f} ({cache_accesses} accesses)')
+        return '\n'.join(lines)
+
+    def end_epoch(self, epoch):
+        if not self.enabled:
+            return
+
+        print(self.report(epoch))
+        with self.lock:
+            metrics = self.get_metrics()
+            if self.log_to_mlflow:
+                buffered_logger.log_metrics(metrics, step=epoch)
+
+            self.batches_num = 0
+            self.wall_time.clear()
+            self.cpu_time.clear()
+            self.bytes_read = 0
+            self.cache_hits = 0
+            self.cache_misses = 0
+        return metrics
@@ -1,5 +1,8 @@
 import numpy as np
-import torch
+
+from slam.utils.lazy_import import lazy_import
+
+torch = lazy_import('torch')
 
 
 class Toolbox:
@@ -0,0 +1,101 @@
+import os
+import cv2
+import shutil
+import tempfile
+import unittest
+import importlib
+import numpy as np
+
+import __init_path__
+
+from slam.utils import (save_compressed_arr,
+                        load_compressed_arr,
+                        save_depth_png,
+                        load_depth_png,
+                        load_image_arr,
+                        FLOW_FIXED_POINT_SCALE)
+
+
+# fixed-point values are rounded to the nearest step
+FIXED_POINT_ATOL = 0.5 / FLOW_FIXED_POINT_SCALE + 1e-6
+
+
+def is_installed(module_name):
+    try:
+        importlib.import_module(module_name)
+        return True
+    except ImportError:
+        return False
+
+
+class TestArrayCodecs(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.root = tempfile.mkdtemp()
+        random_state = np.random.RandomState(42)
+        self.flow = random_state.normal(scale=0.05, size=(24, 32, 2)).astype(np.float32)
+        self.flow[0, 0] = np.nan
+        self.depth = random_state.uniform(0.5, 80, size=(24, 32)).astype(np.float32)
+        self.depth[0, 0] = np.nan
+        self.depth[0, 1] = -1
+        self.depth[0, 2] = 300
+        self.depth[0, 3] = np.inf
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.root)
+
+    def assert_flow_is_restored(self, fpath, dtype, atol):
+        save_compressed_arr(fpath, self.flow, dtype=dtype)
+        flow = load_compressed_arr(fpath)
+        self.assertEqual(flow.dtype, np.float32)
+        np.testing.assert_allclose(flow, self.flow, atol=atol)
+
+    def test_npz(self):
+        self.assert_flow_is_restored(os.path.join(self.root, 'flow_float16.npz'), 'float16', atol=1e-4)
+        self.assert_flow_is_restored(os.path.join(self.root, 'flow_int16.npz'), 'int16', atol=FIXED_POINT_ATOL)
+        self.assertLess(os.path.getsize(os.path.join(self.root, 'flow_int16.npz')), self.flow.nbytes / 2)
+
+    @unittest.skipUnless(is_installed('zstandard'), 'zstandard is not installed')
+    def test_zstd(self):
+        self.assert_flow_is_restored(os.path.join(self.root, 'flow.npz.zst'), 'int16', atol=FIXED_POINT_ATOL)
+
+    @unittest.skipUnless(is_installed('lz4'), 'lz4 is not installed')
+    def test_lz4(self):
+        self.assert_flow_is_restored(os.path.join(self.root, 'flow.npz.lz4'), 'float16', atol=1e-4)
+
+    def test_planar_channels(self):
+        fpath = os.path.join(self.root, 'flow_planar.npz')
+        save_compressed_arr(fpath, self.flow.transpose((2, 0, 1)), dtype='int16', channels_first=True)
+        flow = load_compressed_arr(fpath)
+        np.testing.assert_allclose(flow, self.flow, atol=FIXED_POINT_ATOL)
+
+        flow_x = load_compressed_arr(fpath, channels=[0])
+        np.testing.assert_allclose(flow_x, self.flow[..., :1], atol=FIXED_POINT_ATOL)
+
+        # layout does not depend on shape, e.g. of flow of 2 rows
+        save_compressed_arr(fpath, self.flow[:2], dtype='int16')
+        np.testing.assert_allclose(load_compressed_arr(fpath), self.flow[:2], atol=FIXED_POINT_ATOL)
+
+    def test_depth_png(self):
+        fpath = os.path.join(self.root, 'depth.png')
+        save_depth_png(fpath, self.depth[..., None])
+        depth = load_depth_png(fpath)
+        self.assertEqual(depth.dtype, np.float32)
+        self.assertEqual(depth[0, 0], 0)
+        self.assertEqual(depth[0, 1], 0)
+        # depth beyond range of uint16 is clipped, not stored as missing
+        np.testing.assert_array_equal(depth[0, 2:4], np.iinfo(np.uint16).max / 256)
+        np.testing.assert_allclose(depth.ravel()[4:], self.depth.ravel()[4:], atol=1 / 512 + 1e-6)
+
+        depth = load_depth_png(fpath, target_size=(12, 16))
+        self.assertEqual(depth.shape, (12, 16))
+        np.testing.assert_allclose(depth[1:, 2:], self.depth[2::2, 4::2], atol=1 / 512 + 1e-6)
+
+    def test_depth_png_without_scale(self):
+        fpath = os.path.join(self.root, 'dataset_depth.png')
+        cv2.imwrite(fpath, np.arange(24 * 32, dtype=np.uint16).reshape(24, 32) * 50)
+        np.testing.assert_array_equal(load_depth_png(fpath), load_image_arr(fpath))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+import mlflow
+from unittest import mock
+from urllib.parse import urlparse
+
+import __init_path__
+
+from slam.utils import ArtifactSyncer
+
+
+class TestArtifactSyncer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.root = tempfile.mkdtemp()
+        self.local_dir = os.path.join(self.root, 'run')
+        os.makedirs(os.path.join(self.local_dir, 'predictions'))
+        mlflow.set_tracking_uri('file:' + os.path.join(self.root, 'mlruns'))
+        mlflow.set_experiment('artifact_syncer')
+        mlflow.start_run()
+        self.syncer = ArtifactSyncer(self.local_dir, 'run')
+
+        self.uploaded = list()
+        log_artifact = self.syncer.client.log_artifact
+
+        def log_and_record(run_id, local_path, artifact_path=None):
+            self.uploaded.append(os.path.relpath(local_path, self.local_dir))
+            return log_artifact(run_id, local_path, artifact_path)
+        self.syncer.client.log_artifact = log_and_record
+
+    def tearDown(self) -> None:
+        self.syncer.close()
+        mlflow.end_run()
+        shutil.rmtree(self.root)
+
+    def write(self, file_name, content):
+        with open(os.path.join(self.local_dir, file_name), 'w') as f:
+            f.write(content)
+
+    def sync(self):
+        self.uploaded = list()
+        self.syncer.flush()
+        return sorted(self.uploaded)
+
+    def get_artifact(self, file_name):
+        artifact_dir = urlparse(mlflow.get_artifact_uri('run')).path
+        with open(os.path.join(artifact_dir, file_name)) as f:
+            return f.read()
+
+    def test_only_changed_files_are_uploaded(self):
+        self.write('log.txt', 'epoch 1')
+        self.write(os.path.join('predictions', '00.csv'), 'a')
+        self.assertEqual(self.sync(), ['log.txt', os.path.join('predictions', '00.csv')])
+        self.assertEqual(self.sync(), [])
+
+        # rewritten file with the same content is not uploaded again
+        self.write(os.path.join('predictions', '00.csv'), 'a')
+        self.write('log.txt', 'epoch 1, epoch 2')
+        self.assertEqual(self.sync(), ['log.txt'])
+        self.assertEqual(self.get_artifact('log.txt'), 'epoch 1, epoch 2')
+        self.assertEqual(self.get_artifact(os.path.join('predictions', '00.csv')), 'a')
+
+    def test_temporary_files_are_skipped(self):
+        self.write('.tmp_weights.h5', 'partial')
+        self.write('chunk_00000.tmp', 'partial')
+        self.write('weights.h5', 'weights')
+        self.assertEqual(self.sync(), ['weights.h5'])
+
+    def test_removed_file_is_skipped(self):
+        self.write('removed.txt', 'a')
+        self.write('kept.txt', 'b')
+        stat = os.stat
+
+        def stat_of_existing_files(path, *args, **kwargs):
+            if str(path).endswith('removed.txt'):
+                raise FileNotFoundError(path)
+            return stat(path, *args, **kwargs)
+
+        with mock.patch('slam.utils.logging_utils.os.stat', side_effect=stat_of_existing_files):
+            self.assertEqual(self.sync(), ['kept.txt'])
+        self.assertEqual(self.sync(), ['removed.txt'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import torch
+import unittest
+import numpy as np
+import pandas as pd
+
+from slam.linalg import RelativeTrajectory
+from slam.evaluation import calculate_metrics, calculate_loops_mae, calculate_metrics_batch
+
+
+class TestBatchEvaluate(unittest.TestCase):
+
+    def setUp(self) -> None:
+        random_state = np.random.RandomState(42)
+        dofs = ['euler_x', 'euler_y', 'euler_z', 't_x', 't_y', 't_z']
+
+        self.gt_relative, self.predicted_relative = list(), list()
+        self.gt, self.predicted = list(), list()
+        self.gt_loops, self.predicted_loops = list(), list()
+        for trajectory_length in (120, 200, 77):
+            gt_relative = random_state.normal(size=(trajectory_length, 6)) * [0.05, 0.05, 0.05, 1, 1, 1]
+            predicted_relative = gt_relative + random_state.normal(scale=0.02, size=(trajectory_length, 6))
+            self.gt_relative.append(gt_relative)
+            self.predicted_relative.append(predicted_relative)
+            self.gt.append(RelativeTrajectory.from_dataframe(pd.DataFrame(gt_relative, columns=dofs)).to_global())
+            self.predicted.append(
+                RelativeTrajectory.from_dataframe(pd.DataFrame(predicted_relative, columns=dofs)).to_global())
+
+            loops_num = random_state.randint(0, 5)
+            self.gt_loops.append(random_state.normal(size=(loops_num, 6)))
+            self.predicted_loops.append(random_state.normal(size=(loops_num, 6)))
+
+    def assert_same_records(self, records, expected_records):
+        self.assertEqual(len(records), len(expected_records))
+        for record, expected_record in zip(records, expected_records):
+            self.assertEqual(set(record.keys()), set(expected_record.keys()))
+            for metric_name, value in expected_record.items():
+                self.assertAlmostEqual(record[metric_name] / (abs(value) + 1e-9),
+                                       value / (abs(value) + 1e-9),
+                                       places=6,
+                                       msg=metric_name)
+
+    def test_same_as_numpy(self):
+        for rpe_indices in ('full', 'sqrt', 'log', 'kitti'):
+            expected_records = list()
+            for gt, predicted, gt_loops, predicted_loops in zip(self.gt, self.predicted,
+                                                                self.gt_loops, self.predicted_loops):
+                record = calculate_metrics(gt, predicted, rpe_indices=rpe_indices)
+                record.update(calculate_loops_mae(gt_loops, predicted_loops))
+                expected_records.append(record)
+
+            records = calculate_metrics_batch([gt.to_array() for gt in self.gt],
+                                              [predicted.to_array() for predicted in self.predicted],
+                                              self.gt_loops,
+                                              self.predicted_loops,
+                                              rpe_indices=rpe_indices)
+            self.assert_same_records(records, expected_records)
+
+            records = calculate_metrics_batch(self.gt_relative,
+                                              self.predicted_relative,
+                                              self.gt_loops,
+                                              self.predicted_loops,
+                                              rpe_indices=rpe_indices,
+                                              relative=True)
+            self.assert_same_records(records, expected_records)
+
+    def test_num_threads_is_restored(self):
+        num_threads = torch.get_num_threads()
+        calculate_metrics_batch([gt.to_array() for gt in self.gt],
+                                [predicted.to_array() for predicted in self.predicted],
+                                num_threads=num_threads + 1)
+        self.assertEqual(torch.get_num_threads(), num_threads)
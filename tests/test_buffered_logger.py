@@ -0,0 +1,81 @@
+import shutil
+import tempfile
+import unittest
+import importlib
+import mlflow
+from unittest import mock
+
+import __init_path__
+
+from slam.utils import BufferedLogger
+
+
+def is_installed(module_name):
+    try:
+        importlib.import_module(module_name)
+        return True
+    except ImportError:
+        return False
+
+
+class TestBufferedLogger(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.root = tempfile.mkdtemp()
+        mlflow.set_tracking_uri('file:' + self.root)
+        mlflow.set_experiment('buffered_logger')
+        self.client = mlflow.tracking.MlflowClient()
+        self.run_id = mlflow.start_run().info.run_id
+        self.logger = BufferedLogger(flush_interval=3600)
+
+    def tearDown(self) -> None:
+        mlflow.end_run()
+        shutil.rmtree(self.root)
+
+    def get_run_data(self):
+        return self.client.get_run(self.run_id).data
+
+    def test_params_are_sent_right_away(self):
+        self.logger.log_metrics({'loss': 1.}, step=1)
+        self.assertEqual(self.get_run_data().metrics, dict())
+
+        self.logger.log_params({'epochs': 10, 'lr': 0.001})
+        data = self.get_run_data()
+        self.assertEqual(data.params, {'epochs': '10', 'lr': '0.001'})
+        self.assertEqual(data.metrics, {'loss': 1.})
+
+    def test_metrics_are_buffered(self):
+        for step in range(3):
+            self.logger.log_metrics({'loss': 1. / (step + 1)}, step=step)
+        self.assertEqual(self.get_run_data().metrics, dict())
+
+        self.logger.flush()
+        history = self.client.get_metric_history(self.run_id, 'loss')
+        self.assertEqual([metric.step for metric in history], [0, 1, 2])
+
+
+@unittest.skipUnless(is_installed('keras'), 'keras is not installed')
+class TestMlflowLogger(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.root = tempfile.mkdtemp()
+        mlflow.set_tracking_uri('file:' + self.root)
+        mlflow.set_experiment('mlflow_logger')
+        mlflow.start_run()
+
+    def tearDown(self) -> None:
+        mlflow.end_run()
+        shutil.rmtree(self.root)
+
+    def test_failed_flush_does_not_stop_training(self):
+        from slam.evaluation.callbacks import MlflowLogger
+
+        callback = MlflowLogger(run_dir=self.root)
+        with mock.patch('slam.evaluation.callbacks.mlflow_logger_callback.buffered_logger') as logger:
+            logger.flush.side_effect = ConnectionError('tracking server is not available')
+            self.assertEqual(callback.on_train_end({'loss': 1.}), {'loss': 1.})
+        logger.flush.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+import importlib
+import numpy as np
+import pandas as pd
+
+import __init_path__
+
+from slam.evaluation import find_prediction_files, evaluate_predictions, aggregate_predictions, evaluate_dataset
+
+
+def is_installed(module_name):
+    try:
+        importlib.import_module(module_name)
+        return True
+    except ImportError:
+        return False
+
+
+class TestDirectoryEvaluation(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.dataset_root = os.path.join(self.tmp_dir, 'dataset')
+        self.prediction_root = os.path.join(self.tmp_dir, 'predictions')
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.dofs = ['euler_x', 'euler_y', 'euler_z', 't_x', 't_y', 't_z']
+        self.random_state = np.random.RandomState(42)
+
+        self.file_pairs = list()
+        for trajectory_id, trajectory_length in (('00', 300), ('seq/01', 200)):
+            gt_df, predicted_df = self.generate_data(trajectory_length)
+
+            gt_path = os.path.join(self.dataset_root, trajectory_id, 'df.csv')
+            os.makedirs(os.path.dirname(gt_path))
+            gt_df.to_csv(gt_path, index=False)
+
+            predicted_path = os.path.join(self.prediction_root, 'val', trajectory_id.replace('/', '_') + '.csv')
+            os.makedirs(os.path.dirname(predicted_path), exist_ok=True)
+            predicted_df.to_csv(predicted_path)
+
+            self.file_pairs.append((gt_path, predicted_path))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def generate_data(self, trajectory_length):
+        pairs = [(i, i + 1) for i in range(trajectory_length)]
+        pairs += [(i, i + 60) for i in range(0, trajectory_length - 60, 7)]
+
+        gt_df = pd.DataFrame(pairs, columns=['from_index', 'to_index'])
+        gt_df['path_to_rgb'] = gt_df.from_index.apply(lambda x: f'rgb/{x}.png')
+        gt_df['path_to_rgb_next'] = gt_df.to_index.apply(lambda x: f'rgb/{x}.png')
+        gt_df[self.dofs] = pd.DataFrame(self.random_state.normal(scale=0.05, size=(len(gt_df), 6)))
+        predicted_df = gt_df.copy()
+        predicted_df[self.dofs] += self.random_state.normal(scale=0.01, size=(len(gt_df), 6))
+        return gt_df, predicted_df
+
+    def evaluate(self, backend='numpy'):
+        prediction_files = find_prediction_files(self.prediction_root, self.dataset_root)
+        return evaluate_predictions(prediction_files, cache_dir=self.cache_dir, rpe_indices='sqrt', backend=backend)
+
+    def test_same_as_evaluate_dataset(self):
+        metrics = self.evaluate()
+        self.assertEqual(sorted(metrics.trajectory_id), ['00', 'seq/01'])
+
+        expected = evaluate_dataset(self.file_pairs, rpe_indices='sqrt')
+        aggregated = aggregate_predictions(metrics).loc['val']
+        for metric_name, value in expected.items():
+            self.assertAlmostEqual(aggregated[metric_name], value, places=6)
+
+    def test_cache(self):
+        metrics = self.evaluate()
+        self.assertFalse(metrics.cached.any())
+
+        cached_metrics = self.evaluate()
+        self.assertTrue(cached_metrics.cached.all())
+        self.assertTrue(np.allclose(cached_metrics.ATE, metrics.ATE))
+
+        predicted_path = self.file_pairs[0][1]
+        predicted_df = pd.read_csv(predicted_path, index_col=0)
+        predicted_df['t_x'] += 0.01
+        predicted_df.to_csv(predicted_path)
+
+        updated_metrics = self.evaluate().set_index('trajectory_id')
+        self.assertFalse(updated_metrics.loc['00', 'cached'])
+        self.assertTrue(updated_metrics.loc['seq/01', 'cached'])
+
+    @unittest.skipUnless(is_installed('torch'), 'torch is not installed')
+    def test_cache_of_backends(self):
+        self.assertFalse(self.evaluate(backend='numpy').cached.any())
+        self.assertFalse(self.evaluate(backend='torch').cached.any())
+        self.assertTrue(self.evaluate(backend='torch').cached.all())
+
+
+if __name__ == '__main__':
+    unittest.main()
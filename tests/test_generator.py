@@ -0,0 +1,147 @@
+import os
+import cv2
+import shutil
+import time
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from unittest import mock
+
+import __init_path__
+
+from keras_preprocessing.image import ImageDataGenerator
+from slam.data_manager.generator import ExtendedDataFrameIterator
+from slam.utils import save_compressed_arr, save_depth_png
+
+
+class TestExtendedDataFrameIterator(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, 'rgb'))
+
+        random_state = np.random.RandomState(42)
+        trajectory_length = 20
+        for index in range(trajectory_length):
+            image = random_state.randint(0, 255, size=(48, 64, 3)).astype(np.uint8)
+            cv2.imwrite(os.path.join(self.root, 'rgb', f'{index}.png'), image)
+
+        from_indices = list(range(trajectory_length - 1)) + list(range(trajectory_length - 2))
+        to_indices = list(range(1, trajectory_length)) + list(range(2, trajectory_length))
+        self.dof_cols = ['euler_x', 'euler_y', 'euler_z', 't_x', 't_y', 't_z']
+        self.df = pd.DataFrame(random_state.normal(size=(len(from_indices), 6)), columns=self.dof_cols)
+        self.df['path_to_rgb'] = [f'rgb/{index}.png' for index in from_indices]
+        self.df['path_to_rgb_next'] = [f'rgb/{index}.png' for index in to_indices]
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.root)
+
+    def get_iterator(self, **kwargs):
+        return ExtendedDataFrameIterator(self.df.copy(),
+                                         self.root,
+                                         ImageDataGenerator(),
+                                         x_col=['path_to_rgb', 'path_to_rgb_next'],
+                                         y_col=self.dof_cols,
+                                         image_col=['path_to_rgb', 'path_to_rgb_next'],
+                                         target_size=(24, 32),
+                                         load_mode='rgb',
+                                         preprocess_mode='rgb',
+                                         batch_size=16,
+                                         **kwargs)
+
+    def test_frames_are_decoded_once(self):
+        iterator = self.get_iterator(shuffle=False)
+        loaded_paths = list()
+        load_image = iterator._load_image
+        iterator._load_image = lambda fpath, load_mode: loaded_paths.append(fpath) or load_image(fpath, load_mode)
+
+        index_array = np.arange(len(self.df))
+        batch_x, batch_y = iterator._get_batches_of_transformed_samples(index_array)
+        self.assertEqual(len(loaded_paths), 20)
+        self.assertEqual(len(set(loaded_paths)), 20)
+
+        for index_in_batch, path in enumerate(self.df['path_to_rgb_next']):
+            expected_image = cv2.cvtColor(cv2.imread(os.path.join(self.root, path)), cv2.COLOR_BGR2RGB)
+            expected_image = cv2.resize(expected_image, (32, 24), interpolation=cv2.INTER_NEAREST)
+            np.testing.assert_array_equal(batch_x[1][index_in_batch], expected_image)
+
+    def test_decode_workers(self):
+        index_array = np.arange(len(self.df))
+        batch_x, batch_y = self.get_iterator(shuffle=False)._get_batches_of_transformed_samples(index_array)
+        parallel_batch_x, parallel_batch_y = self.get_iterator(shuffle=False, decode_workers=4)\
+            ._get_batches_of_transformed_samples(index_array)
+
+        for images, parallel_images in zip(batch_x, parallel_batch_x):
+            np.testing.assert_array_equal(images, parallel_images)
+
+    def test_decode_workers_with_cache(self):
+        index_array = np.arange(len(self.df))
+        batch_x, _ = self.get_iterator(shuffle=False)._get_batches_of_transformed_samples(index_array)
+
+        # caching stops once cache of 1000 images exceeds memory limit
+        cached_images = {f'cached/{index}.png': None for index in range(995)}
+        iterator = self.get_iterator(shuffle=False, decode_workers=8, cached_images=cached_images)
+
+        # size of cache is checked and updated by one decode thread at a time
+        checks = {'active': 0, 'max_active': 0}
+        check_stop_caching = iterator._check_stop_caching
+
+        def check_alone():
+            checks['active'] += 1
+            checks['max_active'] = max(checks['max_active'], checks['active'])
+            time.sleep(0.01)
+            check_stop_caching()
+            checks['active'] -= 1
+
+        iterator._check_stop_caching = check_alone
+        with mock.patch('slam.data_manager.generator.psutil.virtual_memory', return_value=mock.Mock(percent=100)):
+            parallel_batch_x, _ = iterator._get_batches_of_transformed_samples(index_array)
+
+        self.assertEqual(checks['max_active'], 1)
+        self.assertEqual(len(cached_images), 1000)
+        for images, parallel_images in zip(batch_x, parallel_batch_x):
+            np.testing.assert_array_equal(images, parallel_images)
+
+    def test_frame_group_sampler(self):
+        iterator = self.get_iterator(shuffle=True, frame_group_size=4)
+        iterator._set_index_array()
+        self.assertEqual(sorted(iterator.index_array), list(range(len(self.df))))
+
+        first_frames = np.minimum(iterator.df['from_index'], iterator.df['to_index']).values[iterator.index_array]
+        neighbours_distance = np.abs(np.diff(first_frames))
+        self.assertGreaterEqual(np.mean(neighbours_distance <= 1), 0.5)
+
+    def test_compressed_formats(self):
+        iterator = self.get_iterator(shuffle=False)
+        random_state = np.random.RandomState(42)
+
+        flow = random_state.normal(scale=0.05, size=(24, 32, 2)).astype(np.float32)
+        save_compressed_arr(os.path.join(self.root, 'flow.npz'), flow.transpose((2, 0, 1)), dtype='int16',
+                            channels_first=True)
+        np.testing.assert_allclose(iterator._load_image(os.path.join(self.root, 'flow.npz'), 'flow_xy'),
+                                   flow,
+                                   atol=1e-3)
+
+        depth = random_state.uniform(0.5, 80, size=(48, 64)).astype(np.float32)
+        save_depth_png(os.path.join(self.root, 'depth.png'), depth)
+        loaded_depth = iterator._load_image(os.path.join(self.root, 'depth.png'), 'depth')
+        self.assertEqual(loaded_depth.shape, (24, 32, 1))
+        np.testing.assert_allclose(loaded_depth[..., 0], depth[::2, ::2], atol=1e-2)
+
+    def test_planar_flow(self):
+        flow = np.random.RandomState(42).normal(scale=0.05, size=(48, 64, 2)).astype(np.float32)
+        np.save(os.path.join(self.root, 'flow.npy'), flow.transpose((2, 0, 1)))
+        np.save(os.path.join(self.root, 'flow_hwc.npy'), flow)
+
+        # layout is given by generator, not guessed from shape of flow prepared at larger size
+        iterator = self.get_iterator(shuffle=False, planar_flow=True)
+        np.testing.assert_array_equal(iterator._load_image(os.path.join(self.root, 'flow.npy'), 'flow_xy'),
+                                      flow[::2, ::2])
+        iterator = self.get_iterator(shuffle=False)
+        np.testing.assert_array_equal(iterator._load_image(os.path.join(self.root, 'flow_hwc.npy'), 'flow_xy'),
+                                      flow[::2, ::2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import importlib
+import numpy as np
+import pandas as pd
+
+import __init_path__
+
+
+def is_installed(module_name):
+    try:
+        importlib.import_module(module_name)
+        return True
+    except ImportError:
+        return False
+
+
+def generate_edges(edges):
+    """Dataframe of GraphOptimizer edges from (from_index, to_index, t_x) tuples, unit confidences"""
+    df = pd.DataFrame(edges, columns=['from_index', 'to_index', 't_x'])
+    for col in ('euler_x', 'euler_y', 'euler_z', 't_y', 't_z'):
+        df[col] = 0.
+    for col in ('euler_x', 'euler_y', 'euler_z', 't_x', 't_y', 't_z'):
+        df[col + '_confidence'] = 0.1
+    return df
+
+
+@unittest.skipUnless(is_installed('g2o'), 'g2o is not installed')
+class TestRobustGraphOptimizer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        trajectory_length = 30
+        odometry = [(index, index + 1, 1.) for index in range(trajectory_length - 1)]
+        stride_2 = [(index, index + 2, 2.) for index in range(trajectory_length - 2)]
+        loops = [(0, 20, 20.), (5, 25, 20.)]
+        self.outlier = (3, 28, -40.)
+        self.df = generate_edges(odometry + stride_2 + loops + [self.outlier])
+
+    def test_outlier_loop_is_rejected(self):
+        from slam.graph_optimization import GraphOptimizer
+
+        # loop_threshold=0 as in TrajectoryEstimator, strides of odometry are told apart from loops
+        optimizer = GraphOptimizer(max_iterations=100,
+                                   robust_kernel='huber',
+                                   loop_threshold=0,
+                                   odometry_strides=(1, 2),
+                                   chi2_threshold=12.59)
+        optimizer.append(self.df)
+        trajectory = optimizer.get_trajectory()
+
+        self.assertEqual(len(optimizer.loop_edges), 3)
+        self.assertEqual([edge.level() for edge in optimizer.loop_edges], [0, 0, 1])
+        self.assertEqual(sum(edge.level() for edge in optimizer.optimizer.edges()), 1)
+
+        np.testing.assert_allclose(trajectory.points[:, 0], np.arange(len(trajectory)), atol=0.1)
+
+    def test_gating_requires_loop_threshold(self):
+        from slam.graph_optimization import GraphOptimizer
+
+        with self.assertRaises(ValueError):
+            GraphOptimizer(chi2_threshold=12.59)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import cv2
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+import __init_path__
+
+from slam.utils import load_image_arr, load_npy_arr, resize_image_arr
+
+
+class TestImageLoading(unittest.TestCase):
+
+    def setUp(self) -> None:
+        random_state = np.random.RandomState(42)
+        self.image = random_state.randint(0, 255, size=(376, 1241, 3)).astype(np.uint8)
+        self.root = tempfile.mkdtemp()
+        for ext in ('png', 'jpg'):
+            cv2.imwrite(os.path.join(self.root, f'0.{ext}'), self.image)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.root)
+
+    def load_reference(self, fpath, mode, target_size, interpolation):
+        image_arr = load_image_arr(fpath, mode=mode)
+        if image_arr.ndim == 2:
+            image_arr = image_arr[..., None]
+        return resize_image_arr(image_arr, target_size, data_format='channels_last', mode=interpolation)
+
+    def test_png_is_resized_as_before(self):
+        fpath = os.path.join(self.root, '0.png')
+        for mode in ('RGB', 'L'):
+            for interpolation in ('nearest', 'bilinear'):
+                image_arr = load_image_arr(fpath, mode=mode, target_size=(96, 320), interpolation=interpolation)
+                if image_arr.ndim == 2:
+                    image_arr = image_arr[..., None]
+                reference = self.load_reference(fpath, mode, (96, 320), interpolation)
+                self.assertEqual(image_arr.dtype, np.float32)
+                self.assertEqual(image_arr.shape, reference.shape)
+                self.assertLessEqual(np.abs(image_arr - reference).max(), 1)
+
+    def test_jpeg_is_decoded_at_reduced_size(self):
+        fpath = os.path.join(self.root, '0.jpg')
+        image_arr = load_image_arr(fpath, mode='RGB', target_size=(96, 320))
+        self.assertEqual(image_arr.shape, (96, 320, 3))
+        self.assertEqual(image_arr.dtype, np.float32)
+
+        with self.assertRaises(ValueError):
+            load_image_arr(fpath, mode='RGB', target_size=(96, 320), interpolation='unknown')
+
+    def test_planar_arrays(self):
+        random_state = np.random.RandomState(42)
+        motion_maps = random_state.uniform(size=(7, 24, 32)).astype(np.float32)
+        np.save(os.path.join(self.root, 'motion_maps.npy'), motion_maps)
+        image_arr = load_npy_arr(os.path.join(self.root, 'motion_maps.npy'), channels=[2, 5], channels_first=True)
+        np.testing.assert_array_equal(image_arr, motion_maps[[2, 5]].transpose((1, 2, 0)))
+
+        # flow prepared at larger size than target size of training
+        flow = random_state.uniform(size=(120, 160, 2)).astype(np.float32)
+        np.save(os.path.join(self.root, 'flow.npy'), flow)
+        np.save(os.path.join(self.root, 'flow_planar.npy'), flow.transpose((2, 0, 1)).astype(np.float16))
+        for fname, channels_first in (('flow.npy', False), ('flow_planar.npy', True)):
+            image_arr = load_npy_arr(os.path.join(self.root, fname), channels_first=channels_first)
+            self.assertEqual(image_arr.dtype, np.float32)
+            self.assertTrue(image_arr.flags.writeable)
+            np.testing.assert_allclose(image_arr, flow, atol=1e-3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import sys
+import json
+import unittest
+import subprocess
+
+import __init_path__
+
+
+IMPORT_SCRIPT = '''
+import sys
+import json
+import time
+
+start_time = time.perf_counter()
+
+import slam.linalg
+import slam.evaluation
+from slam.linalg import GlobalTrajectory, RelativeTrajectory
+from slam.evaluation import calculate_metrics, average_metrics, evaluate_files
+
+import_time = time.perf_counter() - start_time
+
+heavy_modules = ('torch', 'tensorflow', 'keras', 'cv2', 'g2o', 'mlflow', 'plotly')
+print(json.dumps({'import_time': import_time, 'loaded': [m for m in heavy_modules if m in sys.modules]}))
+'''
+
+
+class TestImportTime(unittest.TestCase):
+
+    def import_evaluation(self):
+        output = subprocess.check_output([sys.executable, '-c', IMPORT_SCRIPT], cwd=__init_path__.project_path)
+        return json.loads(output.decode().strip().split('\n')[-1])
+
+    def test_heavy_backends_are_not_imported(self):
+        self.assertEqual(self.import_evaluation()['loaded'], [])
+
+    def test_import_time_budget(self):
+        import_time = min(self.import_evaluation()['import_time'] for _ in range(3))
+        self.assertLess(import_time, 0.5)
+
+    def test_backend_is_imported_on_first_use(self):
+        import slam.evaluation
+        self.assertTrue(callable(slam.evaluation.calculate_metrics))
+        self.assertIn('calculate_metrics', dir(slam.evaluation))
+        with self.assertRaises(AttributeError):
+            slam.evaluation.unknown_function
+
+
+if __name__ == '__main__':
+    unittest.main()
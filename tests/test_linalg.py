@@ -36,3 +36,27 @@ class TestCovarianceConverter(unittest.TestCase):
     def test_3(self):
         covariance_matrix, answer = self.generate_data(2)
         self.assertTrue(np.allclose(covariance_matrix, answer))
+
+
+class TestVectorizedConversions(unittest.TestCase):
+
+    def setUp(self):
+        self.euler_angles = np.random.RandomState(42).uniform(-np.pi / 2, np.pi / 2, (100, 3))
+
+    def test_euler_angles_round_trip(self):
+        rotation_matrices = linalg.convert_euler_angles_to_rotation_matrices(self.euler_angles)
+        for euler_angles, rotation_matrix in zip(self.euler_angles, rotation_matrices):
+            self.assertTrue(np.allclose(rotation_matrix, linalg.convert_euler_angles_to_rotation_matrix(euler_angles)))
+
+        euler_angles = linalg.convert_rotation_matrices_to_euler_angles(rotation_matrices)
+        self.assertTrue(np.allclose(euler_angles, self.euler_angles))
+
+    def test_quaternion_distance(self):
+        from pyquaternion import Quaternion
+
+        quaternions = np.stack(linalg.euler_to_quaternion(self.euler_angles.T), axis=1)
+        distance = linalg.quaternion_distance(quaternions[1:], quaternions[:-1])
+        expected = [Quaternion.distance(Quaternion(q0), Quaternion(q1))
+                    for q0, q1 in zip(quaternions[1:], quaternions[:-1])]
+        self.assertTrue(np.allclose(distance, expected))
+        self.assertTrue(np.allclose(linalg.quaternion_distance(quaternions, quaternions), 0))
@@ -0,0 +1,59 @@
+import unittest
+import numpy as np
+import pandas as pd
+
+from slam.linalg import RelativeTrajectory
+from slam.evaluation.evaluate import (GTMetricsContext,
+                                      calculate_absolute_trajectory_error,
+                                      calculate_relative_pose_error)
+
+
+class TestGTMetricsContext(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.dofs = ['euler_x', 'euler_y', 'euler_z', 't_x', 't_y', 't_z']
+        self.random_state = np.random.RandomState(42)
+
+    def generate_trajectories(self, trajectory_length):
+        gt_df = pd.DataFrame(self.random_state.normal(scale=0.05, size=(trajectory_length, 6)), columns=self.dofs)
+        gt_df['t_z'] += 1.5
+        predicted_df = gt_df + self.random_state.normal(scale=0.01, size=(trajectory_length, 6))
+        return (RelativeTrajectory.from_dataframe(gt_df).to_global(),
+                RelativeTrajectory.from_dataframe(predicted_df).to_global())
+
+    def assert_same_as_separate_passes(self, rpe_indices, max_cached_pairs=2 * 10 ** 6):
+        gt_trajectory, predicted_trajectory = self.generate_trajectories(500)
+        context = GTMetricsContext(gt_trajectory, rpe_indices=rpe_indices, max_cached_pairs=max_cached_pairs)
+
+        for _ in range(2):
+            metrics = context.calculate_metrics(predicted_trajectory)
+
+            self.assertAlmostEqual(metrics['ATE'],
+                                   calculate_absolute_trajectory_error(gt_trajectory, predicted_trajectory))
+
+            rpe_t, rpe_r, divider = calculate_relative_pose_error(gt_trajectory, predicted_trajectory,
+                                                                  rpe_indices=rpe_indices, rpe_mode='rpe')
+            self.assertAlmostEqual(metrics['RPE_t'] / rpe_t, 1)
+            self.assertAlmostEqual(metrics['RPE_r'] / rpe_r, 1)
+            self.assertEqual(metrics['RPE_divider'], divider)
+
+            rmse_t, rmse_r, _ = calculate_relative_pose_error(gt_trajectory, predicted_trajectory,
+                                                              rpe_indices=rpe_indices, rpe_mode='rmse')
+            self.assertAlmostEqual(metrics['RMSE_t'], rmse_t)
+            self.assertAlmostEqual(metrics['RMSE_r'], rmse_r)
+
+    def test_full(self):
+        self.assert_same_as_separate_passes('full')
+
+    def test_full_without_cached_deltas(self):
+        self.assert_same_as_separate_passes('full', max_cached_pairs=0)
+
+    def test_sqrt(self):
+        self.assert_same_as_separate_passes('sqrt')
+
+    def test_kitti(self):
+        self.assert_same_as_separate_passes('kitti')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,228 @@
+import os
+import shutil
+import tempfile
+import unittest
+import importlib
+import numpy as np
+import pandas as pd
+
+import __init_path__
+
+
+DOF_COLS = ['euler_x', 'euler_y', 'euler_z', 't_x', 't_y', 't_z']
+
+
+def is_installed(module_name):
+    try:
+        importlib.import_module(module_name)
+        return True
+    except ImportError:
+        return False
+
+
+def generate_subset(trajectory_lengths, random_state):
+    """Dataframe of consecutive and stride 60 pairs (treated as loops by Predict) of several trajectories"""
+    dfs = list()
+    for trajectory_index, trajectory_length in enumerate(trajectory_lengths):
+        pairs = [(index, index + 1) for index in range(trajectory_length - 1)]
+        pairs += [(index, index + 60) for index in range(0, trajectory_length - 60, 10)]
+        df = pd.DataFrame(pairs, columns=['from_index', 'to_index'])
+        df['path_to_rgb'] = df.from_index.apply(lambda index: f'rgb/{index:06d}.png')
+        df['path_to_rgb_next'] = df.to_index.apply(lambda index: f'rgb/{index:06d}.png')
+        df['trajectory_id'] = f'{trajectory_index:02d}'
+        for col in DOF_COLS:
+            df[col] = random_state.normal(scale=0.05 if col.startswith('euler') else 1, size=len(df))
+        dfs.append(df.drop(columns=['from_index', 'to_index']))
+    return pd.concat(dfs, ignore_index=True)
+
+
+class StubGenerator:
+
+    def __init__(self, df):
+        self.df = df
+        self.y_cols = DOF_COLS[:]
+        self.dof_cols = DOF_COLS[:]
+        self.return_cols = DOF_COLS[:]
+
+    def reset(self):
+        pass
+
+    def __len__(self):
+        return 1
+
+
+class StubDataset:
+
+    def __init__(self, random_state):
+        self.df_train = generate_subset([100, 80], random_state)
+        self.df_val = generate_subset([90], random_state)
+        self.df_test = generate_subset([70], random_state)
+
+    def get_train_generator(self, as_is=False, augment=False):
+        return StubGenerator(self.df_train)
+
+    def get_val_generator(self, augment=False):
+        return StubGenerator(self.df_val)
+
+    def get_test_generator(self, augment=False):
+        return StubGenerator(self.df_test)
+
+
+class StubModel:
+    """Predicts gt dofs with noise, which grows with every prediction, as separate outputs of keras model"""
+
+    def __init__(self):
+        self.predictions_num = 0
+        self.weights = [np.zeros(1)]
+
+    def predict_generator(self, generator, steps=None):
+        self.predictions_num += 1
+        random_state = np.random.RandomState(self.predictions_num)
+        noise = random_state.normal(scale=0.01 * self.predictions_num, size=(len(generator.df), len(DOF_COLS)))
+        predicted = generator.df[DOF_COLS].values + noise
+        return [predicted[:, [index]] for index in range(len(DOF_COLS))]
+
+    def get_weights(self):
+        return [weight.copy() for weight in self.weights]
+
+    def set_weights(self, weights):
+        self.weights = weights
+
+    def save_weights(self, file_path, overwrite=True):
+        with open(file_path, 'wb') as f:
+            np.save(f, self.weights[0])
+
+
+@unittest.skipUnless(is_installed('keras') and is_installed('keras_contrib'), 'keras is not installed')
+class TestPredict(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.root = tempfile.mkdtemp()
+        self.dataset = StubDataset(np.random.RandomState(42))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.root)
+
+    def create_callback(self, save_dir, **kwargs):
+        from slam.evaluation.callbacks import Predict
+        return Predict(model=StubModel(),
+                       dataset=self.dataset,
+                       save_dir=os.path.join(self.root, save_dir),
+                       period=1,
+                       evaluate=True,
+                       **kwargs)
+
+    @staticmethod
+    def train(callback, losses):
+        epoch_logs = [callback.on_epoch_end(epoch, {'val_loss': loss}) for epoch, loss in enumerate(losses)]
+        return epoch_logs, callback.on_train_end()
+
+    def assert_same_logs(self, logs, expected_logs):
+        self.assertEqual(set(logs.keys()), set(expected_logs.keys()))
+        for key, value in expected_logs.items():
+            self.assertAlmostEqual(logs[key], value, places=6, msg=key)
+
+    def test_asynchronous(self):
+        losses = [3, 2, 1]
+        callback = self.create_callback('sync', workers=0)
+        sync_epoch_logs, sync_final_logs = self.train(callback, losses)
+
+        callback = self.create_callback('async', workers=0, asynchronous=True, max_pending=len(losses))
+        for epoch, loss in enumerate(losses):
+            # metrics are not waited for, only logs of keras are returned
+            self.assertEqual(callback.on_epoch_end(epoch, {'val_loss': loss}), {'val_loss': loss})
+
+        callback._collect_pending(wait=True)
+        self.assertEqual(callback.pending, [])
+        self.assertEqual(callback.last_prediction_id, 'best')
+        self.assertEqual(callback.epochs_since_last_predict, 0)
+        for epoch, logs in enumerate(sync_epoch_logs):
+            self.assert_same_logs(callback.evaluated_logs[epoch], logs)
+
+        self.assert_same_logs(callback.on_train_end(), sync_final_logs)
+
+    @unittest.skipUnless(is_installed('torch'), 'torch is not installed')
+    def test_torch_backend(self):
+        losses = [2, 1]
+        epoch_logs, final_logs = self.train(self.create_callback('numpy', workers=0), losses)
+
+        callback = self.create_callback('torch', workers=0, backend='torch', max_to_visualize=1)
+        torch_epoch_logs, torch_final_logs = self.train(callback, losses)
+        for logs, expected_logs in zip(torch_epoch_logs, epoch_logs):
+            self.assert_same_logs(logs, expected_logs)
+        self.assert_same_logs(torch_final_logs, final_logs)
+
+        # trajectories are integrated by torch together with metrics, only visualized ones are integrated in numpy
+        tasks = callback._create_tasks(callback.train_generator, 'train')
+        self.assertEqual([task['predicted'] for task in tasks], [None, None])
+        callback._save_tasks(tasks, prediction_id='best', max_to_visualize=1)
+        self.assertIsNotNone(tasks[0]['predicted'])
+        self.assertIsNone(tasks[1]['predicted'])
+
+    def test_pool(self):
+        from slam.evaluation.callbacks import predict_callback
+
+        losses = [2, 1]
+        callback = self.create_callback('serial', workers=0)
+        epoch_logs, final_logs = self.train(callback, losses)
+
+        callback = self.create_callback('pool', workers=2)
+        self.assertIsNone(callback.pool)
+        pool_epoch_logs = [callback.on_epoch_end(0, {'val_loss': losses[0]})]
+        pool = callback.pool
+        self.assertIsNotNone(pool)
+        pool_epoch_logs.append(callback.on_epoch_end(1, {'val_loss': losses[1]}))
+        self.assertIs(callback.pool, pool)
+        pool_final_logs = callback.on_train_end()
+        self.assertIsNone(callback.pool)
+
+        for logs, expected_logs in zip(pool_epoch_logs, epoch_logs):
+            self.assert_same_logs(logs, expected_logs)
+        self.assert_same_logs(pool_final_logs, final_logs)
+
+        # contexts are sent to workers by pool initializer, so tasks carry only their keys
+        task = callback._create_tasks(callback.val_generator, 'val')[0]
+        payload = callback._create_payload(task)
+        self.assertNotIn('context', payload)
+        self.assertEqual(payload['context_key'], ('val', '00'))
+        self.assertEqual(predict_callback.gt_contexts, dict())
+
+    def test_npz_visuals(self):
+        from slam.linalg import GlobalTrajectory
+
+        callback = self.create_callback('npz', workers=0)
+        self.train(callback, [1])
+
+        visuals = np.load(os.path.join(self.root, 'npz', 'visuals', 'best', 'val', '00.npz'))
+        self.assertEqual(set(visuals.keys()), {'predicted', 'gt', 'title'})
+        self.assertTrue(str(visuals['title']).startswith('00: '))
+        self.assertIn('ATE', str(visuals['title']))
+        gt = callback.gt_cache['val']['00']['gt']
+        self.assertEqual(len(GlobalTrajectory.from_array(visuals['gt'])), len(gt))
+        np.testing.assert_allclose(visuals['gt'], gt.to_array())
+
+    def test_final_is_not_changed_by_best(self):
+        checkpoint_path = os.path.join(self.root, 'weights.npy')
+        callback = self.create_callback('final', workers=0, checkpoint_path=checkpoint_path)
+        self.train(callback, [1])
+
+        paths = [os.path.join(self.root, 'final', 'predictions', '{}', 'val', '00.csv'),
+                 os.path.join(self.root, 'final', 'visuals', '{}', 'val', '00.npz')]
+        contents = [open(path.format('final'), 'rb').read() for path in paths]
+        final_weights = np.load(os.path.join(self.root, 'final.npy'))
+
+        # best predictions and weights are rewritten after final ones are linked to them
+        callback.checkpoint_path = checkpoint_path
+        callback._save_tasks(callback._create_tasks(callback.val_generator, 'val'), prediction_id='best')
+        callback.model.weights = [np.ones(1)]
+        callback._save_weights({}, epoch=1)
+
+        for path, content in zip(paths, contents):
+            self.assertNotEqual(open(path.format('best'), 'rb').read(), content)
+            self.assertEqual(open(path.format('final'), 'rb').read(), content)
+        np.testing.assert_array_equal(np.load(checkpoint_path), np.ones(1))
+        np.testing.assert_array_equal(np.load(os.path.join(self.root, 'final.npy')), final_weights)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import time
+import unittest
+import importlib
+from unittest import mock
+
+import __init_path__
+
+from slam.utils import Profiler
+from slam.utils.profiling_utils import NULL_STAGE
+
+
+def is_installed(module_name):
+    try:
+        importlib.import_module(module_name)
+        return True
+    except ImportError:
+        return False
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.profiler = Profiler(enabled=True, name='data', report_period=None, log_to_mlflow=False)
+
+    def run_batches(self, profiler, batches_num):
+        for _ in range(batches_num):
+            with profiler.stage('read'):
+                time.sleep(0.01)
+            with profiler.stage('resize'):
+                sum(range(10 ** 5))
+            profiler.add_bytes(2 ** 20)
+            profiler.add_cache_access(hit=False)
+            profiler.add_cache_access(hit=True)
+            profiler.add_cache_access(hit=True)
+            profiler.end_batch()
+
+    def test_stages(self):
+        self.run_batches(self.profiler, 3)
+        metrics = self.profiler.get_metrics()
+
+        # sleeping takes wall time only
+        self.assertGreaterEqual(metrics['data_read_wall_ms'], 10)
+        self.assertLess(metrics['data_read_cpu_ms'], 5)
+        self.assertGreater(metrics['data_resize_cpu_ms'], 0)
+
+        self.assertAlmostEqual(metrics['data_read_mb'], 1)
+        self.assertAlmostEqual(metrics['data_cache_hit_rate'], 2 / 3)
+
+        report = self.profiler.report(epoch=4)
+        self.assertTrue(report.startswith('data profile, epoch 4, 3 batches'))
+        self.assertIn('cache hit rate: 0.667 (9 accesses)', report)
+
+    def test_end_epoch(self):
+        self.profiler.log_to_mlflow = True
+        with mock.patch('slam.utils.profiling_utils.buffered_logger') as buffered_logger:
+            self.run_batches(self.profiler, 2)
+            metrics = self.profiler.end_epoch(7)
+            buffered_logger.log_metrics.assert_called_once_with(metrics, step=7)
+
+            self.run_batches(self.profiler, 1)
+            self.profiler.end_epoch(8)
+            self.assertEqual(buffered_logger.log_metrics.call_args[1]['step'], 8)
+
+        # numbers of epoch are reset
+        self.assertAlmostEqual(buffered_logger.log_metrics.call_args[0][0]['data_read_mb'], 1)
+        self.assertEqual(self.profiler.batches_num, 0)
+        self.assertEqual(self.profiler.get_metrics(), {'data_read_mb': 0})
+
+    def test_disabled(self):
+        profiler = Profiler(enabled=False)
+        self.assertIs(profiler.stage('read'), NULL_STAGE)
+
+        with mock.patch('slam.utils.profiling_utils.buffered_logger') as buffered_logger:
+            self.run_batches(profiler, 2)
+            self.assertIsNone(profiler.end_epoch(0))
+            buffered_logger.log_metrics.assert_not_called()
+
+        self.assertEqual(profiler.batches_num, 0)
+        self.assertEqual(profiler.bytes_read, 0)
+        self.assertEqual(profiler.cache_hits + profiler.cache_misses, 0)
+        self.assertEqual(len(profiler.wall_time), 0)
+
+    @unittest.skipUnless(is_installed('keras') and is_installed('keras_contrib'), 'keras is not installed')
+    def test_callback(self):
+        from slam.evaluation.callbacks import ProfilerCallback
+
+        callback = ProfilerCallback([self.profiler])
+        with mock.patch.object(self.profiler, 'end_epoch') as end_epoch:
+            self.assertIsNone(callback.on_epoch_end(3, {'loss': 1}))
+            end_epoch.assert_called_once_with(3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import os
+import cv2
+import shutil
+import tempfile
+import unittest
+import importlib
+import numpy as np
+import pandas as pd
+
+import __init_path__
+
+
+LEVELS = range(2, 4)
+
+
+def is_installed(module_name):
+    try:
+        importlib.import_module(module_name)
+        return True
+    except ImportError:
+        return False
+
+
+class StubPWCNet:
+    """
+    Imitates graph of FeaturePyramidPWCNet: features of every level are marked with pixel value of the image
+    (frame index) and the level, flow is difference of marks of the frames of pair.
+    """
+    def __init__(self, levels):
+        self.x_tnsr = 'x'
+        self.y_hat_test_tnsr = 'y_hat'
+        self.c1_tnsrs = {lvl: ('c1', lvl) for lvl in levels}
+        self.c2_tnsrs = {lvl: ('c2', lvl) for lvl in levels}
+        self.levels = levels
+        self.sess = self
+        self.encoded_batches = list()
+
+    def adapt_x(self, batch):
+        return np.stack(batch).astype(np.float32), None
+
+    def run(self, tensors, feed_dict):
+        if tensors == self.y_hat_test_tnsr:
+            level = self.levels[0]
+            flow = feed_dict[self.c2_tnsrs[level]] - feed_dict[self.c1_tnsrs[level]]
+            return np.tile(flow[:, None, None], (1, 1, 1, 2))
+
+        x = feed_dict[self.x_tnsr]
+        marks = x[:, :, 0, 0, 0]
+        self.encoded_batches.append(marks.astype(int).tolist())
+        return [marks[:, [0 if name == 'c1' else 1]] + 1000 * lvl for name, lvl in tensors]
+
+    def postproc_y_hat_test(self, y_hat, adapt_info):
+        return y_hat, None
+
+
+def create_estimator(**kwargs):
+    from slam.preprocessing.estimators import PWCNetMultiStrideEstimator
+
+    class StubbedEstimator(PWCNetMultiStrideEstimator):
+        def _load_model(self):
+            self.levels = LEVELS
+            self.model = StubPWCNet(self.levels)
+
+    return StubbedEstimator(input_col=['path_to_rgb', 'path_to_rgb_next'],
+                            output_col='path_to_optical_flow',
+                            checkpoint=None,
+                            sub_dir='optical_flow',
+                            **kwargs)
+
+
+def get_mark(frame_index):
+    return [frame_index + 1000 * lvl for lvl in LEVELS]
+
+
+@unittest.skipUnless(is_installed('submodules.tfoptflow.tfoptflow.model_pwcnet') and is_installed('tensorflow'),
+                     'tfoptflow is not available')
+class TestPWCNetMultiStrideEstimator(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, 'rgb'))
+        self.frames_num = 12
+        self.fnames = [os.path.join('rgb', f'{index}.png') for index in range(self.frames_num)]
+        for index, fname in enumerate(self.fnames):
+            cv2.imwrite(os.path.join(self.root, fname), np.full((4, 6, 3), index, dtype=np.uint8))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.root)
+
+    def create_pairs(self, pairs):
+        return pd.DataFrame({'path_to_rgb': [self.fnames[first] for first, _ in pairs],
+                             'path_to_rgb_next': [self.fnames[second] for _, second in pairs]})
+
+    def test_processing_order(self):
+        estimator = create_estimator()
+        pairs = [(0, 1), (1, 2), (2, 3), (0, 2), (1, 3), (3, 0), (2, 4), (3, 4)]
+        order = estimator._get_processing_order(self.create_pairs(pairs))
+        # pairs are sorted by their last frame (in order of appearance), then by their first frame
+        self.assertEqual([pairs[index] for index in order],
+                         [(0, 1), (0, 2), (1, 2), (3, 0), (1, 3), (2, 3), (2, 4), (3, 4)])
+
+    def test_encode_odd_frames_num(self):
+        estimator = create_estimator(batch_size=2)
+        fnames = [self.fnames[index] for index in (3, 5, 7, 9, 11)]
+        estimator._encode_frames(fnames, self.root)
+
+        # frames are encoded two per image pair, last pair repeats the odd frame and last batch is padded
+        self.assertEqual(estimator.model.encoded_batches, [[[3, 5], [7, 9]], [[11, 11], [11, 11]]])
+        self.assertEqual(list(estimator.features_cache), fnames)
+        for fname, frame_index in zip(fnames, (3, 5, 7, 9, 11)):
+            self.assertEqual([float(f[0]) for f in estimator.features_cache[fname]], get_mark(frame_index))
+
+    def test_cache_eviction(self):
+        estimator = create_estimator(features_cache_size=3, batch_size=1)
+        for fname in self.fnames[:4]:
+            estimator._cache_features(fname, get_mark(0))
+        self.assertEqual(list(estimator.features_cache), self.fnames[1:4])
+
+        # features in use are moved to the end before missing ones are encoded, least recently used are evicted
+        features = estimator._get_features([self.fnames[1], self.fnames[5]], self.root)
+        self.assertEqual([float(f[0]) for f in features[1]], get_mark(5))
+        self.assertEqual(list(estimator.features_cache), [self.fnames[index] for index in (3, 1, 5)])
+        self.assertEqual(estimator.model.encoded_batches, [[[5, 5]]])
+
+    def test_run_batch(self):
+        estimator = create_estimator(features_cache_size=4, batch_size=2)
+        pairs = ([(index, index + 1) for index in range(self.frames_num - 1)] +
+                 [(index, index + 3) for index in range(self.frames_num - 3)])
+        df = estimator.run_batch(self.create_pairs(pairs), self.root)
+
+        for (first, second), output_path in zip(pairs, df['path_to_optical_flow']):
+            self.assertEqual(output_path, os.path.join('optical_flow', f'{first}_{second}.npy'))
+            flow = np.load(os.path.join(self.root, output_path))
+            np.testing.assert_allclose(flow, np.full((1, 1, 2), second - first))
+
+        # pairs of both strides share features, every frame is encoded once (in batch it may be repeated as padding)
+        encoded_frames = [frame for batch in estimator.model.encoded_batches
+                          for frame in set(frame for pair in batch for frame in pair)]
+        self.assertEqual(sorted(encoded_frames), list(range(self.frames_num)))
+        self.assertEqual(len(estimator.features_cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
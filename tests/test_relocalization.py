@@ -0,0 +1,236 @@
+import cv2
+import shutil
+import threading
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from slam.models.relocalization import BoVW, VocabularyTree, InvertedIndex, DescriptorStore, MiniBatchKMeans
+
+
+class TestVocabularyTree(unittest.TestCase):
+
+    def setUp(self) -> None:
+        random_state = np.random.RandomState(42)
+        self.images_descriptors = [(random_state.normal(size=(200, 128)) + random_state.normal(size=128) * 5)
+                                   .astype(np.float32) for _ in range(30)]
+        self.vocabulary_tree = VocabularyTree(branching=8, depth=3).fit(self.images_descriptors)
+
+    def test_transform(self):
+        bow = self.vocabulary_tree.transform(self.images_descriptors[0])
+        self.assertAlmostEqual(sum(bow.values()), 1, places=5)
+        self.assertTrue(max(bow.keys()) < self.vocabulary_tree.words_num)
+
+    def test_query(self):
+        inverted_index = InvertedIndex()
+        for descriptors in self.images_descriptors:
+            inverted_index.add(self.vocabulary_tree.transform(descriptors))
+
+        for image_index in (0, 10, 29):
+            query = self.vocabulary_tree.transform(self.images_descriptors[image_index][:150])
+            document, score = inverted_index.query(query, k=5)[0]
+            self.assertEqual(document, image_index)
+
+            candidates = inverted_index.query(query, k=5, exclude=image_index)
+            self.assertNotIn(image_index, [document for document, _ in candidates])
+
+
+class TestDescriptorStore(unittest.TestCase):
+
+    def setUp(self) -> None:
+        random_state = np.random.RandomState(42)
+        self.images_descriptors = [random_state.uniform(0, 255, size=(100, 128)).astype(np.float32)
+                                   for _ in range(10)]
+        self.keypoints = [cv2.KeyPoint(1., 2., 3.)] * 100
+
+    def test_float16(self):
+        store = DescriptorStore(dtype='float16')
+        for descriptors in self.images_descriptors:
+            store.add(self.keypoints, descriptors)
+
+        self.assertEqual(len(store), 10)
+        self.assertEqual(store[3].dtype, np.float32)
+        np.testing.assert_allclose(store[3], self.images_descriptors[3], rtol=1e-3)
+
+    def test_pca(self):
+        store = DescriptorStore(pca_components=32, pca_samples_num=500)
+        for descriptors in self.images_descriptors:
+            store.add(self.keypoints, descriptors)
+
+        self.assertEqual(store[0].shape, (100, 32))
+        np.testing.assert_allclose(store[0], store.project(self.images_descriptors[0]), rtol=1e-4, atol=1e-3)
+
+
+def generate_scene(height, width, seed):
+    """Random circles and rectangles on gray background, textured enough for SIFT"""
+    random_state = np.random.RandomState(seed)
+    image = np.full((height, width, 3), 128, dtype=np.uint8)
+    for _ in range(150):
+        color = tuple(int(c) for c in random_state.randint(0, 255, 3))
+        x, y = int(random_state.randint(0, width)), int(random_state.randint(0, height))
+        size = int(random_state.randint(5, 40))
+        if random_state.rand() < 0.5:
+            cv2.circle(image, (x, y), size, color, -1)
+        else:
+            cv2.rectangle(image, (x, y), (x + size, y + size), color, -1)
+    return image
+
+
+class TestBoVWPredictBatch(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # 4 scenes are revisited with a shift, so that later frames match earlier ones
+        scenes = [generate_scene(480, 640, seed) for seed in range(4)]
+        self.images = [np.roll(scenes[index % 4], 4 * index, axis=1) for index in range(10)]
+
+        extractor = cv2.xfeatures2d.SIFT_create()
+        descriptors = [extractor.detectAndCompute(cv2.resize(image, (160, 120)), None)[1] for image in scenes]
+        self.vocabulary_tree = VocabularyTree(branching=4, depth=2).fit(descriptors)
+
+    def get_bovw(self):
+        bovw = BoVW(knn=3, matches_threshold=5, min_descriptors_num=5, retrieval='tree')
+        bovw.vocabulary_tree = bovw.voc = self.vocabulary_tree
+        return bovw
+
+    def test_predict_batch_on_populated_database(self):
+        sequential_bovw = self.get_bovw()
+        sequential_matches = [sequential_bovw.predict(image, index) for index, image in enumerate(self.images)]
+        sequential_matches = pd.concat(sequential_matches[5:], ignore_index=True)
+        self.assertGreater(len(sequential_matches), 0)
+        self.assertIn(5, sequential_matches['to_index'].values)
+
+        batch_bovw = self.get_bovw()
+        for index, image in enumerate(self.images[:5]):
+            batch_bovw.predict(image, index)
+        features = [batch_bovw.compute_features(image) for image in self.images[5:]]
+        batch_matches = batch_bovw.predict_batch(features, list(range(5, 10)))
+
+        pd.testing.assert_frame_equal(batch_matches.reset_index(drop=True), sequential_matches, check_dtype=False)
+
+    def test_matching_pool_is_closed(self):
+        bovw = self.get_bovw()
+        bovw.matching_workers = 2
+        threads_num = threading.active_count()
+        for index, image in enumerate(self.images[:5]):
+            bovw.predict(image, index)
+        self.assertIsNotNone(bovw.matching_pool)
+
+        bovw.close()
+        self.assertIsNone(bovw.matching_pool)
+        self.assertEqual(threading.active_count(), threads_num)
+
+
+class TestMiniBatchKMeans(unittest.TestCase):
+
+    def test_partial_fit(self):
+        random_state = np.random.RandomState(42)
+        true_centers = random_state.uniform(0, 100, size=(4, 16))
+        labels = random_state.randint(0, 4, size=4000)
+        descriptors = (true_centers[labels] + random_state.normal(size=(4000, 16))).astype(np.float32)
+
+        kmeans = MiniBatchKMeans(4, batch_size=256)
+        for chunk in np.array_split(descriptors, 4):
+            kmeans.partial_fit(chunk)
+
+        distances = np.linalg.norm(kmeans.centers[:, None] - true_centers[None], axis=2)
+        self.assertLess(distances.min(1).max(), 0.5)
+        true_clusters = distances.argmin(1)
+        self.assertEqual(sorted(true_clusters), [0, 1, 2, 3])
+        np.testing.assert_array_equal(true_clusters[kmeans.predict(descriptors)], labels)
+
+
+class StubGenerator:
+    """Batches of images of a single input, as ExtendedDataFrameIterator returns them"""
+    def __init__(self, images, batch_size):
+        self.images = images
+        self.batch_size = batch_size
+        self.n = len(images)
+
+    def _get_batches_of_transformed_samples(self, index_array):
+        return [self.images[index_array]], None
+
+
+class StubSequence:
+    """Batches of images returned by next(), as keras Sequence-like generators of benchmarks"""
+    def __init__(self, images, batch_size):
+        self.batches = iter([[images[start:start + batch_size]], None]
+                            for start in range(0, len(images), batch_size))
+        self.batches_num = int(np.ceil(len(images) / batch_size))
+
+    def __len__(self):
+        return self.batches_num
+
+    def __next__(self):
+        return next(self.batches)
+
+
+class StubExtractor:
+    """Image with value v gives v descriptors filled with v, image 0 gives no descriptors"""
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.calls = list()
+
+    def detectAndCompute(self, image, mask):
+        value = int(image[0, 0, 0])
+        if value == self.fail_on:
+            raise RuntimeError('Interrupted')
+        self.calls.append(value)
+        return None, np.full((value, 128), value, dtype=np.float32) if value else None
+
+
+class TestDescriptorChunks(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.run_dir = tempfile.mkdtemp()
+        self.chunks_dir = Path(self.run_dir) / 'descriptors'
+        values = [3, 0, 4, 2, 5, 1, 3, 2, 4, 6, 1]
+        self.images = np.array([np.full((8, 8, 3), value, dtype=np.uint8) for value in values])
+        self.expected = [np.full((value, 128), value, dtype=np.float32) for value in values if value]
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.run_dir)
+
+    def get_bovw(self, extractor):
+        bovw = BoVW(clusters_num=2, kmeans='minibatch', kmeans_batch_size=8, chunk_size=6, run_dir=self.run_dir)
+        bovw.extractor = extractor
+        return bovw
+
+    def assert_chunks_are_restored(self):
+        descriptors = [des for chunk in BoVW.load_descriptor_chunks(self.chunks_dir) for des in chunk]
+        self.assertEqual(len(descriptors), len(self.expected))
+        for des, expected_des in zip(descriptors, self.expected):
+            np.testing.assert_array_equal(des, expected_des)
+
+    def test_round_trip(self):
+        bovw = self.get_bovw(StubExtractor())
+        bovw.save_descriptor_chunks(bovw.extract_descriptors(StubGenerator(self.images, batch_size=4)),
+                                    self.chunks_dir)
+        self.assertTrue((self.chunks_dir / 'complete').exists())
+        self.assertEqual(BoVW.get_saved_images_num(self.chunks_dir)[1], len(self.images))
+        self.assert_chunks_are_restored()
+
+    def test_plain_generator(self):
+        bovw = self.get_bovw(StubExtractor())
+        descriptors = list(bovw.extract_descriptors(StubSequence(self.images, batch_size=4), skip_images=5))
+        self.assertEqual(len(descriptors), len(self.images) - 5)
+        for des, image in zip(descriptors, self.images[5:]):
+            self.assertEqual(len(des), image[0, 0, 0])
+
+    def test_tree_requires_full_kmeans(self):
+        with self.assertRaises(ValueError):
+            BoVW(retrieval='tree', kmeans='minibatch')
+
+    def test_resume(self):
+        with self.assertRaises(RuntimeError):
+            self.get_bovw(StubExtractor(fail_on=6)).fit(StubGenerator(self.images, batch_size=4))
+        self.assertFalse((self.chunks_dir / 'complete').exists())
+
+        # chunks of images [3, 0, 4], [2, 5] and [1, 3, 2] are complete, extraction is resumed from image 8
+        self.assertEqual(BoVW.get_saved_images_num(self.chunks_dir), (3, 8))
+        extractor = StubExtractor()
+        self.get_bovw(extractor).fit(StubGenerator(self.images, batch_size=4))
+        self.assertEqual(extractor.calls, [4, 6, 1])
+        self.assertTrue((self.chunks_dir / 'complete').exists())
+        self.assert_chunks_are_restored()
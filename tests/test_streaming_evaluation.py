@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+from slam.linalg import RelativeTrajectory, convert
+from slam.evaluation import (calculate_metrics,
+                             calculate_loops_metrics,
+                             average_metrics,
+                             evaluate_dataset,
+                             evaluate_files)
+
+
+class TestStreamingEvaluation(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.dofs = ['euler_x', 'euler_y', 'euler_z', 't_x', 't_y', 't_z']
+        self.random_state = np.random.RandomState(42)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def generate_data(self, trajectory_length):
+        pairs = [(i, i + 1) for i in range(trajectory_length)]
+        pairs += [(i, i + 2) for i in range(0, trajectory_length - 2, 3)]
+        pairs += [(i, i + 60 + self.random_state.randint(100)) for i in range(0, trajectory_length - 200, 13)]
+
+        gt_df = pd.DataFrame(pairs, columns=['from_index', 'to_index'])
+        gt_df[self.dofs] = pd.DataFrame(self.random_state.normal(scale=0.05, size=(len(gt_df), 6)))
+        predicted_df = gt_df.copy()
+        predicted_df[self.dofs] += self.random_state.normal(scale=0.01, size=(len(gt_df), 6))
+        return gt_df, predicted_df
+
+    def create_trajectory(self, df):
+        return RelativeTrajectory.from_dataframe(df[df.to_index - df.from_index == 1][self.dofs]).to_global()
+
+    def test_same_as_in_memory(self):
+        file_pairs = list()
+        records = list()
+        for trajectory_index, trajectory_length in enumerate((300, 500)):
+            gt_df, predicted_df = self.generate_data(trajectory_length)
+
+            record = calculate_metrics(self.create_trajectory(gt_df),
+                                       self.create_trajectory(predicted_df),
+                                       rpe_indices='sqrt')
+            record.update(calculate_loops_metrics(gt_df, predicted_df, loop_threshold=50))
+            records.append(record)
+
+            gt_path = os.path.join(self.tmp_dir, f'gt_{trajectory_index}.csv')
+            predicted_path = os.path.join(self.tmp_dir, f'predicted_{trajectory_index}.csv')
+            gt_df.to_csv(gt_path, index=False)
+            predicted_df.to_csv(predicted_path, index=False)
+            file_pairs.append((gt_path, predicted_path))
+
+        expected = average_metrics(records)
+        metrics = evaluate_dataset(file_pairs, loop_threshold=50, chunk_size=97, rpe_indices='sqrt')
+
+        self.assertEqual(list(expected.keys()), list(metrics.keys()))
+        for metric_name, value in expected.items():
+            self.assertAlmostEqual(metrics[metric_name], value, places=6)
+
+    def test_same_as_predict(self):
+        gt_df, predicted_df = self.generate_data(400)
+        # loop pairs appear several times in both files, merge matches every gt row with every predicted row
+        loops = gt_df[gt_df.to_index - gt_df.from_index >= 50].iloc[:3]
+        gt_df = pd.concat([gt_df, loops], ignore_index=True)
+        predicted_df = pd.concat([predicted_df, predicted_df.loc[loops.index[:2]] + [0, 0, 0, 0, 0, 0, 0, 0.1]],
+                                 ignore_index=True)
+
+        # values are exact in string representation of matrix, which is written to csv
+        T_cam_body = np.array([[0.6, -0.8, 0, 0.5],
+                               [0.8, 0.6, 0, -0.2],
+                               [0, 0, 1, 1.5],
+                               [0, 0, 0, 1]])
+        gt_df['T_cam_body'] = [T_cam_body] * len(gt_df)
+
+        gt_path = os.path.join(self.tmp_dir, 'gt.csv')
+        predicted_path = os.path.join(self.tmp_dir, 'predicted.csv')
+        gt_df.to_csv(gt_path, index=False)
+        predicted_df.to_csv(predicted_path, index=False)
+
+        # poses are converted with T_cam_body of gt as in Predict
+        for df in (gt_df, predicted_df):
+            df[self.dofs] = np.stack([convert(dofs, T=T_cam_body) for dofs in df[self.dofs].values])
+        expected = calculate_metrics(self.create_trajectory(gt_df),
+                                     self.create_trajectory(predicted_df),
+                                     rpe_indices='sqrt')
+        expected.update(calculate_loops_metrics(gt_df.drop(columns='T_cam_body'), predicted_df, loop_threshold=50))
+
+        metrics = evaluate_files(gt_path, predicted_path, loop_threshold=50, chunk_size=97, rpe_indices='sqrt')
+        self.assertEqual(set(expected.keys()), set(metrics.keys()))
+        for metric_name, value in expected.items():
+            self.assertAlmostEqual(metrics[metric_name] / (abs(value) + 1e-9),
+                                   value / (abs(value) + 1e-9),
+                                   places=6,
+                                   msg=metric_name)
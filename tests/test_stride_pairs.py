@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+import __init_path__
+
+from slam.data_manager.stride_pairs import get_relative_dofs, create_stride_pairs, load_stride_pairs
+from slam.preprocessing.estimators import Global2RelativeEstimator
+
+
+class FakeFlowEstimator:
+
+    def __init__(self):
+        self.output_col = 'path_to_optical_flow'
+        self.dir = 'optical_flow'
+        self.ext = 'npy'
+        self.calls = 0
+
+    def run(self, row, dataset_root):
+        self.calls += 1
+        fname = f'{int(row["path_to_rgb"][4:-4])}_{int(row["path_to_rgb_next"][4:-4])}.npy'
+        output_path = os.path.join(self.dir, fname)
+        np.save(os.path.join(dataset_root, output_path), np.zeros((2, 2, 2)))
+        row[self.output_col] = output_path
+        return row
+
+
+class TestStridePairs(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.dof_cols = ['euler_x', 'euler_y', 'euler_z', 't_x', 't_y', 't_z']
+        random_state = np.random.RandomState(42)
+        self.frames_num = 30
+        global_dofs = np.concatenate([np.cumsum(random_state.normal(scale=0.1, size=(self.frames_num, 3)), axis=0),
+                                      np.cumsum(random_state.normal(size=(self.frames_num, 3)), axis=0)], axis=1)
+        self.frames_df = pd.DataFrame(global_dofs, columns=self.dof_cols)
+        self.frames_df['path_to_rgb'] = [f'rgb/{index}.png' for index in range(self.frames_num)]
+
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, 'optical_flow'))
+        self.frames_df.to_csv(os.path.join(self.root, 'frames.csv'), index=False)
+
+        pairs_df = pd.DataFrame({'path_to_rgb': self.frames_df['path_to_rgb'].values[:-1],
+                                 'path_to_rgb_next': self.frames_df['path_to_rgb'].values[1:],
+                                 'path_to_optical_flow': [f'optical_flow/{index}_{index + 1}.npy'
+                                                          for index in range(self.frames_num - 1)]})
+        pairs_df.to_csv(os.path.join(self.root, 'df.csv'), index=False)
+        for fpath in pairs_df['path_to_optical_flow']:
+            np.save(os.path.join(self.root, fpath), np.zeros((2, 2, 2)))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.root)
+
+    def test_relative_dofs(self):
+        input_col = self.dof_cols + [col + '_next' for col in self.dof_cols]
+        estimator = Global2RelativeEstimator(input_col=input_col, output_col=self.dof_cols)
+
+        global_dofs = self.frames_df[self.dof_cols].values
+        relative_dofs = get_relative_dofs(global_dofs[:-3], global_dofs[3:])
+        for index in range(self.frames_num - 3):
+            row = pd.Series(np.concatenate([global_dofs[index], global_dofs[index + 3]]), index=input_col)
+            expected_relative_dofs = estimator.run(row, self.root)[self.dof_cols].values.astype(float)
+            np.testing.assert_allclose(relative_dofs[index], expected_relative_dofs, atol=1e-9)
+
+    def test_prepared_products_are_reused(self):
+        paired_df = load_stride_pairs(self.root, strides=1)
+        self.assertEqual(len(paired_df), self.frames_num - 1)
+        self.assertEqual(list(paired_df['path_to_optical_flow']), list(pd.read_csv(
+            os.path.join(self.root, 'df.csv'))['path_to_optical_flow']))
+
+        with self.assertRaises(RuntimeError):
+            load_stride_pairs(self.root, strides=(1, 2))
+
+    def test_missing_products_are_computed_once(self):
+        estimator = FakeFlowEstimator()
+        paired_df = load_stride_pairs(self.root, strides=(1, 2, 3), pair_estimators=[estimator])
+        self.assertEqual(len(paired_df), 3 * self.frames_num - 6)
+        self.assertEqual(estimator.calls, 2 * self.frames_num - 5)
+        self.assertEqual(sorted(paired_df['stride'].unique()), [1, 2, 3])
+
+        paired_df = paired_df[paired_df['stride'] == 3]
+        self.assertEqual(paired_df['path_to_optical_flow'].iloc[0], os.path.join('optical_flow', '0_3.npy'))
+        self.assertEqual(paired_df['path_to_rgb_next'].iloc[-1], f'rgb/{self.frames_num - 1}.png')
+
+        load_stride_pairs(self.root, strides=(1, 2, 3), pair_estimators=[estimator])
+        self.assertEqual(estimator.calls, 2 * self.frames_num - 5)
+
+    def test_strides_longer_than_trajectory(self):
+        paired_df = create_stride_pairs(self.frames_df, strides=(self.frames_num, self.frames_num + 5))
+        expected_columns = create_stride_pairs(self.frames_df, strides=1).columns
+        self.assertEqual(len(paired_df), 0)
+        self.assertEqual(list(paired_df.columns), list(expected_columns))
+
+        paired_df = load_stride_pairs(self.root, strides=(1, self.frames_num))
+        self.assertEqual(len(paired_df), self.frames_num - 1)
+        self.assertEqual(list(paired_df['stride'].unique()), [1])
+
+        paired_df = load_stride_pairs(self.root, strides=self.frames_num)
+        self.assertEqual(len(paired_df), 0)
+        self.assertIn('path_to_optical_flow', paired_df.columns)
+
+
+if __name__ == '__main__':
+    unittest.main()
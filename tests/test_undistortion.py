@@ -0,0 +1,72 @@
+import os
+import cv2
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+import __init_path__
+
+from slam.utils import undistort_image
+from slam.preprocessing.estimators import UndistortionEstimator
+
+
+class TestUndistortion(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.K = np.array([[458.654, 0.0, 367.215],
+                           [0.0, 457.296, 248.375],
+                           [0.0, 0.0, 1.0]])
+        self.D = np.array([-0.28340811, 0.07395907, 0.00019359, 1.76187114e-05]) / 16.
+        self.R = np.eye(3)
+        self.P = np.array([[435.2, 0, 367.4],
+                           [0, 435.2, 252.2],
+                           [0, 0, 1]])
+        random_state = np.random.RandomState(42)
+        image = random_state.randint(0, 255, size=(480, 752, 3)).astype(np.uint8)
+        self.image = cv2.GaussianBlur(image, (7, 7), 2)
+
+        self.dataset_root = tempfile.mkdtemp()
+        cv2.imwrite(os.path.join(self.dataset_root, '0.png'), self.image)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.dataset_root)
+
+    def undistort_reference(self):
+        height, width = self.image.shape[:2]
+        map_x, map_y = cv2.fisheye.initUndistortRectifyMap(self.K, self.D.reshape(4, 1), self.R, self.P,
+                                                           (width, height), cv2.CV_32FC1)
+        return cv2.remap(self.image, map_x, map_y, interpolation=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+
+    def test_fixed_point_maps(self):
+        undistorted_image = undistort_image(self.image, K=self.K, D=self.D, R=self.R, P=self.P)
+        difference = np.abs(undistorted_image.astype(np.int32) - self.undistort_reference())
+        self.assertLessEqual(difference.max(), 1)
+
+    def test_fused_resize(self):
+        target_size = (120, 188)
+        undistorted_image = undistort_image(self.image, K=self.K, D=self.D, R=self.R, P=self.P,
+                                            target_size=target_size)
+        self.assertEqual(undistorted_image.shape, (*target_size, 3))
+
+        reference = cv2.resize(self.undistort_reference(), target_size[::-1], interpolation=cv2.INTER_LINEAR)
+        difference = np.abs(undistorted_image.astype(np.int32) - reference)[5:-5, 5:-5]
+        self.assertLess(difference.mean(), 2)
+
+    def test_maps_are_cached(self):
+        estimator = UndistortionEstimator(input_col=['path_to_rgb', 'K', 'D', 'R', 'P'],
+                                          output_col='path_to_rgb',
+                                          sub_dir='rgb_undistorted',
+                                          target_size=(120, 188))
+        for _ in range(3):
+            row = pd.Series({'path_to_rgb': '0.png', 'K': self.K, 'D': self.D, 'R': self.R, 'P': self.P})
+            row = estimator.run(row, self.dataset_root)
+
+        self.assertEqual(len(estimator.maps), 1)
+        undistorted_image = cv2.imread(os.path.join(self.dataset_root, row['path_to_rgb']))
+        self.assertEqual(undistorted_image.shape, (120, 188, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()